@@ -0,0 +1,954 @@
+# -*- coding: utf-8 -*-
+"""Access to the Skjálftalísa web API.
+
+The functions in this module do not touch any widgets so that they can be
+run from a background task.
+"""
+
+import codecs
+import hashlib
+import json
+import math
+import os
+import queue
+import threading
+import time
+
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+import requests
+
+from qgis.core import QgsSettings
+
+from .http_client import get_http_client
+from .exceptions import (
+    ApiRequestError,
+    ApiServerError,
+    FetchCanceledError,
+    GeoJsonProcessingError,
+)
+from .metrics import StageTimes
+from .utils import log_error
+
+# SKJALFTALISA_API_URL points the plugin at another server, e.g. the mock
+# API of the benchmark suite
+BASE_API_URL = os.environ.get(
+    "SKJALFTALISA_API_URL", "https://vi-api.vedur.is/skjalftalisa/v1"
+).rstrip("/")
+AREA_API_ENDPOINT = f"{BASE_API_URL}/areas"
+EARTHQUAKE_API_ENDPOINT = f"{BASE_API_URL}/quakefilter"
+
+# Format of start_time and end_time in the quakefilter payload
+PAYLOAD_TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Windows longer than this are fetched as parallel time slices
+SLICED_FETCH_MIN_WINDOW = timedelta(days=14)
+# Target length of a slice, the window is cut into at least one slice per
+# worker so that every worker has something to do
+SLICE_SPAN = timedelta(days=7)
+SLICE_WORKERS = 4
+# A slice that fails on the server side or grows larger than this is split
+# in two, at most SLICE_MAX_BISECTIONS times and never below SLICE_MIN_SPAN.
+# A slice that cannot be split any further is fetched without the size cap.
+SLICE_MAX_BYTES = 32 * 1024 * 1024
+SLICE_MAX_BISECTIONS = 4
+SLICE_MIN_SPAN = timedelta(hours=1)
+
+# Number of features decoded from a streamed response before they are
+# handed on as a batch
+STREAM_BATCH_SIZE = 5000
+
+# Payload keys whose limits can be narrowed on the loaded events
+NARROWABLE_PAYLOAD_KEYS = (
+    "start_time",
+    "end_time",
+    "size_min",
+    "size_max",
+    "depth_min",
+    "depth_max",
+    "area",
+)
+
+# Payload keys whose values are sets of alternatives, in no particular order
+UNORDERED_PAYLOAD_KEYS = ("event_type", "originating_system")
+
+SETTINGS_PREFIX = "qgis_skjalftalisa/fetch"
+
+
+class FetchFeedback:
+    """Collects transfer statistics and relays cancellation for a fetch.
+
+    Args:
+        is_canceled (callable): Returns True when the fetch should stop.
+        on_progress (callable): Called with (bytes_received, bytes_total,
+            events_received) whenever the statistics change. Bytes are
+            counted as transferred on the wire, i.e. compressed, and
+            bytes_total is 0 when the server does not announce the body
+            size. The decompressed size is kept in `bytes_decoded`.
+        times (StageTimes): Receives the time spent on HTTP, decoding and
+            the event store; a new one if not given.
+        on_retry (callable): Called with (attempt, max_retries, delay,
+            reason) before a failed request is retried.
+    """
+
+    def __init__(
+        self, is_canceled=None, on_progress=None, times=None, on_retry=None
+    ):
+        self.bytes_received = 0
+        self.bytes_decoded = 0
+        self.bytes_total = 0
+        self.events_received = 0
+        self.times = StageTimes() if times is None else times
+        self._is_canceled = is_canceled
+        self._on_progress = on_progress
+        self._on_retry = on_retry
+        self._lock = threading.Lock()
+
+    def is_canceled(self) -> bool:
+        return bool(self._is_canceled and self._is_canceled())
+
+    def raise_if_canceled(self) -> None:
+        if self.is_canceled():
+            raise FetchCanceledError("The fetch was cancelled.")
+
+    def add_bytes(self, received: int, decoded: int = 0) -> None:
+        with self._lock:
+            self.bytes_received += received
+            self.bytes_decoded += decoded
+        self._report()
+
+    def add_expected_bytes(self, total: int) -> None:
+        with self._lock:
+            self.bytes_total += total
+        self._report()
+
+    def add_events(self, count: int) -> None:
+        with self._lock:
+            self.events_received += count
+        self._report()
+
+    def report_retry(
+        self, attempt: int, max_retries: int, delay: float, reason: str
+    ) -> None:
+        log_error(
+            f"Retrying the request ({attempt}/{max_retries}) in"
+            f" {delay:.1f} s: {reason}"
+        )
+        if self._on_retry:
+            self._on_retry(attempt, max_retries, delay, reason)
+
+    def _report(self) -> None:
+        if self._on_progress:
+            self._on_progress(
+                self.bytes_received, self.bytes_total, self.events_received
+            )
+
+
+class _SliceTooLargeError(FetchCanceledError):
+    """Raised to abandon a slice whose response exceeds SLICE_MAX_BYTES."""
+
+    pass
+
+
+class _SliceFeedback(FetchFeedback):
+    """Feedback for one slice of a sliced fetch.
+
+    Bytes are forwarded to the feedback of the whole fetch; the expected
+    size of each slice is not, as it is only known once the slice starts,
+    and neither are events, which are counted once they are yielded
+    without repeats.
+
+    Args:
+        parent (FetchFeedback): Feedback of the whole fetch.
+        max_bytes (int): Abandon the slice after this many decoded bytes,
+            no limit if None.
+        abort (threading.Event): Cancels the slice when set, e.g. after
+            another slice has failed.
+    """
+
+    def __init__(
+        self,
+        parent: FetchFeedback,
+        max_bytes: int = None,
+        abort: threading.Event = None,
+    ):
+        super().__init__(times=parent.times)
+        self.parent = parent
+        self.max_bytes = max_bytes
+        self.abort = abort
+
+    def is_canceled(self) -> bool:
+        return self.parent.is_canceled() or bool(
+            self.abort and self.abort.is_set()
+        )
+
+    def raise_if_canceled(self) -> None:
+        super().raise_if_canceled()
+        if self.max_bytes is not None and self.bytes_decoded > self.max_bytes:
+            raise _SliceTooLargeError(
+                f"The slice exceeded {self.max_bytes} bytes."
+            )
+
+    def add_bytes(self, received: int, decoded: int = 0) -> None:
+        super().add_bytes(received, decoded)
+        self.parent.add_bytes(received, decoded)
+
+    def report_retry(
+        self, attempt: int, max_retries: int, delay: float, reason: str
+    ) -> None:
+        self.parent.report_retry(attempt, max_retries, delay, reason)
+
+
+def feature_event_id(feature: dict):
+    """Return a value that identifies the event of a quakefilter feature.
+
+    Args:
+        feature (dict): A GeoJSON-like feature from the API.
+
+    Returns:
+        The event id if the API provides one, otherwise the event's time and
+        location.
+    """
+    properties = feature.get("properties") or {}
+    for key in ("event_id", "id"):
+        if properties.get(key) is not None:
+            return properties[key]
+    if feature.get("id") is not None:
+        return feature["id"]
+    coordinates = (feature.get("geometry") or {}).get("coordinates") or ()
+    return (properties.get("time"), tuple(coordinates))
+
+
+def parse_payload_time(value: str) -> datetime:
+    """Parse start_time/end_time of a quakefilter payload."""
+    return datetime.strptime(value, PAYLOAD_TIME_FORMAT)
+
+
+def format_payload_time(value: datetime) -> str:
+    """Format a datetime for start_time/end_time of a quakefilter payload."""
+    return value.strftime(PAYLOAD_TIME_FORMAT)
+
+
+def payload_time_to_epoch(value: str) -> float:
+    """Convert start_time/end_time of a payload to seconds since the epoch.
+
+    Times without a zone are taken to be UTC, which is also Iceland's local
+    time.
+    """
+    return parse_payload_time(value).replace(tzinfo=timezone.utc).timestamp()
+
+
+def epoch_to_payload_time(value: float) -> str:
+    """Convert seconds since the epoch to a payload start_time/end_time."""
+    return format_payload_time(
+        datetime.fromtimestamp(value, timezone.utc).replace(tzinfo=None)
+    )
+
+
+def parse_event_time(value) -> float:
+    """Convert the time of an event to seconds since the epoch.
+
+    Args:
+        value: The "time" property of a quakefilter feature, an ISO 8601
+            string. Times without a zone are taken to be UTC.
+
+    Returns:
+        float: Seconds since the epoch, or None if the time is missing or
+        cannot be parsed.
+    """
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def payload_filter_key(payload: dict) -> str:
+    """Return a digest of everything in a payload except its time window.
+
+    Two payloads with the same key select the same events from any time
+    window they have in common.
+
+    Args:
+        payload (dict): The quakefilter request payload.
+
+    Returns:
+        str: Hex digest of the canonical JSON of the filter parameters.
+    """
+    filters = {
+        key: value
+        for key, value in payload.items()
+        if key not in ("start_time", "end_time")
+    }
+    return _payload_digest(filters)
+
+
+def payload_key(payload: dict) -> str:
+    """Return a digest that is equal for payloads selecting the same events.
+
+    Used to recognise a request that is already in flight. The order of
+    the event types and originating systems does not matter; the order of
+    the magnitude preference and of the area polygon does.
+
+    Args:
+        payload (dict): The quakefilter request payload.
+
+    Returns:
+        str: Hex digest of the canonical JSON of the payload.
+    """
+    return _payload_digest(payload)
+
+
+def _payload_digest(payload: dict) -> str:
+    canonical = {
+        key: sorted(value) if key in UNORDERED_PAYLOAD_KEYS else value
+        for key, value in payload.items()
+    }
+    text = json.dumps(canonical, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def payload_within(payload: dict, fetched: dict) -> bool:
+    """Return whether a payload selects a subset of the events of another.
+
+    That is the case if both use the same event types, systems and
+    magnitude preference, and the time window, magnitude and depth limits
+    of `payload` lie inside those of `fetched`. An area can be added or
+    narrowed to one inside the fetched area, e.g. one of several areas
+    fetched by their hull, but not removed.
+
+    Args:
+        payload (dict): The quakefilter payload that is requested.
+        fetched (dict): The payload of the events that are loaded.
+
+    Returns:
+        bool: True if the events of `payload` can be selected from those of
+        `fetched` without a request.
+    """
+    narrowable = set(NARROWABLE_PAYLOAD_KEYS)
+    for key in (set(payload) | set(fetched)) - narrowable:
+        if payload.get(key) != fetched.get(key):
+            return False
+    fetched_area = fetched.get("area")
+    area = payload.get("area")
+    if fetched_area is not None and area != fetched_area:
+        # Imported here, as the area catalogue itself uses this module
+        from .areas import payload_area_covers
+
+        if area is None or not payload_area_covers(fetched_area, area):
+            return False
+    return (
+        parse_payload_time(payload["start_time"])
+        >= parse_payload_time(fetched["start_time"])
+        and parse_payload_time(payload["end_time"])
+        <= parse_payload_time(fetched["end_time"])
+        and payload["size_min"] >= fetched["size_min"]
+        and payload["size_max"] <= fetched["size_max"]
+        and payload["depth_min"] >= fetched["depth_min"]
+        and payload["depth_max"] <= fetched["depth_max"]
+    )
+
+
+def advance_payload_end(payload: dict, fetched: dict, end_time: str) -> dict:
+    """Follow a live poll that has moved the end of the loaded events.
+
+    A payload that ends where the loaded events end is moved along with
+    them, so that narrowing it later does not filter out the events the
+    poll has appended. One that ends earlier was narrowed on purpose and
+    is kept.
+
+    Args:
+        payload (dict): The quakefilter payload that is requested.
+        fetched (dict): The payload of the events loaded before the poll.
+        end_time (str): The end_time the poll has fetched up to.
+
+    Returns:
+        dict: The payload, with the new end_time if it has moved.
+    """
+    if payload["end_time"] != fetched["end_time"]:
+        return payload
+    return dict(payload, end_time=end_time)
+
+
+def split_time_window(
+    start: datetime, end: datetime, span: timedelta, min_slices: int = 1
+) -> list:
+    """Cut a time window into consecutive slices of equal length.
+
+    Neighbouring slices share their boundary; events on it are fetched
+    twice and removed again when the slices are merged.
+
+    Args:
+        start (datetime): Start of the window.
+        end (datetime): End of the window.
+        span (timedelta): Maximum length of a slice.
+        min_slices (int): Minimum number of slices.
+
+    Returns:
+        list: (start, end) tuples in chronological order.
+    """
+    count = max(min_slices, math.ceil((end - start) / span), 1)
+    # Whole seconds, as the payload has a resolution of one second
+    step = timedelta(seconds=math.ceil((end - start).total_seconds() / count))
+    slices = []
+    slice_start = start
+    while slice_start < end:
+        slice_end = min(slice_start + step, end)
+        slices.append((slice_start, slice_end))
+        slice_start = slice_end
+    return slices
+
+
+def merge_features(feature_lists: list) -> list:
+    """Concatenate lists of features, dropping repeated events.
+
+    Args:
+        feature_lists (list): Lists of quakefilter features.
+
+    Returns:
+        list: The features in their original order, each event once.
+    """
+    seen = set()
+    merged = []
+    for features in feature_lists:
+        merged.extend(_unseen_features(features, seen))
+    return merged
+
+
+def _unseen_features(features: list, seen: set) -> list:
+    """Return the features whose events are not in `seen` and add them."""
+    unseen = []
+    for feature in features:
+        event_id = feature_event_id(feature)
+        if event_id in seen:
+            continue
+        seen.add(event_id)
+        unseen.append(feature)
+    return unseen
+
+
+def is_sliced_fetch(payload: dict) -> bool:
+    """Return whether the window of a payload is fetched in time slices."""
+    start = parse_payload_time(payload["start_time"])
+    end = parse_payload_time(payload["end_time"])
+    return end - start > SLICED_FETCH_MIN_WINDOW
+
+
+def fetch_earthquakes(payload: dict, feedback: FetchFeedback) -> list:
+    """Fetch and decode the earthquakes matching a payload.
+
+    Long windows are fetched as parallel slices, see
+    fetch_earthquakes_sliced().
+
+    Args:
+        payload (dict): The quakefilter request payload.
+        feedback (FetchFeedback): Receives progress, polled for cancellation.
+
+    Returns:
+        list: GeoJSON-like feature dictionaries.
+
+    Raises:
+        ApiRequestError: If the API request fails.
+        GeoJsonProcessingError: If the response cannot be decoded.
+        FetchCanceledError: If the fetch is cancelled.
+    """
+    if is_sliced_fetch(payload):
+        features = []
+        for slice_features in fetch_earthquakes_sliced(
+            payload, feedback, _slice_workers()
+        ):
+            features.extend(slice_features)
+        return features
+
+    body = fetch_earthquake_data(payload, feedback)
+    feedback.raise_if_canceled()
+    with feedback.times.measure("decode"):
+        features = process_earthquake_response(body)
+    feedback.add_events(len(features))
+    return features
+
+
+def stream_earthquakes(
+    payload: dict,
+    feedback: FetchFeedback,
+    batch_size: int = STREAM_BATCH_SIZE,
+):
+    """Fetch the earthquakes matching a payload in batches.
+
+    The response body is decoded while it is downloaded, so a batch is
+    available as soon as its features have arrived and neither the whole
+    body nor its decoded text is held in memory. Windows that are fetched
+    in slices are handed on in batches slice by slice, as each slice
+    completes.
+
+    Args:
+        payload (dict): The quakefilter request payload.
+        feedback (FetchFeedback): Receives progress, polled for cancellation.
+        batch_size (int): Number of features per batch.
+
+    Yields:
+        list: GeoJSON-like feature dictionaries, at most batch_size at a
+        time.
+
+    Raises:
+        ApiRequestError: If the API request fails.
+        GeoJsonProcessingError: If the response cannot be decoded.
+        FetchCanceledError: If the fetch is cancelled.
+    """
+    if is_sliced_fetch(payload):
+        yield from fetch_earthquakes_sliced(
+            payload, feedback, _slice_workers(), batch_size=batch_size
+        )
+        return
+    yield from _stream_response(payload, feedback, batch_size)
+
+
+def _stream_response(payload: dict, feedback: FetchFeedback, batch_size: int):
+    """Send one quakefilter request and decode its body in batches.
+
+    Safe to run in several threads at once that share the stage times of
+    a fetch.
+
+    Yields:
+        list: GeoJSON-like feature dictionaries, at most batch_size at a
+        time.
+    """
+    times = feedback.times
+    started = time.perf_counter()
+    with _open_earthquake_response(payload, feedback) as (client, response):
+        times.add("http", time.perf_counter() - started)
+        # Waiting for the body counts as HTTP, the rest of the loop, but not
+        # the time the consumer takes per batch, as decoding. The wait is
+        # timed apart from the fetch, which other threads may add to.
+        waited = StageTimes()
+        chunks = _timed(client.iter_body(response, feedback), waited, "http")
+        batch = []
+        started = time.perf_counter()
+        http_mark = 0.0
+        for feature in iter_json_array(chunks):
+            batch.append(feature)
+            if len(batch) < batch_size:
+                continue
+            http_mark = _add_stream_times(times, waited, started, http_mark)
+            feedback.add_events(len(batch))
+            yield batch
+            batch = []
+            started = time.perf_counter()
+        _add_stream_times(times, waited, started, http_mark)
+        if batch:
+            feedback.add_events(len(batch))
+            yield batch
+
+
+def _add_stream_times(
+    times: StageTimes, waited: StageTimes, started: float, http_mark: float
+) -> float:
+    """Split the time since `started` into HTTP and decoding.
+
+    Returns:
+        float: The HTTP time of `waited` so far, the next `http_mark`.
+    """
+    http = waited.get("http")
+    times.add("http", http - http_mark)
+    times.add("decode", time.perf_counter() - started - (http - http_mark))
+    return http
+
+
+def _slice_workers() -> int:
+    """Return the number of slices fetched concurrently."""
+    return QgsSettings().value(
+        f"{SETTINGS_PREFIX}/workers", SLICE_WORKERS, type=int
+    )
+
+
+def _timed(iterable, times: StageTimes, stage: str):
+    """Yield from an iterable, adding the time spent waiting to a stage."""
+    iterator = iter(iterable)
+    while True:
+        started = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            times.add(stage, time.perf_counter() - started)
+            return
+        times.add(stage, time.perf_counter() - started)
+        yield item
+
+
+def _stream_slice(
+    payload: dict,
+    start: datetime,
+    end: datetime,
+    feedback: FetchFeedback,
+    abort: threading.Event,
+    batches: queue.SimpleQueue,
+    batch_size: int,
+    capped: bool = True,
+) -> None:
+    """Stream the events of one time slice of a payload into a queue.
+
+    Args:
+        payload (dict): The quakefilter request payload.
+        start (datetime): Start of the slice.
+        end (datetime): End of the slice.
+        feedback (FetchFeedback): Feedback of the whole fetch.
+        abort (threading.Event): Cancels the slice when set.
+        batches (queue.SimpleQueue): Receives each decoded batch as a
+            ("batch", features) item.
+        batch_size (int): Number of features per batch.
+        capped (bool): Abandon the slice once it exceeds SLICE_MAX_BYTES.
+    """
+    slice_payload = dict(
+        payload,
+        start_time=format_payload_time(start),
+        end_time=format_payload_time(end),
+    )
+    slice_feedback = _SliceFeedback(
+        feedback, SLICE_MAX_BYTES if capped else None, abort
+    )
+    for features in _stream_response(
+        slice_payload, slice_feedback, batch_size
+    ):
+        batches.put(("batch", features))
+
+
+def fetch_earthquakes_sliced(
+    payload: dict,
+    feedback: FetchFeedback,
+    workers: int = SLICE_WORKERS,
+    span: timedelta = SLICE_SPAN,
+    batch_size: int = STREAM_BATCH_SIZE,
+):
+    """Fetch a long window as time slices on a bounded pool of workers.
+
+    Every slice is decoded while it is downloaded and its batches are
+    yielded as they arrive, so batches of different slices interleave
+    and do not come in chronological order. Events on the boundary of two
+    slices are yielded once. A slice that fails on the server side or
+    exceeds SLICE_MAX_BYTES is bisected and its halves fetched instead;
+    the events it yielded before are not repeated. One that is still too
+    large when it cannot be bisected any further is fetched again without
+    the size cap. When a slice fails for good or the generator is closed,
+    the slices still running are cancelled.
+
+    Args:
+        payload (dict): The quakefilter request payload.
+        feedback (FetchFeedback): Receives progress, polled for cancellation.
+        workers (int): Number of slices fetched concurrently.
+        span (timedelta): Maximum length of a slice.
+        batch_size (int): Most features per batch.
+
+    Yields:
+        list: GeoJSON-like feature dictionaries.
+
+    Raises:
+        ApiRequestError: If a slice keeps failing after being bisected.
+        GeoJsonProcessingError: If a response cannot be decoded.
+        FetchCanceledError: If the fetch is cancelled.
+    """
+    start = parse_payload_time(payload["start_time"])
+    end = parse_payload_time(payload["end_time"])
+    seen = set()  # events already yielded
+    abort = threading.Event()
+    # ("batch", features) from the workers, ("done", future) once a slice
+    # has finished, after all of its batches
+    batches = queue.SimpleQueue()
+
+    pool = ThreadPoolExecutor(
+        max_workers=max(1, workers), thread_name_prefix="skjalftalisa"
+    )
+    pending = {}  # future -> (slice start, slice end, bisections)
+
+    def submit(slice_start, slice_end, depth, capped=True):
+        future = pool.submit(
+            _stream_slice,
+            payload,
+            slice_start,
+            slice_end,
+            feedback,
+            abort,
+            batches,
+            batch_size,
+            capped,
+        )
+        pending[future] = (slice_start, slice_end, depth)
+        future.add_done_callback(lambda done: batches.put(("done", done)))
+
+    try:
+        for slice_start, slice_end in split_time_window(
+            start, end, span, workers
+        ):
+            submit(slice_start, slice_end, 0)
+
+        while pending:
+            kind, item = batches.get()
+            if kind == "batch":
+                features = _unseen_features(item, seen)
+                if features:
+                    feedback.add_events(len(features))
+                    yield features
+                continue
+
+            slice_start, slice_end, depth = pending.pop(item)
+            try:
+                item.result()
+                continue
+            except _SliceTooLargeError as e:
+                error = e
+            except FetchCanceledError:
+                raise
+            except ApiServerError as e:
+                error = e
+
+            middle = slice_start + (slice_end - slice_start) / 2
+            middle = middle.replace(microsecond=0)
+            if (
+                depth >= SLICE_MAX_BISECTIONS
+                or (slice_end - slice_start) / 2 < SLICE_MIN_SPAN
+            ):
+                if isinstance(error, _SliceTooLargeError):
+                    submit(slice_start, slice_end, depth, capped=False)
+                    continue
+                raise ApiServerError(
+                    f"Failed to fetch earthquakes between"
+                    f" {format_payload_time(slice_start)} and"
+                    f" {format_payload_time(slice_end)}: {str(error)}"
+                ) from error
+
+            submit(slice_start, middle, depth + 1)
+            submit(middle, slice_end, depth + 1)
+    finally:
+        # Do not start queued slices after a failure or cancellation, and
+        # stop the running ones at their next chunk
+        abort.set()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def fetch_earthquake_data(payload: dict, feedback: FetchFeedback) -> bytes:
+    """Send a POST request to fetch earthquake data and read the body.
+
+    Args:
+        payload (dict): A dictionary of keys and values as specified on
+        Vedurstofan's API website.
+        feedback (FetchFeedback): Receives transfer progress and is polled
+        for cancellation between chunks.
+
+    Returns:
+        bytes: The raw JSON body of the response.
+
+    Raises:
+        ApiRequestError: If the HTTP request fails or the server returns an
+        error status code.
+        FetchCanceledError: If the fetch is cancelled while in flight.
+    """
+    with feedback.times.measure("http"):
+        with _open_earthquake_response(payload, feedback) as (
+            client,
+            response,
+        ):
+            return client.read_body(response, feedback)
+
+
+@contextmanager
+def _open_earthquake_response(payload: dict, feedback: FetchFeedback):
+    """Send the quakefilter request and yield the streamed response.
+
+    Errors raised while the body is read inside the block are mapped to
+    API errors as well, and the response is always closed.
+
+    Yields:
+        tuple: The HttpClient and the requests.Response.
+    """
+    response = None
+    try:
+        # Send the POST request and read the body in chunks so that progress
+        # can be reported and the transfer cancelled
+        client = get_http_client()
+        response = client.request(
+            "POST",
+            EARTHQUAKE_API_ENDPOINT,
+            feedback=feedback,
+            json=payload,
+            stream=True,
+        )
+        # Raises an HTTPError for bad responses (4xx, 5xx)
+        response.raise_for_status()
+
+        # Content-Length is the compressed size if the body is compressed
+        feedback.add_expected_bytes(
+            int(response.headers.get("Content-Length", 0))
+        )
+        yield client, response
+
+    except (FetchCanceledError, GeoJsonProcessingError):
+        raise
+
+    except requests.HTTPError as e:
+        # Handle specific HTTP errors
+        error_message = (
+            f"HTTP error occurred: {response.status_code} - "
+            f"{response.reason}. Details: {response.text}"
+        )
+        log_error(error_message)
+        if response.status_code >= 500:
+            raise ApiServerError(error_message) from e
+        raise ApiRequestError(error_message) from e
+
+    except requests.Timeout as e:
+        # The server did not answer in time
+        error_message = f"The earthquake API did not respond in time: {str(e)}"
+        log_error(error_message)
+        raise ApiServerError(error_message) from e
+
+    except requests.RequestException as e:
+        # Handle general request issues
+        error_message = (
+            f"Failed to fetch earthquake data due to a network or"
+            f" connection error: {str(e)}"
+        )
+        log_error(error_message)
+        raise ApiRequestError(error_message) from e
+
+    except Exception as e:
+        # Handle unexpected exceptions
+        error_message = (
+            f"An unexpected error occurred while fetching earthquake data:"
+            f" {str(e)}"
+        )
+        log_error(error_message)
+        raise ApiRequestError(error_message) from e
+
+    finally:
+        if response is not None:
+            response.close()
+
+
+def iter_json_array(chunks):
+    """Decode the elements of a JSON array from chunks of its UTF-8 text.
+
+    Each element is yielded as soon as it is complete, so only the
+    undecoded remainder of the current chunk is kept in memory. A body
+    that is empty or null yields nothing; one that is not an array is
+    decoded as a whole by process_earthquake_response().
+
+    Args:
+        chunks (iterable): bytes of the body in order.
+
+    Yields:
+        The decoded elements of the array.
+
+    Raises:
+        GeoJsonProcessingError: If the text is not valid JSON or not an
+        array.
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    whitespace = " \t\n\r"
+    buffer = ""
+    started = False
+    finished = False
+    chunks = iter(chunks)
+
+    while True:
+        chunk = next(chunks, None)
+        try:
+            buffer += utf8.decode(chunk or b"", final=chunk is None)
+        except UnicodeDecodeError as e:
+            raise GeoJsonProcessingError(
+                f"Failed to parse API response as JSON: {str(e)}"
+            ) from e
+
+        if not started:
+            stripped = buffer.lstrip(whitespace)
+            if not stripped:
+                if chunk is None:
+                    return  # Empty body
+                continue
+            if stripped[0] != "[":
+                # Not an array, decode the rest of the body in one go
+                pending = utf8.getstate()[0]
+                yield from process_earthquake_response(
+                    stripped.encode("utf-8") + pending + b"".join(chunks)
+                )
+                return
+            buffer = stripped[1:]
+            started = True
+
+        position = 0
+        while not finished:
+            while position < len(buffer) and buffer[position] in whitespace:
+                position += 1
+            if position < len(buffer) and buffer[position] == "]":
+                finished = True
+                break
+            if position < len(buffer) and buffer[position] == ",":
+                position += 1
+                continue
+            try:
+                element, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                break  # Incomplete, wait for the next chunk
+            if end >= len(buffer):
+                break  # A number may continue in the next chunk
+            yield element
+            position = end
+        buffer = buffer[position:]
+
+        if finished:
+            return
+        if chunk is None:
+            raise GeoJsonProcessingError(
+                "Failed to parse API response as JSON: the response is"
+                " not a complete JSON array."
+            )
+
+
+def process_earthquake_response(body: bytes) -> list:
+    """Decode the body of a quakefilter response into a list of features.
+
+    Args:
+        body (bytes): The raw JSON body of the response.
+
+    Returns:
+        list: GeoJSON-like feature dictionaries, empty if no earthquakes
+        matched the query.
+
+    Raises:
+        GeoJsonProcessingError: If the response data cannot be parsed or
+        is not a list of features, e.g. an error object.
+    """
+    try:
+        quake_data = json.loads(body) if body else []
+
+    except (json.JSONDecodeError, UnicodeDecodeError) as e:
+        # Handle JSON parsing errors
+        error_message = f"Failed to parse API response as JSON: {str(e)}"
+        log_error(error_message)
+        raise GeoJsonProcessingError(error_message) from e
+
+    except Exception as e:
+        # Handle any unexpected errors
+        error_message = (
+            f"An unexpected error occurred while processing the earthquake"
+            f" response: {str(e)}"
+        )
+        log_error(error_message)
+        raise GeoJsonProcessingError(error_message) from e
+
+    # An empty response means no earthquakes matched the query
+    if quake_data is None:
+        return []
+    if not isinstance(quake_data, list):
+        error_message = (
+            f"Expected a list of earthquakes from the API, got"
+            f" {type(quake_data).__name__}: {str(quake_data)[:200]}"
+        )
+        log_error(error_message)
+        raise GeoJsonProcessingError(error_message)
+    return quake_data
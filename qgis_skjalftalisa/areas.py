@@ -0,0 +1,371 @@
+# -*- coding: utf-8 -*-
+"""The catalogue of predefined areas served by the /areas endpoint.
+
+The last good response is kept on disk together with its validators
+(ETag/Last-Modified) so the dock can be populated without a network round
+trip. A background task then revalidates it with a conditional request.
+
+Once loaded, the catalogue is held in an AreaRegistry, which derives
+everything the dock needs of an area once instead of on every lookup. The
+area geometries are prepared, so that assign_areas() can test whole
+catalogues of events against them in a few milliseconds.
+"""
+
+import hashlib
+import json
+import os
+
+from collections import namedtuple
+
+import numpy as np
+import shapely
+
+from shapely.geometry import Point, box, mapping, shape
+from shapely.ops import orient
+from shapely.strtree import STRtree
+
+from qgis.core import QgsTask
+
+from .api import AREA_API_ENDPOINT, FetchFeedback
+from .exceptions import ApiRequestError
+from .http_client import get_http_client
+from .utils import log_error, profile_dir
+
+AREA_CACHE_FILE = "areas.json"
+
+# Degrees by which an area may stick out of a hull that still covers it
+AREA_TOLERANCE = 1e-9
+
+
+def catalogue_digest(areas: list) -> str:
+    """Return a stable digest of a raw area catalogue.
+
+    Args:
+        areas (list): The decoded /areas response.
+
+    Returns:
+        str: Hex digest that changes whenever the catalogue changes.
+    """
+    text = json.dumps(areas, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def load_cached_catalogue() -> dict:
+    """Read the cached area catalogue from the QGIS profile.
+
+    Returns:
+        dict: With keys "areas", "etag" and "last_modified", or None if
+        there is no usable cache.
+    """
+    path = os.path.join(profile_dir(), AREA_CACHE_FILE)
+    try:
+        with open(path, encoding="utf-8") as file:
+            cached = json.load(file)
+        if not isinstance(cached.get("areas"), list):
+            return None
+        return cached
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        log_error(f"Ignoring unreadable area cache '{path}': {str(e)}")
+        return None
+
+
+def save_cached_catalogue(
+    areas: list, etag: str = None, last_modified: str = None
+) -> None:
+    """Store an area catalogue and its validators in the QGIS profile.
+
+    The file is written next to the cache and then moved into place so that
+    a reader never sees a partially written catalogue.
+
+    Args:
+        areas (list): The decoded /areas response.
+        etag (str): ETag header of the response, if any.
+        last_modified (str): Last-Modified header of the response, if any.
+    """
+    path = os.path.join(profile_dir(), AREA_CACHE_FILE)
+    temp_path = f"{path}.tmp"
+    try:
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(
+                {
+                    "etag": etag,
+                    "last_modified": last_modified,
+                    "areas": areas,
+                },
+                file,
+                ensure_ascii=False,
+            )
+        os.replace(temp_path, path)
+    except OSError as e:
+        log_error(f"Failed to write area cache '{path}': {str(e)}")
+
+
+def parse_area_catalogue(areas: list) -> list:
+    """Convert the raw /areas response into sorted GeoJSON features.
+
+    Areas whose names end with "- VÍ" are listed first, then the rest, each
+    group in alphabetical order.
+
+    Args:
+        areas (list): The decoded /areas response.
+
+    Returns:
+        list: GeoJSON-like Polygon features with "name" and "id" properties.
+    """
+    features = []
+
+    for i in areas:
+        id_area = i["id_area"]
+        area_json = i["area_json"]
+        area_name = area_json["name"]
+        # The API serves [lat, lon] pairs
+        area_polygon = [
+            [coord_yx[1], coord_yx[0]] for coord_yx in area_json["polygon"]
+        ]
+        area_polygon.append(area_polygon[0])  # Ensure closure
+        area_polygon.reverse()
+
+        features.append(
+            {
+                "type": "Feature",
+                "properties": {"name": area_name, "id": id_area},
+                "geometry": {
+                    "type": "Polygon",
+                    "coordinates": [area_polygon],
+                },
+            }
+        )
+
+    features.sort(
+        key=lambda feature: (
+            not feature["properties"]["name"].endswith("- VÍ"),
+            feature["properties"]["name"],
+        )
+    )
+    return features
+
+
+Area = namedtuple(
+    "Area", ["id", "name", "geometry", "payload_polygon", "display_geometry"]
+)
+Area.__doc__ = """An area of the catalogue with its derived representations.
+
+Attributes:
+    id: The id of the area in the API.
+    name (str): The name shown in the dock.
+    geometry (shapely.Polygon): The area in lon/lat, oriented by the
+        right-hand rule and prepared for repeated predicates.
+    payload_polygon (list): [lat, lon] pairs for the "area" key of a
+        quakefilter payload.
+    display_geometry (dict): GeoJSON mapping of `geometry`.
+"""
+
+
+class AreaRegistry:
+    """The area catalogue indexed by name, id and location.
+
+    Args:
+        features (list): Area features as returned by
+            parse_area_catalogue(), in the order they are listed.
+    """
+
+    def __init__(self, features: list):
+        self.areas = []
+        for feature in features:
+            coordinates = feature["geometry"]["coordinates"][0]
+            geometry = orient(shape(feature["geometry"]), sign=1.0)
+            shapely.prepare(geometry)
+            self.areas.append(
+                Area(
+                    id=feature["properties"]["id"],
+                    name=feature["properties"]["name"],
+                    geometry=geometry,
+                    payload_polygon=[[lat, lon] for lon, lat in coordinates],
+                    display_geometry=mapping(geometry),
+                )
+            )
+        # The first area wins if a name or id is listed twice
+        self._by_name = {}
+        self._by_id = {}
+        for area in self.areas:
+            self._by_name.setdefault(area.name, area)
+            self._by_id.setdefault(area.id, area)
+        self._tree = STRtree([area.geometry for area in self.areas])
+
+    @classmethod
+    def from_catalogue(cls, areas: list) -> "AreaRegistry":
+        """Build the registry of a raw /areas response."""
+        return cls(parse_area_catalogue(areas))
+
+    def __len__(self) -> int:
+        return len(self.areas)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._by_name
+
+    def names(self) -> list:
+        """Return the area names in catalogue order."""
+        return [area.name for area in self.areas]
+
+    def get(self, name: str) -> Area:
+        """Return the area with a name, or None."""
+        return self._by_name.get(name)
+
+    def by_id(self, area_id) -> Area:
+        """Return the area with an API id, or None."""
+        return self._by_id.get(area_id)
+
+    def containing(self, lon: float, lat: float) -> list:
+        """Return the areas that contain a point, in catalogue order."""
+        return self._query(Point(lon, lat))
+
+    def intersecting(self, extent: tuple) -> list:
+        """Return the areas that intersect an extent, in catalogue order.
+
+        Args:
+            extent (tuple): (xmin, ymin, xmax, ymax) in lon/lat.
+        """
+        return self._query(box(*extent))
+
+    def _query(self, geometry) -> list:
+        if not self.areas:
+            return []
+        indices = self._tree.query(geometry, predicate="intersects")
+        return [self.areas[index] for index in sorted(indices)]
+
+
+def payload_polygon(areas: list) -> list:
+    """Return the "area" of a quakefilter payload covering all areas.
+
+    A single area is sent as it is. The API takes one polygon only, so
+    several areas are sent as the convex hull of their union and the
+    events are assigned to the areas locally, see assign_areas().
+
+    Args:
+        areas (list): Area tuples from the registry, at least one.
+
+    Returns:
+        list: A closed ring of [lat, lon] pairs.
+    """
+    if len(areas) == 1:
+        return areas[0].payload_polygon
+    hull = orient(
+        shapely.union_all([area.geometry for area in areas]).convex_hull,
+        sign=1.0,
+    )
+    return [[lat, lon] for lon, lat in hull.exterior.coords]
+
+
+def payload_area_covers(outer: list, inner: list) -> bool:
+    """Return whether one payload "area" contains another.
+
+    e.g. the hull sent for several areas covers the polygon of each of
+    them, so the events of one can be selected from those of the hull. A
+    tolerance absorbs rounding where an area touches the hull.
+
+    Args:
+        outer (list): A closed ring of [lat, lon] pairs.
+        inner (list): A closed ring of [lat, lon] pairs.
+
+    Returns:
+        bool: True if no point of `inner` lies outside `outer`.
+    """
+    return shapely.Polygon(outer).buffer(AREA_TOLERANCE).covers(
+        shapely.Polygon(inner)
+    )
+
+
+def assign_areas(areas: list, lon: np.ndarray, lat: np.ndarray) -> np.ndarray:
+    """Return the area each point lies in.
+
+    The points inside the bounds of an area are found with array
+    comparisons and only those are tested against its prepared geometry,
+    in one vectorized call without creating a geometry per point.
+
+    Args:
+        areas (list): Area tuples from the registry.
+        lon (np.ndarray): Longitudes of the points.
+        lat (np.ndarray): Latitudes of the points.
+
+    Returns:
+        np.ndarray: The index into `areas` of the first area containing
+        each point, -1 for points in none of them or with NaN coordinates.
+    """
+    lon = np.asarray(lon, dtype=np.float64)
+    lat = np.asarray(lat, dtype=np.float64)
+    assigned = np.full(lon.shape, -1, dtype=np.int64)
+    # The first area wins where areas overlap
+    for index in reversed(range(len(areas))):
+        geometry = areas[index].geometry
+        xmin, ymin, xmax, ymax = geometry.bounds
+        candidates = np.flatnonzero(
+            (lon >= xmin) & (lon <= xmax) & (lat >= ymin) & (lat <= ymax)
+        )
+        inside = shapely.contains_xy(
+            geometry, lon[candidates], lat[candidates]
+        )
+        assigned[candidates[inside]] = index
+    return assigned
+
+
+class AreaCatalogueRefreshTask(QgsTask):
+    """Revalidate the cached area catalogue in the background.
+
+    After the task has completed, `changed` tells whether the catalogue
+    differs from the one the dock was populated with, and `areas` holds
+    the new raw catalogue if it does.
+
+    Args:
+        cached (dict): The cached catalogue as returned by
+            load_cached_catalogue(), or None.
+    """
+
+    def __init__(self, cached: dict = None):
+        super().__init__("Refreshing Skjálftalísa areas", QgsTask.CanCancel)
+        self.cached = cached
+        self.areas = None
+        self.changed = False
+        self.exception = None
+
+    def run(self) -> bool:
+        headers = {}
+        if self.cached:
+            if self.cached.get("etag"):
+                headers["If-None-Match"] = self.cached["etag"]
+            if self.cached.get("last_modified"):
+                headers["If-Modified-Since"] = self.cached["last_modified"]
+
+        try:
+            response = get_http_client().get(
+                AREA_API_ENDPOINT,
+                feedback=FetchFeedback(self.isCanceled),
+                headers=headers,
+            )
+            if response.status_code == 304:
+                return True  # The cached catalogue is still current
+            if response.status_code != 200:
+                raise ApiRequestError(
+                    f"Failed to fetch areas:"
+                    f" {response.status_code} - {response.text}"
+                )
+
+            areas = response.json()
+            if self.isCanceled():
+                return False
+
+            etag = response.headers.get("ETag")
+            last_modified = response.headers.get("Last-Modified")
+            save_cached_catalogue(areas, etag, last_modified)
+
+            if self.cached is None or catalogue_digest(
+                areas
+            ) != catalogue_digest(self.cached["areas"]):
+                self.areas = areas
+                self.changed = True
+            return True
+
+        except Exception as e:
+            self.exception = e
+            return False
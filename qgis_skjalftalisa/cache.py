@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""An in-memory cache of decoded quakefilter results.
+
+Completed catalogues are kept per payload (see payload_key), so that
+switching back to a recent query loads the layer without a request.
+Windows that end close to now still receive events and expire quickly;
+historical windows are kept longer. The least recently used catalogues are
+evicted once the estimated size of the cache exceeds its budget.
+"""
+
+import threading
+import time
+
+from collections import OrderedDict
+
+from qgis.core import QgsSettings
+
+from .api import payload_key, payload_time_to_epoch
+from .catalogue import EarthquakeCatalogue
+
+SETTINGS_PREFIX = "qgis_skjalftalisa/cache"
+
+DEFAULT_MAX_MB = 256
+
+# Windows ending less than this long ago count as recent
+RECENT_WINDOW_SECONDS = 2 * 3600
+
+DEFAULT_RECENT_TTL_SECONDS = 60
+DEFAULT_HISTORICAL_TTL_SECONDS = 3600
+
+
+class ResponseCache:
+    """A least recently used cache of catalogues with expiry.
+
+    Args:
+        max_bytes (int): Estimated size the cache is evicted down to.
+        recent_ttl (float): Seconds a window ending close to now is kept.
+        historical_ttl (float): Seconds any other window is kept.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int,
+        recent_ttl: float = DEFAULT_RECENT_TTL_SECONDS,
+        historical_ttl: float = DEFAULT_HISTORICAL_TTL_SECONDS,
+    ):
+        self.max_bytes = max_bytes
+        self.recent_ttl = recent_ttl
+        self.historical_ttl = historical_ttl
+        self.hits = 0
+        self.misses = 0
+        self.bytes = 0
+        # key -> (expires, estimated bytes, catalogue), oldest use first
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls) -> "ResponseCache":
+        """Create a cache with the budget and expiry from QgsSettings."""
+        settings = QgsSettings()
+        return cls(
+            max_bytes=settings.value(
+                f"{SETTINGS_PREFIX}/max_mb", DEFAULT_MAX_MB, type=int
+            )
+            * 1024
+            * 1024,
+            recent_ttl=settings.value(
+                f"{SETTINGS_PREFIX}/recent_ttl",
+                DEFAULT_RECENT_TTL_SECONDS,
+                type=float,
+            ),
+            historical_ttl=settings.value(
+                f"{SETTINGS_PREFIX}/historical_ttl",
+                DEFAULT_HISTORICAL_TTL_SECONDS,
+                type=float,
+            ),
+        )
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, payload: dict) -> EarthquakeCatalogue:
+        """Return a copy of the cached catalogue of a payload, or None.
+
+        Args:
+            payload (dict): The quakefilter request payload.
+        """
+        key = payload_key(payload)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= time.monotonic():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2].copy()
+
+    def put(self, payload: dict, catalogue: EarthquakeCatalogue) -> None:
+        """Cache a copy of the complete catalogue of a payload.
+
+        Args:
+            payload (dict): The quakefilter request payload.
+            catalogue (EarthquakeCatalogue): All events of the payload.
+                Not cached if its feature dictionaries have been released,
+                as its layer could not be rebuilt.
+        """
+        if not catalogue.has_features():
+            return
+        size = catalogue.estimated_bytes()
+        if size > self.max_bytes:
+            return  # Would evict everything else and itself
+        expires = time.monotonic() + self.ttl(payload)
+        key = payload_key(payload)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (expires, size, catalogue.copy())
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def ttl(self, payload: dict) -> float:
+        """Return how many seconds the result of a payload stays valid."""
+        end = payload_time_to_epoch(payload["end_time"])
+        if end > time.time() - RECENT_WINDOW_SECONDS:
+            return self.recent_ttl
+        return self.historical_ttl
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def summary(self) -> str:
+        """Return the hit and miss counts for the dock."""
+        return f"Cache: {self.hits} hits, {self.misses} misses"
+
+    def _remove(self, key: str) -> None:
+        _, size, _ = self._entries.pop(key)
+        self.bytes -= size
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> ResponseCache:
+    """Return the plugin-wide response cache, creating it on first use."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache.from_settings()
+        return _cache
+
+
+def close_response_cache() -> None:
+    """Drop the plugin-wide response cache, e.g. when the plugin unloads."""
+    global _cache
+    with _cache_lock:
+        if _cache is not None:
+            _cache.clear()
+            _cache = None
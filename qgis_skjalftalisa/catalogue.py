@@ -0,0 +1,298 @@
+# -*- coding: utf-8 -*-
+"""Column arrays of decoded earthquakes.
+
+The numeric columns are computed once, in the background task that decodes
+the response, so that building the layer and its symbology never has to
+iterate the features again.
+"""
+
+import warnings
+
+import numpy as np
+
+from .api import feature_event_id, parse_event_time
+
+TIME_FIELD = "time"
+NUMERIC_TIME_FIELD = "__time_numeric"
+SIZE_FIELD = "__size"
+IN_AREA_FIELD = "__in_area"
+AREA_FIELD = "area"
+
+# Marker sizes (mm) of the smallest and largest magnitude in a catalogue
+MARKER_SIZE_MIN = 1.0
+MARKER_SIZE_MAX = 10.0
+
+# Approximate size of one decoded feature dictionary with its values
+FEATURE_BYTES_ESTIMATE = 1500
+
+
+def parse_event_times(values: list) -> np.ndarray:
+    """Convert event times to seconds since the epoch in one pass.
+
+    ISO 8601 strings are parsed by numpy in a single vectorized call; any
+    value numpy cannot parse makes the whole column fall back to
+    parse_event_time().
+
+    Args:
+        values (list): The "time" properties of the features.
+
+    Returns:
+        np.ndarray: float64 seconds since the epoch, NaN where the time is
+        missing or invalid.
+    """
+    try:
+        with warnings.catch_warnings():
+            # numpy warns about, but still parses, zone designators
+            warnings.simplefilter("ignore")
+            stamps = np.array(values, dtype="datetime64[ms]")
+        seconds = stamps.astype(np.int64) / 1000.0
+        seconds[np.isnat(stamps)] = np.nan
+        return seconds
+    except (ValueError, TypeError):
+        return np.array(
+            [parse_event_time(value) for value in values], dtype=np.float64
+        )
+
+
+def scale_marker_sizes(magnitude: np.ndarray, magnitude_range) -> np.ndarray:
+    """Scale magnitudes linearly to marker sizes.
+
+    This is what scale_linear("magnitude", minimum("magnitude"),
+    maximum("magnitude"), 1, 10) evaluates to, computed once for all events
+    instead of for every feature on every repaint.
+
+    Args:
+        magnitude (np.ndarray): Event magnitudes.
+        magnitude_range (tuple): (min, max) magnitude of the catalogue.
+
+    Returns:
+        np.ndarray: Marker sizes, NaN where the magnitude is unknown or all
+        magnitudes are equal, in which case the symbol's own size is used.
+    """
+    if magnitude_range is None:
+        return np.full(magnitude.shape, np.nan)
+    low, high = magnitude_range
+    if high <= low:
+        return np.full(magnitude.shape, np.nan)
+    scaled = MARKER_SIZE_MIN + (magnitude - low) / (high - low) * (
+        MARKER_SIZE_MAX - MARKER_SIZE_MIN
+    )
+    return np.clip(scaled, MARKER_SIZE_MIN, MARKER_SIZE_MAX)
+
+
+class EarthquakeCatalogue:
+    """Decoded earthquakes with their numeric properties as columns.
+
+    The feature dictionaries are only needed to add the events to a layer
+    and are dropped with release_features() once that has been done.
+
+    Args:
+        features (list): GeoJSON-like feature dictionaries from the API.
+        event_id (list): The identifier of each event, see
+            feature_event_id().
+        time (np.ndarray): Event times in seconds since the epoch.
+        magnitude (np.ndarray): Event magnitudes.
+        depth (np.ndarray): Event depths in km.
+        lon (np.ndarray): Event longitudes.
+        lat (np.ndarray): Event latitudes.
+        marker_size (np.ndarray): Marker sizes; scaled from the magnitudes
+            of this catalogue if not given.
+        fid (np.ndarray): Feature ids of the events once they have been
+            added to a layer, -1 before that.
+        in_area (np.ndarray): Whether each event lies in the areas that
+            are filtered locally; all True if not given.
+        area (np.ndarray): The name of the selected area each event lies
+            in, an object array that is None where there is none.
+    """
+
+    def __init__(
+        self,
+        features,
+        event_id,
+        time,
+        magnitude,
+        depth,
+        lon,
+        lat,
+        marker_size=None,
+        fid=None,
+        in_area=None,
+        area=None,
+    ):
+        self.features = features
+        self.event_id = event_id
+        self.time = time
+        self.magnitude = magnitude
+        self.depth = depth
+        self.lon = lon
+        self.lat = lat
+        if marker_size is None:
+            marker_size = scale_marker_sizes(
+                magnitude, self.magnitude_range()
+            )
+        self.marker_size = marker_size
+        if fid is None:
+            fid = np.full(len(features), -1, dtype=np.int64)
+        self.fid = fid
+        if in_area is None:
+            in_area = np.ones(len(features), dtype=bool)
+        self.in_area = in_area
+        if area is None:
+            area = np.full(len(features), None, dtype=object)
+        self.area = area
+
+    @classmethod
+    def from_features(cls, features: list) -> "EarthquakeCatalogue":
+        """Build the columns of a list of quakefilter features.
+
+        Args:
+            features (list): GeoJSON-like Point feature dictionaries.
+
+        Returns:
+            EarthquakeCatalogue: The catalogue of the features.
+        """
+        properties = [feature.get("properties") or {} for feature in features]
+        coordinates = [
+            (feature.get("geometry") or {}).get("coordinates") or (None, None)
+            for feature in features
+        ]
+        return cls(
+            features,
+            event_id=[feature_event_id(feature) for feature in features],
+            time=parse_event_times([p.get("time") for p in properties]),
+            magnitude=np.array(
+                [p.get("magnitude") for p in properties], dtype=np.float64
+            ),
+            depth=np.array(
+                [p.get("depth") for p in properties], dtype=np.float64
+            ),
+            lon=np.array([c[0] for c in coordinates], dtype=np.float64),
+            lat=np.array([c[1] for c in coordinates], dtype=np.float64),
+        )
+
+    def __len__(self) -> int:
+        return len(self.features)
+
+    def time_range(self) -> tuple:
+        """Return (min, max) of the event times, or None if there are none."""
+        return _finite_range(self.time)
+
+    def magnitude_range(self) -> tuple:
+        """Return (min, max) of the magnitudes, or None if there are none."""
+        return _finite_range(self.magnitude)
+
+    def magnitude_threshold(self, budget: int) -> float:
+        """Return the magnitude that at most `budget` events exceed.
+
+        Found with a partial sort, so it stays cheap for large catalogues.
+
+        Args:
+            budget (int): The most events that may exceed the magnitude.
+
+        Returns:
+            float: The magnitude, None if no more than `budget` events
+            have one.
+        """
+        finite = self.magnitude[np.isfinite(self.magnitude)]
+        if len(finite) <= budget:
+            return None
+        # The (budget + 1)-th largest; ties with it are left out as well
+        index = len(finite) - budget - 1
+        return float(np.partition(finite, index)[index])
+
+    def rescale_marker_sizes(self) -> None:
+        """Scale the marker sizes to the current magnitude range."""
+        self.marker_size = scale_marker_sizes(
+            self.magnitude, self.magnitude_range()
+        )
+
+    def subset(self, mask: np.ndarray) -> "EarthquakeCatalogue":
+        """Return the events selected by a boolean mask.
+
+        The marker sizes are kept as they are, i.e. relative to the
+        magnitude range of this catalogue.
+        """
+        rows = np.flatnonzero(mask)
+        return EarthquakeCatalogue(
+            [self.features[row] for row in rows],
+            [self.event_id[row] for row in rows],
+            self.time[rows],
+            self.magnitude[rows],
+            self.depth[rows],
+            self.lon[rows],
+            self.lat[rows],
+            marker_size=self.marker_size[rows],
+            fid=self.fid[rows],
+            in_area=self.in_area[rows],
+            area=self.area[rows],
+        )
+
+    def copy(self) -> "EarthquakeCatalogue":
+        """Return a copy that is not yet in any layer.
+
+        The feature dictionaries are shared, as they are never modified.
+        """
+        catalogue = self.subset(np.ones(len(self), dtype=bool))
+        catalogue.fid[:] = -1
+        return catalogue
+
+    def release_features(self) -> None:
+        """Drop the feature dictionaries, keeping the columns.
+
+        The released rows cannot be added to a layer any more; events
+        appended afterwards can.
+        """
+        self.features = [None] * len(self.features)
+
+    def has_features(self) -> bool:
+        """Return whether no feature dictionaries have been released."""
+        return all(feature is not None for feature in self.features)
+
+    def estimated_bytes(self) -> int:
+        """Return a rough estimate of the memory held by the catalogue."""
+        columns = sum(
+            getattr(self, column).nbytes
+            for column in (
+                "time",
+                "magnitude",
+                "depth",
+                "lon",
+                "lat",
+                "marker_size",
+                "fid",
+                "in_area",
+                "area",
+            )
+        )
+        return columns + len(self) * FEATURE_BYTES_ESTIMATE
+
+    def extend(self, other: "EarthquakeCatalogue") -> None:
+        """Append the events of another catalogue to this one.
+
+        Marker sizes are not rescaled, see rescale_marker_sizes().
+        """
+        self.features = self.features + other.features
+        self.event_id = self.event_id + other.event_id
+        for column in (
+            "time",
+            "magnitude",
+            "depth",
+            "lon",
+            "lat",
+            "marker_size",
+            "fid",
+            "in_area",
+            "area",
+        ):
+            setattr(
+                self,
+                column,
+                np.concatenate((getattr(self, column), getattr(other, column))),
+            )
+
+
+def _finite_range(values: np.ndarray) -> tuple:
+    finite = values[np.isfinite(values)]
+    if not finite.size:
+        return None
+    return float(finite.min()), float(finite.max())
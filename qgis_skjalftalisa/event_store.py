@@ -0,0 +1,430 @@
+# -*- coding: utf-8 -*-
+"""A persistent store of fetched events in the QGIS profile.
+
+Events are stored per filter key (the payload without its time window, see
+payload_filter_key) together with the time intervals that have been fetched
+for that key. A new request then only downloads the parts of its window
+that are not covered yet and answers the rest from the store.
+"""
+
+import json
+import os
+import sqlite3
+import time
+
+from contextlib import contextmanager
+
+from qgis.core import QgsSettings
+
+from .api import (
+    STREAM_BATCH_SIZE,
+    epoch_to_payload_time,
+    feature_event_id,
+    fetch_earthquakes,
+    parse_event_time,
+    payload_filter_key,
+    payload_time_to_epoch,
+    stream_earthquakes,
+)
+from .utils import log_error, profile_dir
+
+EVENT_STORE_FILE = "events.sqlite"
+
+# The most recent part of a window is never marked as covered, because
+# the catalogue still receives and revises events for a while
+SETTLE_SECONDS = 2 * 3600
+
+# Filters that have not been used for this long are dropped from the store
+MAX_UNUSED_SECONDS = 30 * 24 * 3600
+
+SETTINGS_PREFIX = "qgis_skjalftalisa/store"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS filters (
+    filter_key TEXT PRIMARY KEY,
+    last_used REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS coverage (
+    filter_key TEXT NOT NULL,
+    start REAL NOT NULL,
+    end REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS coverage_key ON coverage (filter_key);
+CREATE TABLE IF NOT EXISTS events (
+    filter_key TEXT NOT NULL,
+    event_id TEXT NOT NULL,
+    time REAL NOT NULL,
+    feature TEXT NOT NULL,
+    PRIMARY KEY (filter_key, event_id)
+);
+CREATE INDEX IF NOT EXISTS events_key_time ON events (filter_key, time);
+"""
+
+
+def merge_intervals(intervals: list) -> list:
+    """Merge overlapping or touching intervals.
+
+    Args:
+        intervals (list): (start, end) tuples in any order.
+
+    Returns:
+        list: Disjoint (start, end) tuples in ascending order.
+    """
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def missing_intervals(start: float, end: float, covered: list) -> list:
+    """Return the parts of a window that are not covered.
+
+    Args:
+        start (float): Start of the window.
+        end (float): End of the window.
+        covered (list): (start, end) tuples that are already available.
+
+    Returns:
+        list: (start, end) tuples of the gaps in ascending order.
+    """
+    gaps = []
+    cursor = start
+    for covered_start, covered_end in merge_intervals(covered):
+        if covered_end <= cursor:
+            continue
+        if covered_start >= end:
+            break
+        if covered_start > cursor:
+            gaps.append((cursor, covered_start))
+        cursor = max(cursor, covered_end)
+    if cursor < end:
+        gaps.append((cursor, end))
+    return gaps
+
+
+class EventStore:
+    """SQLite store of events and the time intervals they cover.
+
+    A connection is opened for every operation so that the store can be
+    used from background tasks.
+
+    Args:
+        path (str): Path of the SQLite database, created if missing.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with self._connect() as connection:
+            connection.executescript(SCHEMA)
+
+    @classmethod
+    def default(cls) -> "EventStore":
+        """Open the store in the plugin's profile directory."""
+        return cls(os.path.join(profile_dir(), EVENT_STORE_FILE))
+
+    @contextmanager
+    def _connect(self):
+        """Open a connection, commit on success and always close it."""
+        connection = sqlite3.connect(self.path, timeout=30)
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def covered_intervals(self, filter_key: str) -> list:
+        """Return the intervals fetched for a filter key."""
+        with self._connect() as connection:
+            rows = connection.execute(
+                "SELECT start, end FROM coverage WHERE filter_key = ?",
+                (filter_key,),
+            ).fetchall()
+        return merge_intervals(rows)
+
+    def missing_intervals(
+        self, filter_key: str, start: float, end: float
+    ) -> list:
+        """Return the parts of a window that still have to be fetched."""
+        return missing_intervals(
+            start, end, self.covered_intervals(filter_key)
+        )
+
+    def add(
+        self,
+        filter_key: str,
+        start: float,
+        end: float,
+        features: list,
+        covered_until: float = None,
+    ) -> None:
+        """Store the events fetched for an interval.
+
+        Args:
+            filter_key (str): The filter key the events were fetched with.
+            start (float): Start of the fetched interval.
+            end (float): End of the fetched interval.
+            features (list): The fetched quakefilter features.
+            covered_until (float): Record the interval as covered only up to
+                this time, e.g. to keep refetching recent events.
+        """
+        rows = []
+        for feature in features:
+            event_time = parse_event_time(
+                (feature.get("properties") or {}).get("time")
+            )
+            rows.append(
+                (
+                    filter_key,
+                    json.dumps(feature_event_id(feature)),
+                    start if event_time is None else event_time,
+                    json.dumps(feature, separators=(",", ":")),
+                )
+            )
+
+        if covered_until is not None:
+            end = min(end, covered_until)
+
+        with self._connect() as connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO events VALUES (?, ?, ?, ?)", rows
+            )
+            if end > start:
+                intervals = merge_intervals(
+                    connection.execute(
+                        "SELECT start, end FROM coverage"
+                        " WHERE filter_key = ?",
+                        (filter_key,),
+                    ).fetchall()
+                    + [(start, end)]
+                )
+                connection.execute(
+                    "DELETE FROM coverage WHERE filter_key = ?", (filter_key,)
+                )
+                connection.executemany(
+                    "INSERT INTO coverage VALUES (?, ?, ?)",
+                    [(filter_key, s, e) for s, e in intervals],
+                )
+            self._touch(connection, filter_key)
+
+    def discard(self, filter_key: str, start: float, end: float) -> None:
+        """Drop the stored events of a window, e.g. before refetching it.
+
+        Events the catalogue has since revised or deleted would otherwise
+        stay in the store.
+        """
+        with self._connect() as connection:
+            connection.execute(
+                "DELETE FROM events"
+                " WHERE filter_key = ? AND time >= ? AND time <= ?",
+                (filter_key, start, end),
+            )
+
+    def features(self, filter_key: str, start: float, end: float) -> list:
+        """Return the stored events of a window in chronological order."""
+        return [
+            feature
+            for batch in self.iter_features(filter_key, start, end)
+            for feature in batch
+        ]
+
+    def iter_features(
+        self,
+        filter_key: str,
+        start: float,
+        end: float,
+        batch_size: int = STREAM_BATCH_SIZE,
+        include_start: bool = True,
+        include_end: bool = True,
+    ):
+        """Yield the stored events of a window in chronological batches.
+
+        The rows are read with a cursor, so only one batch is decoded at a
+        time.
+
+        Args:
+            filter_key (str): The filter key the events were fetched with.
+            start (float): Start of the window.
+            end (float): End of the window.
+            batch_size (int): Number of features per batch.
+            include_start (bool): Include events at exactly `start`.
+            include_end (bool): Include events at exactly `end`.
+
+        Yields:
+            list: GeoJSON-like feature dictionaries.
+        """
+        with self._connect() as connection:
+            self._touch(connection, filter_key)
+        # No write is pending on this connection, so it holds no lock
+        # while the consumer handles a batch
+        with self._connect() as connection:
+            cursor = connection.execute(
+                "SELECT feature FROM events WHERE filter_key = ?"
+                f" AND time {'>=' if include_start else '>'} ?"
+                f" AND time {'<=' if include_end else '<'} ?"
+                " ORDER BY time",
+                (filter_key, start, end),
+            )
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    return
+                yield [json.loads(row[0]) for row in rows]
+
+    def prune(self, max_unused: float = MAX_UNUSED_SECONDS) -> None:
+        """Drop the events of filters that have not been used for a while."""
+        threshold = time.time() - max_unused
+        with self._connect() as connection:
+            stale = [
+                row[0]
+                for row in connection.execute(
+                    "SELECT filter_key FROM filters WHERE last_used < ?",
+                    (threshold,),
+                )
+            ]
+            for table in ("events", "coverage", "filters"):
+                connection.executemany(
+                    f"DELETE FROM {table} WHERE filter_key = ?",
+                    [(key,) for key in stale],
+                )
+
+    def _touch(self, connection: sqlite3.Connection, filter_key: str):
+        connection.execute(
+            "INSERT OR REPLACE INTO filters VALUES (?, ?)",
+            (filter_key, time.time()),
+        )
+
+
+def store_enabled() -> bool:
+    """Return whether fetched events should be kept in the event store."""
+    return QgsSettings().value(f"{SETTINGS_PREFIX}/enabled", True, type=bool)
+
+
+def fetch_earthquakes_stored(
+    payload: dict, feedback, store: EventStore
+) -> list:
+    """Fetch only the parts of a window that are not in the store.
+
+    The gaps are fetched with fetch_earthquakes() and replace what the
+    store held for them. Unless the gaps make up the whole window, it is
+    then answered from the store, and the events answered from the store
+    are counted in the feedback as well.
+
+    Args:
+        payload (dict): The quakefilter request payload.
+        feedback (FetchFeedback): Receives progress, polled for cancellation.
+        store (EventStore): The store to read from and add to.
+
+    Returns:
+        list: GeoJSON-like feature dictionaries in chronological order.
+    """
+    filter_key = payload_filter_key(payload)
+    start = payload_time_to_epoch(payload["start_time"])
+    end = payload_time_to_epoch(payload["end_time"])
+    settled = time.time() - SETTLE_SECONDS
+
+    with feedback.times.measure("store"):
+        gaps = store.missing_intervals(filter_key, start, end)
+    for gap_start, gap_end in gaps:
+        gap_payload = dict(
+            payload,
+            start_time=epoch_to_payload_time(gap_start),
+            end_time=epoch_to_payload_time(gap_end),
+        )
+        features = fetch_earthquakes(gap_payload, feedback)
+        feedback.raise_if_canceled()
+        with feedback.times.measure("store"):
+            store.discard(filter_key, gap_start, gap_end)
+            store.add(filter_key, gap_start, gap_end, features, settled)
+
+    with feedback.times.measure("store"):
+        _prune(store)
+        if gaps == [(start, end)]:
+            return features
+        features = store.features(filter_key, start, end)
+    feedback.add_events(len(features) - feedback.events_received)
+    return features
+
+
+def stream_earthquakes_stored(
+    payload: dict,
+    feedback,
+    store: EventStore,
+    batch_size: int = STREAM_BATCH_SIZE,
+):
+    """Fetch the earthquakes of a payload in batches through the store.
+
+    The stored parts of the window are read first, batch by batch. Each
+    gap is then streamed from the API with stream_earthquakes() and every
+    batch is saved as it arrives; a gap is only marked as covered once its
+    whole response has been read.
+
+    Args:
+        payload (dict): The quakefilter request payload.
+        feedback (FetchFeedback): Receives progress, polled for cancellation.
+        store (EventStore): The store to read from and add to.
+        batch_size (int): Number of features per batch.
+
+    Yields:
+        list: GeoJSON-like feature dictionaries, at most batch_size at a
+        time.
+    """
+    filter_key = payload_filter_key(payload)
+    start = payload_time_to_epoch(payload["start_time"])
+    end = payload_time_to_epoch(payload["end_time"])
+    settled = time.time() - SETTLE_SECONDS
+
+    with feedback.times.measure("store"):
+        gaps = store.missing_intervals(filter_key, start, end)
+
+    # The fetch of a gap includes both of its ends, so the stored parts
+    # leave out the events on their boundaries with a gap
+    bounds = [start] + [bound for gap in gaps for bound in gap] + [end]
+    for stored_start, stored_end in zip(bounds[::2], bounds[1::2]):
+        if stored_end <= stored_start:
+            continue
+        batches = store.iter_features(
+            filter_key,
+            stored_start,
+            stored_end,
+            batch_size,
+            include_start=stored_start == start,
+            include_end=stored_end == end,
+        )
+        while True:
+            with feedback.times.measure("store"):
+                features = next(batches, None)
+            if features is None:
+                break
+            feedback.add_events(len(features))
+            yield features
+            feedback.raise_if_canceled()
+
+    for gap_start, gap_end in gaps:
+        gap_payload = dict(
+            payload,
+            start_time=epoch_to_payload_time(gap_start),
+            end_time=epoch_to_payload_time(gap_end),
+        )
+        with feedback.times.measure("store"):
+            store.discard(filter_key, gap_start, gap_end)
+        for features in stream_earthquakes(gap_payload, feedback, batch_size):
+            # An empty interval stores the events without any coverage
+            with feedback.times.measure("store"):
+                store.add(filter_key, gap_start, gap_start, features)
+            yield features
+        feedback.raise_if_canceled()
+        with feedback.times.measure("store"):
+            store.add(filter_key, gap_start, gap_end, [], settled)
+
+    with feedback.times.measure("store"):
+        _prune(store)
+
+
+def _prune(store: EventStore) -> None:
+    try:
+        store.prune()
+    except sqlite3.Error as e:
+        log_error(f"Failed to prune the event store: {str(e)}")
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+"""Exceptions raised by the Skjálftalísa plugin."""
+
+
+class InputValidationError(Exception):
+    """Raised when user input is invalid."""
+
+    pass
+
+
+class ApiRequestError(Exception):
+    """Riased when the API request fails."""
+
+    pass
+
+
+class GeoJsonProcessingError(Exception):
+    """Raised when processing GeoJSON data fails."""
+
+    pass
+
+
+class FetchCanceledError(Exception):
+    """Raised when a running fetch is cancelled by the user."""
+
+    pass
+
+
+class ApiServerError(ApiRequestError):
+    """Raised when the API fails on its side, e.g. with a 5xx status code or
+    by not answering in time. Such requests may succeed if repeated or made
+    smaller."""
+
+    pass
@@ -0,0 +1,328 @@
+# -*- coding: utf-8 -*-
+"""The HTTP client shared by every request the plugin makes.
+
+A single requests.Session keeps connections to the API alive between
+clicks, negotiates compressed responses, applies default timeouts and
+retries transient failures.
+"""
+
+import random
+import threading
+import time
+
+from collections import deque, namedtuple
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+import requests
+
+from requests.adapters import HTTPAdapter
+from urllib3.util.request import ACCEPT_ENCODING
+
+from qgis.core import QgsSettings
+
+# Default (connect, read) timeouts in seconds, overridable in the settings
+DEFAULT_CONNECT_TIMEOUT = 5.0
+DEFAULT_READ_TIMEOUT = 60.0
+
+# Retries of a request that failed with a transient error, and the base
+# and cap of the exponential backoff between them in seconds
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_BACKOFF = 1.0
+MAX_BACKOFF = 30.0
+
+# Statuses worth retrying as they are. A sliced fetch that still gets a
+# 5xx once the retries are used up asks for less, see ApiServerError.
+RETRY_STATUSES = frozenset((429, 502, 503, 504))
+
+# A Retry-After longer than this is not waited for
+MAX_RETRY_AFTER = 120.0
+
+# Number of connections kept alive per host
+POOL_MAXSIZE = 8
+
+# Size of the chunks read from a streamed response body
+CHUNK_SIZE = 64 * 1024
+
+SETTINGS_PREFIX = "qgis_skjalftalisa/http"
+
+TransferStats = namedtuple(
+    "TransferStats",
+    ["method", "url", "status", "wire_bytes", "decoded_bytes", "elapsed"],
+)
+
+
+class HttpClient:
+    """Pooled HTTP client with compression, timeouts and retries.
+
+    ACCEPT_ENCODING advertises gzip and deflate, plus brotli when a brotli
+    decoder is installed, so the server can compress the large quakefilter
+    responses. Every request records a TransferStats entry that compares
+    the bytes on the wire with the decoded body size.
+
+    Args:
+        connect_timeout (float): Seconds to wait for a connection.
+        read_timeout (float): Seconds to wait between bytes of a response.
+        pool_maxsize (int): Connections kept alive per host.
+        max_retries (int): Retries of a transiently failed request.
+        backoff (float): Seconds before the first retry; doubled for every
+            further one, up to MAX_BACKOFF.
+    """
+
+    def __init__(
+        self,
+        connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+        read_timeout: float = DEFAULT_READ_TIMEOUT,
+        pool_maxsize: int = POOL_MAXSIZE,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        backoff: float = DEFAULT_BACKOFF,
+    ):
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.transfers = deque(maxlen=100)  # most recent TransferStats
+        self._lock = threading.Lock()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_maxsize)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update(
+            {"Accept": "application/json", "Accept-Encoding": ACCEPT_ENCODING}
+        )
+
+    @classmethod
+    def from_settings(cls) -> "HttpClient":
+        """Create a client with the timeouts configured in QgsSettings."""
+        settings = QgsSettings()
+        return cls(
+            connect_timeout=settings.value(
+                f"{SETTINGS_PREFIX}/connect_timeout",
+                DEFAULT_CONNECT_TIMEOUT,
+                type=float,
+            ),
+            read_timeout=settings.value(
+                f"{SETTINGS_PREFIX}/read_timeout",
+                DEFAULT_READ_TIMEOUT,
+                type=float,
+            ),
+            max_retries=settings.value(
+                f"{SETTINGS_PREFIX}/max_retries",
+                DEFAULT_MAX_RETRIES,
+                type=int,
+            ),
+            backoff=settings.value(
+                f"{SETTINGS_PREFIX}/backoff", DEFAULT_BACKOFF, type=float
+            ),
+        )
+
+    def request(
+        self, method: str, url: str, feedback=None, **kwargs
+    ) -> requests.Response:
+        """Send a request through the pooled session.
+
+        Connection failures, read timeouts while waiting for the response
+        headers and RETRY_STATUSES are retried up to `max_retries` times,
+        after the server's Retry-After or else an exponential backoff with
+        jitter. Every request the plugin makes is a query, so repeating one
+        is safe. Failures while a streamed body is read are not retried, as
+        part of it has been consumed.
+
+        Args:
+            method (str): HTTP method, e.g. "GET" or "POST".
+            url (str): The URL to request.
+            feedback (FetchFeedback): Optional; is told about retries and
+                polled for cancellation while waiting for one.
+            **kwargs: Passed on to requests.Session.request. The client's
+                timeouts are used unless `timeout` is given.
+
+        Returns:
+            requests.Response: The response of the last attempt. Its body
+            has not been read if `stream=True` was passed.
+
+        Raises:
+            requests.RequestException: If the last attempt failed.
+            FetchCanceledError: If cancelled while waiting to retry.
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        attempt = 0
+        while True:
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.ReadTimeout) as e:
+                # A read timeout here is one before the headers arrived, or
+                # before the whole body did if it is not streamed
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._backoff_delay(attempt)
+                if isinstance(e, requests.ReadTimeout):
+                    reason = "no response in time"
+                else:
+                    reason = f"connection failed ({type(e).__name__})"
+            else:
+                if (
+                    response.status_code not in RETRY_STATUSES
+                    or attempt >= self.max_retries
+                ):
+                    return response
+                delay = retry_after_seconds(
+                    response.headers.get("Retry-After")
+                )
+                if delay is None:
+                    delay = self._backoff_delay(attempt)
+                elif delay > MAX_RETRY_AFTER:
+                    return response
+                reason = f"{response.status_code} {response.reason}"
+                response.close()
+
+            attempt += 1
+            if feedback is not None:
+                feedback.report_retry(attempt, self.max_retries, delay, reason)
+            self._wait(delay, feedback)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        """Send a GET request, read its body and record its statistics."""
+        started = time.monotonic()
+        response = self.request("GET", url, **kwargs)
+        self._record(response, started)
+        return response
+
+    def read_body(self, response: requests.Response, feedback=None) -> bytes:
+        """Read a streamed response body in chunks.
+
+        Args:
+            response (requests.Response): A response requested with
+                `stream=True`.
+            feedback (FetchFeedback): Optional, see iter_body().
+
+        Returns:
+            bytes: The decoded (decompressed) body.
+        """
+        return b"".join(self.iter_body(response, feedback))
+
+    def iter_body(self, response: requests.Response, feedback=None):
+        """Yield a streamed response body chunk by chunk.
+
+        The transfer is recorded once the body has been read completely.
+
+        Args:
+            response (requests.Response): A response requested with
+                `stream=True`.
+            feedback (FetchFeedback): Optional; receives the number of bytes
+                on the wire and decoded bytes, and is polled for
+                cancellation between chunks.
+
+        Yields:
+            bytes: Decoded (decompressed) chunks of the body.
+        """
+        started = time.monotonic()
+        decoded_bytes = 0
+        wire_bytes = 0
+        for chunk in response.iter_content(CHUNK_SIZE):
+            if feedback is not None:
+                feedback.raise_if_canceled()
+            decoded_bytes += len(chunk)
+            # tell() counts the raw, possibly compressed, bytes read, but
+            # not those of a chunked body, which are then counted decoded
+            wire_now = response.raw.tell()
+            if wire_now <= wire_bytes:
+                wire_now = wire_bytes + len(chunk)
+            if feedback is not None:
+                feedback.add_bytes(wire_now - wire_bytes, len(chunk))
+            wire_bytes = wire_now
+            yield chunk
+
+        self._record(response, started, decoded_bytes, wire_bytes)
+
+    def close(self) -> None:
+        """Close all pooled connections."""
+        self.session.close()
+
+    def _backoff_delay(self, attempt: int) -> float:
+        """Return the wait before a retry: half fixed, half random."""
+        ceiling = min(MAX_BACKOFF, self.backoff * 2**attempt)
+        return ceiling / 2 + random.uniform(0, ceiling / 2)
+
+    @staticmethod
+    def _wait(seconds: float, feedback=None) -> None:
+        """Sleep, but stop early if the feedback is cancelled."""
+        deadline = time.monotonic() + seconds
+        while True:
+            if feedback is not None:
+                feedback.raise_if_canceled()
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            time.sleep(min(remaining, 0.1))
+
+    def _record(
+        self,
+        response: requests.Response,
+        started: float,
+        decoded_bytes: int = None,
+        wire_bytes: int = None,
+    ) -> None:
+        if decoded_bytes is None:
+            decoded_bytes = len(response.content)
+        if wire_bytes is None:
+            try:
+                wire_bytes = response.raw.tell() or decoded_bytes
+            except AttributeError:
+                wire_bytes = decoded_bytes
+        stats = TransferStats(
+            method=response.request.method,
+            url=response.url,
+            status=response.status_code,
+            wire_bytes=wire_bytes,
+            decoded_bytes=decoded_bytes,
+            elapsed=time.monotonic() - started,
+        )
+        with self._lock:
+            self.transfers.append(stats)
+
+
+def retry_after_seconds(value: str) -> float:
+    """Parse a Retry-After header into seconds from now.
+
+    Args:
+        value (str): Delay in seconds or an HTTP date, or None.
+
+    Returns:
+        float: Seconds to wait, or None if the header is missing or
+        invalid.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_http_client() -> HttpClient:
+    """Return the plugin-wide HTTP client, creating it on first use."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = HttpClient.from_settings()
+        return _client
+
+
+def close_http_client() -> None:
+    """Close the plugin-wide HTTP client, e.g. when the plugin unloads."""
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
@@ -0,0 +1,628 @@
+# -*- coding: utf-8 -*-
+"""Building the earthquake layer directly from decoded API features.
+
+Features are inserted in batches into a memory provider layer with a typed
+schema, so the data is never written to or re-read from disk. Columns that
+were computed for the catalogue, such as the numeric time, are written
+with the features.
+
+The layers are set up for the QGIS temporal controller, which then steps
+through the events by filtering the loaded features. Their renderer can be
+wrapped in scale-dependent rules that only draw the larger events when
+zoomed out, see level_of_detail_renderer.
+
+Optionally (see layer_format) a completed layer is also written to a
+GeoPackage, which has a spatial index and is kept when the project is
+saved, and the layer is switched over to it.
+"""
+
+import json
+import math
+
+import numpy as np
+
+from qgis.PyQt.QtCore import QDateTime, Qt, QVariant
+from qgis.core import (
+    QgsAbstractFeatureSource,
+    QgsCoordinateReferenceSystem,
+    QgsCoordinateTransformContext,
+    QgsFeature,
+    QgsFeatureRenderer,
+    QgsField,
+    QgsFields,
+    QgsGeometry,
+    QgsGraduatedSymbolRenderer,
+    QgsPointXY,
+    QgsRuleBasedRenderer,
+    QgsSettings,
+    QgsVectorFileWriter,
+    QgsVectorLayer,
+    QgsVectorLayerTemporalProperties,
+    QgsWkbTypes,
+)
+
+from .api import payload_time_to_epoch
+from .catalogue import (
+    AREA_FIELD,
+    IN_AREA_FIELD,
+    NUMERIC_TIME_FIELD,
+    SIZE_FIELD,
+    TIME_FIELD,
+    EarthquakeCatalogue,
+)
+
+# Number of features handed to the provider at a time
+FEATURE_BATCH_SIZE = 5000
+
+# Number of features inspected to infer the type of each property
+SCHEMA_SAMPLE_SIZE = 100
+
+# "memory" keeps layers in memory only, "gpkg" also writes them to disk
+LAYER_FORMAT_SETTING = "qgis_skjalftalisa/layers/format"
+LAYER_FORMATS = ("memory", "gpkg")
+
+# Name of the table in the GeoPackages written by write_earthquake_geopackage
+GEOPACKAGE_LAYER_NAME = "earthquakes"
+
+# Scale denominators, widest first, beyond which at most the given number
+# of events are drawn; the whole catalogue is drawn at larger scales
+DETAIL_LEVELS = (
+    (2_000_000, 10_000),  # the whole country
+    (500_000, 50_000),  # a region such as Reykjanes
+)
+
+# Properties whose type is known up front
+KNOWN_FIELD_TYPES = {
+    TIME_FIELD: QVariant.DateTime,
+    "magnitude": QVariant.Double,
+    "depth": QVariant.Double,
+}
+
+
+def _field_type(values: list) -> QVariant.Type:
+    """Infer the QVariant type of a property from sample values."""
+    values = [value for value in values if value is not None]
+    if not values:
+        return QVariant.String
+    if all(isinstance(value, bool) for value in values):
+        return QVariant.Bool
+    if all(
+        isinstance(value, int) and not isinstance(value, bool)
+        for value in values
+    ):
+        return QVariant.LongLong
+    if all(
+        isinstance(value, (int, float)) and not isinstance(value, bool)
+        for value in values
+    ):
+        return QVariant.Double
+    return QVariant.String
+
+
+def earthquake_fields(features: list) -> QgsFields:
+    """Derive a typed schema from the properties of quakefilter features.
+
+    Args:
+        features (list): GeoJSON-like feature dictionaries.
+
+    Returns:
+        QgsFields: One field per property, in order of first appearance,
+        followed by the computed fields.
+    """
+    samples = {}
+    for feature in features[:SCHEMA_SAMPLE_SIZE]:
+        for key, value in (feature.get("properties") or {}).items():
+            samples.setdefault(key, []).append(value)
+
+    samples.pop(NUMERIC_TIME_FIELD, None)
+    samples.pop(SIZE_FIELD, None)
+    samples.pop(IN_AREA_FIELD, None)
+    samples.pop(AREA_FIELD, None)
+
+    fields = QgsFields()
+    for name, values in samples.items():
+        field_type = KNOWN_FIELD_TYPES.get(name) or _field_type(values)
+        fields.append(QgsField(name, field_type))
+
+    fields.append(QgsField(NUMERIC_TIME_FIELD, QVariant.Double))
+    fields.append(QgsField(SIZE_FIELD, QVariant.Double))
+    fields.append(QgsField(IN_AREA_FIELD, QVariant.Int))
+    fields.append(QgsField(AREA_FIELD, QVariant.String))
+    return fields
+
+
+def _attribute_value(value, field_type: QVariant.Type):
+    """Convert a property value to what the memory provider expects."""
+    if value is None:
+        return None
+    if field_type == QVariant.String and not isinstance(value, str):
+        return json.dumps(value, ensure_ascii=False)
+    return value
+
+
+def make_features(
+    catalogue: EarthquakeCatalogue, fields: QgsFields, start: int, stop: int
+) -> list:
+    """Convert a range of catalogue rows to QgsFeatures.
+
+    Args:
+        catalogue (EarthquakeCatalogue): The decoded earthquakes.
+        fields (QgsFields): The schema of the target layer.
+        start (int): First row to convert.
+        stop (int): Row after the last one to convert.
+
+    Returns:
+        list: QgsFeature objects ready for addFeatures().
+    """
+    computed = {
+        TIME_FIELD,
+        NUMERIC_TIME_FIELD,
+        SIZE_FIELD,
+        IN_AREA_FIELD,
+        AREA_FIELD,
+    }
+    names = fields.names()
+    types = [field.type() for field in fields]
+    copied = [
+        (index, name, field_type)
+        for index, (name, field_type) in enumerate(zip(names, types))
+        if name not in computed
+    ]
+    time_index = fields.indexOf(TIME_FIELD)
+    numeric_time_index = fields.indexOf(NUMERIC_TIME_FIELD)
+    size_index = fields.indexOf(SIZE_FIELD)
+    in_area_index = fields.indexOf(IN_AREA_FIELD)
+    area_index = fields.indexOf(AREA_FIELD)
+
+    qgs_features = []
+    for row in range(start, stop):
+        feature = catalogue.features[row]
+        properties = feature.get("properties") or {}
+        attributes = [None] * len(names)
+        for index, name, field_type in copied:
+            attributes[index] = _attribute_value(
+                properties.get(name), field_type
+            )
+
+        seconds = catalogue.time[row]
+        if not math.isnan(seconds):
+            if time_index >= 0:
+                attributes[time_index] = QDateTime.fromMSecsSinceEpoch(
+                    round(seconds * 1000), Qt.UTC
+                )
+            attributes[numeric_time_index] = float(seconds)
+
+        size = catalogue.marker_size[row]
+        if not math.isnan(size):
+            attributes[size_index] = float(size)
+        attributes[in_area_index] = int(catalogue.in_area[row])
+        attributes[area_index] = catalogue.area[row]
+
+        qgs_feature = QgsFeature(fields)
+        qgs_feature.setAttributes(attributes)
+        lon = catalogue.lon[row]
+        lat = catalogue.lat[row]
+        if not (math.isnan(lon) or math.isnan(lat)):
+            qgs_feature.setGeometry(
+                QgsGeometry.fromPointXY(QgsPointXY(float(lon), float(lat)))
+            )
+        qgs_features.append(qgs_feature)
+    return qgs_features
+
+
+def add_earthquake_features(
+    layer: QgsVectorLayer, catalogue: EarthquakeCatalogue
+) -> None:
+    """Insert the earthquakes of a catalogue into a memory layer in batches.
+
+    Args:
+        layer (QgsVectorLayer): A layer created by create_earthquake_layer.
+        catalogue (EarthquakeCatalogue): The decoded earthquakes.
+    """
+    _add_rows(layer, catalogue, 0)
+    layer.updateExtents()
+
+
+def _add_rows(
+    layer: QgsVectorLayer, catalogue: EarthquakeCatalogue, first: int
+) -> None:
+    """Insert the catalogue rows from `first` on and record their fids."""
+    provider = layer.dataProvider()
+    fields = layer.fields()
+    for start in range(first, len(catalogue), FEATURE_BATCH_SIZE):
+        stop = min(start + FEATURE_BATCH_SIZE, len(catalogue))
+        _, added = provider.addFeatures(
+            make_features(catalogue, fields, start, stop)
+        )
+        catalogue.fid[start : start + len(added)] = [
+            feature.id() for feature in added
+        ]
+
+
+def append_earthquake_features(
+    layer: QgsVectorLayer,
+    catalogue: EarthquakeCatalogue,
+    new_events: EarthquakeCatalogue,
+    rewrite_sizes: bool = True,
+) -> None:
+    """Append events to a layer created by create_earthquake_layer in place.
+
+    The catalogue the layer was built from is extended with the new events.
+    If they widen its magnitude range, the marker sizes of the existing
+    features are rewritten as well so that all sizes stay comparable.
+
+    Args:
+        layer (QgsVectorLayer): The earthquake layer.
+        catalogue (EarthquakeCatalogue): The events already in the layer.
+        new_events (EarthquakeCatalogue): Events that are not in the layer.
+        rewrite_sizes (bool): False to leave the sizes of the existing
+            features for a single write_marker_sizes() call after the last
+            of several appends.
+    """
+    first = len(catalogue)
+    magnitude_range = catalogue.magnitude_range()
+    catalogue.extend(new_events)
+    catalogue.rescale_marker_sizes()
+    if rewrite_sizes and catalogue.magnitude_range() != magnitude_range:
+        write_marker_sizes(layer, catalogue, first)
+
+    _add_rows(layer, catalogue, first)
+    layer.updateExtents()
+
+
+def write_marker_sizes(
+    layer: QgsVectorLayer, catalogue: EarthquakeCatalogue, stop: int = None
+) -> None:
+    """Write the catalogue's marker sizes to the features of a layer.
+
+    Args:
+        layer (QgsVectorLayer): The earthquake layer.
+        catalogue (EarthquakeCatalogue): The events in the layer.
+        stop (int): Only write the rows before this one; all rows if None.
+    """
+    size_index = layer.fields().indexOf(SIZE_FIELD)
+    layer.dataProvider().changeAttributeValues(
+        {
+            int(fid): {size_index: None if math.isnan(size) else float(size)}
+            for fid, size in zip(
+                catalogue.fid[:stop], catalogue.marker_size[:stop]
+            )
+            if fid >= 0
+        }
+    )
+
+
+def write_area_columns(
+    layer: QgsVectorLayer,
+    catalogue: EarthquakeCatalogue,
+    in_area: np.ndarray,
+    area: np.ndarray,
+) -> None:
+    """Write which selected area each feature of a layer lies in.
+
+    Only the features whose values change are written, so switching
+    between neighbouring areas touches few of them.
+
+    Args:
+        layer (QgsVectorLayer): The earthquake layer.
+        catalogue (EarthquakeCatalogue): The events in the layer.
+        in_area (np.ndarray): The new in_area column of the catalogue.
+        area (np.ndarray): The new area column of the catalogue.
+    """
+    changed = np.flatnonzero(
+        ((in_area != catalogue.in_area) | (area != catalogue.area))
+        & (catalogue.fid >= 0)
+    )
+    in_area_index = layer.fields().indexOf(IN_AREA_FIELD)
+    area_index = layer.fields().indexOf(AREA_FIELD)
+    layer.dataProvider().changeAttributeValues(
+        {
+            int(catalogue.fid[row]): {
+                in_area_index: int(in_area[row]),
+                area_index: area[row],
+            }
+            for row in changed
+        }
+    )
+    catalogue.in_area = in_area
+    catalogue.area = area
+
+
+def layer_format() -> str:
+    """Return where earthquake layers are kept, one of LAYER_FORMATS."""
+    value = QgsSettings().value(LAYER_FORMAT_SETTING, LAYER_FORMATS[0])
+    return value if value in LAYER_FORMATS else LAYER_FORMATS[0]
+
+
+def geopackage_uri(path: str) -> str:
+    """Return the OGR data source of a GeoPackage written for a layer."""
+    return f"{path}|layername={GEOPACKAGE_LAYER_NAME}"
+
+
+def write_earthquake_geopackage(
+    path: str,
+    source: QgsAbstractFeatureSource,
+    fields: QgsFields,
+    is_canceled=None,
+) -> tuple:
+    """Write the features of an earthquake layer to a new GeoPackage.
+
+    The GeoPackage has an R-tree spatial index, so QGIS only reads the
+    features in view, and the same typed columns as the memory layer.
+    Safe to call off the GUI thread with a feature source of the layer.
+
+    Args:
+        path (str): The file to create.
+        source (QgsAbstractFeatureSource): The features of the layer, see
+            QgsVectorDataProvider.featureSource().
+        fields (QgsFields): The schema of the earthquake layer.
+        is_canceled (callable): Returns True to stop writing.
+
+    Returns:
+        tuple: The feature ids in the source and the ids the GeoPackage
+        gave the same features, as two numpy.ndarrays, or None if
+        cancelled. See map_feature_ids().
+
+    Raises:
+        OSError: If the GeoPackage could not be written.
+    """
+    options = QgsVectorFileWriter.SaveVectorOptions()
+    options.driverName = "GPKG"
+    options.layerName = GEOPACKAGE_LAYER_NAME
+    options.fileEncoding = "UTF-8"
+    writer = QgsVectorFileWriter.create(
+        path,
+        fields,
+        QgsWkbTypes.Point,
+        QgsCoordinateReferenceSystem("EPSG:4326"),
+        QgsCoordinateTransformContext(),
+        options,
+    )
+    try:
+        if writer.hasError() != QgsVectorFileWriter.NoError:
+            raise OSError(writer.errorMessage())
+    finally:
+        del writer  # Closes the empty table
+
+    # The provider returns the id of each added feature, so nothing is
+    # assumed about how the GeoPackage numbers its rows
+    layer = QgsVectorLayer(geopackage_uri(path), GEOPACKAGE_LAYER_NAME, "ogr")
+    if not layer.isValid():
+        raise OSError(f"{path} could not be opened.")
+    provider = layer.dataProvider()
+    # The GeoPackage has a fid column in front of the copied ones
+    columns = [provider.fields().indexOf(name) for name in fields.names()]
+    width = provider.fields().count()
+
+    source_fids = []
+    written_fids = []
+    batch = []
+    for feature in source.getFeatures():
+        attributes = [None] * width
+        for column, value in zip(columns, feature.attributes()):
+            attributes[column] = value
+        written = QgsFeature(provider.fields())
+        written.setAttributes(attributes)
+        written.setGeometry(feature.geometry())
+        batch.append(written)
+        source_fids.append(feature.id())
+        if len(batch) < FEATURE_BATCH_SIZE:
+            continue
+        if is_canceled is not None and is_canceled():
+            return None
+        written_fids.extend(_add_to_geopackage(provider, batch, path))
+        batch = []
+    if batch:
+        written_fids.extend(_add_to_geopackage(provider, batch, path))
+    return (
+        np.array(source_fids, dtype=np.int64),
+        np.array(written_fids, dtype=np.int64),
+    )
+
+
+def _add_to_geopackage(provider, features: list, path: str) -> list:
+    """Add features through an OGR provider and return their new ids."""
+    ok, added = provider.addFeatures(features)
+    if not ok or len(added) != len(features):
+        raise OSError(
+            f"Could not write earthquakes to {path}: "
+            + "; ".join(provider.errors())
+        )
+    return [feature.id() for feature in added]
+
+
+def map_feature_ids(fids: np.ndarray, old: np.ndarray, new: np.ndarray):
+    """Translate feature ids through the id pairs of a written layer.
+
+    Args:
+        fids (np.ndarray): Feature ids, e.g. the fid column of a catalogue;
+            negative ones, of rows that are in no layer, are kept.
+        old (np.ndarray): Ids of the written features in the source layer.
+        new (np.ndarray): The id each of them was given in the new layer.
+
+    Returns:
+        numpy.ndarray: The new id of each of `fids`, or None if any of
+        them was not written.
+    """
+    order = np.argsort(old)
+    old, new = old[order], new[order]
+    mapped = fids.copy()
+    present = fids >= 0
+    rows = np.searchsorted(old, fids[present])
+    if np.any(rows >= len(old)) or not np.array_equal(
+        old[rows], fids[present]
+    ):
+        return None
+    mapped[present] = new[rows]
+    return mapped
+
+
+def create_earthquake_layer(
+    catalogue: EarthquakeCatalogue, layer_name: str
+) -> QgsVectorLayer:
+    """Create a memory layer holding the earthquakes of a catalogue.
+
+    Args:
+        catalogue (EarthquakeCatalogue): The decoded earthquakes.
+        layer_name (str): The name of the layer.
+
+    Returns:
+        QgsVectorLayer: The layer, not yet added to the project.
+    """
+    layer = QgsVectorLayer("Point?crs=EPSG:4326", layer_name, "memory")
+    provider = layer.dataProvider()
+    provider.addAttributes(earthquake_fields(catalogue.features).toList())
+    layer.updateFields()
+
+    add_earthquake_features(layer, catalogue)
+    set_temporal_properties(layer)
+    return layer
+
+
+def set_temporal_properties(layer: QgsVectorLayer) -> None:
+    """Let the temporal controller filter an earthquake layer by time.
+
+    Every event is an instant at its "time", so a frame shows the events
+    that happened within it. Stepping or animating through the frames
+    filters the features already in the layer; it makes no request and
+    does not rebuild the layer.
+
+    Args:
+        layer (QgsVectorLayer): The earthquake layer.
+    """
+    if layer.fields().indexOf(TIME_FIELD) < 0:
+        return  # The events have no time
+    properties = layer.temporalProperties()
+    properties.setMode(
+        QgsVectorLayerTemporalProperties.ModeFeatureDateTimeInstantFromField
+    )
+    properties.setStartField(TIME_FIELD)
+    properties.setAccumulateFeatures(False)
+    properties.setIsActive(True)
+
+
+def earthquake_subset_string(
+    payload: dict, fetched: dict, local_area: bool = False
+) -> str:
+    """Build a subset string that narrows the loaded events to a payload.
+
+    Only the limits in which `payload` is narrower than `fetched` become
+    conditions; see payload_within() for when this applies. Every
+    condition is a plain comparison, so the string works for memory and
+    OGR layers alike.
+
+    Args:
+        payload (dict): The quakefilter payload that is requested.
+        fetched (dict): The payload the layer's events were fetched with.
+        local_area (bool): Select the events in the requested areas by the
+            in-area column, see write_area_columns(). Needed when `payload`
+            adds or narrows an area, or several areas were fetched by
+            their hull.
+
+    Returns:
+        str: An expression for QgsVectorLayer.setSubsetString(), empty if
+        every loaded event matches.
+    """
+    conditions = []
+    for key, field, operator in (
+        ("size_min", "magnitude", ">="),
+        ("size_max", "magnitude", "<="),
+        ("depth_min", "depth", ">="),
+        ("depth_max", "depth", "<="),
+    ):
+        if payload[key] != fetched[key]:
+            conditions.append(f'"{field}" {operator} {payload[key]!r}')
+
+    for key, operator in (("start_time", ">="), ("end_time", "<=")):
+        if payload[key] != fetched[key]:
+            seconds = payload_time_to_epoch(payload[key])
+            conditions.append(f'"{NUMERIC_TIME_FIELD}" {operator} {seconds!r}')
+
+    if local_area:
+        conditions.append(f'"{IN_AREA_FIELD}" = 1')
+
+    return " AND ".join(conditions)
+
+
+def choose_detail_levels(catalogue: EarthquakeCatalogue) -> list:
+    """Choose the magnitude threshold of each scale range of DETAIL_LEVELS.
+
+    The thresholds follow from the magnitude distribution of the
+    catalogue, so that zoomed out views draw a bounded number of events
+    however large the catalogue is. They are chosen from all events of
+    the catalogue, not from those in view or passing the layer's subset
+    string, so a view that shows only part of it draws fewer events than
+    the budget.
+
+    Args:
+        catalogue (EarthquakeCatalogue): The events in the layer.
+
+    Returns:
+        list: (minimum scale, maximum scale, threshold) tuples, widest
+        first. The scales are denominators as in QgsRuleBasedRenderer.Rule,
+        0 for no limit; events must exceed the threshold magnitude to be
+        drawn, None draws all. Empty if every level would draw all events.
+    """
+    levels = []
+    wider = 0
+    for scale, budget in DETAIL_LEVELS:
+        levels.append(
+            (_below(wider), scale, catalogue.magnitude_threshold(budget))
+        )
+        wider = scale
+    levels.append((_below(wider), 0, None))
+    if all(threshold is None for _, _, threshold in levels):
+        return []
+    return levels
+
+
+def _below(scale: int) -> int:
+    """Return the minimum scale of the range finer than `scale`.
+
+    A rule is drawn at both of its limits, so the finer range stops one
+    short of where the wider one starts and no scale draws both.
+    """
+    return scale - 1 if scale else 0
+
+
+def level_of_detail_renderer(
+    renderer: QgsGraduatedSymbolRenderer, levels: list
+) -> QgsFeatureRenderer:
+    """Wrap a graduated renderer in scale-dependent magnitude rules.
+
+    Every scale range becomes a rule that only passes the events above its
+    threshold, refined into one child rule per range of `renderer`. Only
+    the rule of the current scale is evaluated when the map is drawn.
+
+    Args:
+        renderer (QgsGraduatedSymbolRenderer): The renderer of the layer.
+        levels (list): Scale ranges from choose_detail_levels().
+
+    Returns:
+        QgsFeatureRenderer: A rule-based renderer, or `renderer` itself if
+        there are no levels.
+    """
+    if not levels:
+        return renderer
+    root = QgsRuleBasedRenderer.Rule(None)
+    for minimum_scale, maximum_scale, threshold in levels:
+        if threshold is None:
+            filter_expression = ""
+            label = "All events"
+        else:
+            filter_expression = f'"magnitude" > {threshold!r}'
+            label = f"Magnitude above {threshold:g}"
+        rule = QgsRuleBasedRenderer.Rule(
+            None,
+            maximumScale=maximum_scale,
+            minimumScale=minimum_scale,
+            filterExp=filter_expression,
+            label=label,
+        )
+        QgsRuleBasedRenderer.refineRuleRanges(rule, renderer)
+        root.appendChild(rule)
+
+    rule_renderer = QgsRuleBasedRenderer(root)
+    rule_renderer.setOrderBy(renderer.orderBy())
+    rule_renderer.setOrderByEnabled(renderer.orderByEnabled())
+    return rule_renderer
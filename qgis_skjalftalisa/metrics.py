@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+"""Timing of the stages of a fetch and the metrics log.
+
+Stage times are always collected; they cost a perf_counter() call per
+stage and batch. Every completed fetch is summarised in the dock and
+appended as a JSON line to a rotating log in the plugin's profile
+directory.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from logging.handlers import RotatingFileHandler
+
+from .utils import profile_dir
+
+METRICS_LOG_FILE = "metrics.log"
+METRICS_LOG_MAX_BYTES = 1024 * 1024
+METRICS_LOG_BACKUPS = 3
+
+# Stages in the order they are listed in summaries
+STAGES = (
+    ("payload", "payload"),
+    ("http", "HTTP"),
+    ("decode", "decode"),
+    ("store", "store"),
+    ("catalogue", "catalogue"),
+    ("layer", "layer"),
+    ("symbology", "symbology"),
+    ("project", "project"),
+)
+
+_metrics_logger = None
+_metrics_logger_lock = threading.Lock()
+
+
+class StageTimes:
+    """Accumulates the wall time spent in each stage of a fetch.
+
+    Stages that run repeatedly, e.g. once per batch or per time slice, add
+    up; slices fetched in parallel therefore count their combined time.
+    Safe to use from the fetch task and the GUI thread at once.
+    """
+
+    def __init__(self):
+        self.seconds = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self.seconds[stage] = self.seconds.get(stage, 0.0) + seconds
+
+    def get(self, stage: str) -> float:
+        with self._lock:
+            return self.seconds.get(stage, 0.0)
+
+    @contextmanager
+    def measure(self, stage: str):
+        """Add the time spent in a with block to a stage."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - started)
+
+
+class FetchMetrics:
+    """The metrics of one completed fetch.
+
+    Args:
+        payload (dict): The quakefilter payload that was fetched.
+        events (int): Number of events loaded.
+        bytes_received (int): Response bytes on the wire.
+        bytes_decoded (int): Response bytes after decompression.
+        seconds (float): Wall time from the click to the finished layer.
+        times (StageTimes): The time spent in each stage.
+        cached (bool): Whether the events came from the response cache.
+    """
+
+    def __init__(
+        self,
+        payload: dict,
+        events: int,
+        bytes_received: int,
+        bytes_decoded: int,
+        seconds: float,
+        times: StageTimes,
+        cached: bool = False,
+    ):
+        self.payload = payload
+        self.events = events
+        self.bytes_received = bytes_received
+        self.bytes_decoded = bytes_decoded
+        self.seconds = seconds
+        self.stages = dict(times.seconds)
+        self.cached = cached
+
+    def summary(self) -> str:
+        """Return a one-line summary for the dock.
+
+        e.g. "12,345 events, 1,234 kB in 2.31 s (HTTP 1.20, decode 0.41,
+        layer 0.52, symbology 0.01, project 0.08)"
+        """
+        stages = ", ".join(
+            f"{label} {self.stages[stage]:.2f}"
+            for stage, label in STAGES
+            if self.stages.get(stage, 0.0) >= 0.005
+        )
+        if self.cached:
+            text = f"{self.events:,} events from the cache"
+        else:
+            text = (
+                f"{self.events:,} events,"
+                f" {self.bytes_received / 1024:,.0f} kB"
+            )
+        text = f"{text} in {self.seconds:.2f} s"
+        return f"{text} ({stages})" if stages else text
+
+    def as_dict(self) -> dict:
+        """Return the metrics as a JSON-serialisable dictionary."""
+        return {
+            "time": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "start_time": self.payload.get("start_time"),
+            "end_time": self.payload.get("end_time"),
+            "area": self.payload.get("area") is not None,
+            "events": self.events,
+            "cached": self.cached,
+            "bytes_received": self.bytes_received,
+            "bytes_decoded": self.bytes_decoded,
+            "seconds": round(self.seconds, 4),
+            "stages": {
+                stage: round(seconds, 4)
+                for stage, seconds in self.stages.items()
+            },
+        }
+
+
+def append_metrics_log(metrics: FetchMetrics) -> None:
+    """Append the metrics of a fetch to the rotating metrics log."""
+    logger = _get_metrics_logger()
+    if logger is not None:
+        logger.info(json.dumps(metrics.as_dict()))
+
+
+def _get_metrics_logger() -> logging.Logger:
+    """Set up the metrics logger on first use, None if the log is unusable."""
+    global _metrics_logger
+    with _metrics_logger_lock:
+        if _metrics_logger is None:
+            try:
+                handler = RotatingFileHandler(
+                    os.path.join(profile_dir(), METRICS_LOG_FILE),
+                    maxBytes=METRICS_LOG_MAX_BYTES,
+                    backupCount=METRICS_LOG_BACKUPS,
+                    encoding="utf-8",
+                )
+            except OSError:
+                return None
+            logger = logging.getLogger(f"{__name__}.log")
+            logger.setLevel(logging.INFO)
+            logger.propagate = False  # Not a diagnostic message
+            logger.addHandler(handler)
+            _metrics_logger = logger
+        return _metrics_logger
+
+
+def close_metrics_log() -> None:
+    """Close the metrics log, e.g. when the plugin unloads."""
+    global _metrics_logger
+    with _metrics_logger_lock:
+        if _metrics_logger is not None:
+            for handler in list(_metrics_logger.handlers):
+                _metrics_logger.removeHandler(handler)
+                handler.close()
+            _metrics_logger = None
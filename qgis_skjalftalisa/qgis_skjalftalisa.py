@@ -27,8 +27,10 @@ from qgis.PyQt.QtWidgets import QAction
 # Initialize Qt resources from file resources.py
 from .resources import *
 
-# Import the code for the DockWidget
-from .qgis_skjalftalisa_dockwidget import QgisSkjalftalisaDockWidget
+# The DockWidget and everything it needs (numpy, shapely, requests) are only
+# imported when the dock is first opened, see run()
+from .utils import MessageLogHandler
+import logging
 import os.path
 
 
@@ -72,6 +74,7 @@ class QgisSkjalftalisa:
 
         self.pluginIsActive = False
         self.dockwidget = None
+        self.log_handler = None
 
 
     # noinspection PyMethodMayBeStatic
@@ -174,6 +177,10 @@ class QgisSkjalftalisa:
             callback=self.run,
             parent=self.iface.mainWindow())
 
+        # Send the plugin's log records to the QGIS message log
+        self.log_handler = MessageLogHandler()
+        logging.getLogger(__package__).addHandler(self.log_handler)
+
     #--------------------------------------------------------------------------
 
     def onClosePlugin(self):
@@ -198,6 +205,24 @@ class QgisSkjalftalisa:
 
         #print "** UNLOAD QgisSkjalftalisa"
 
+        # stop any download still running in the background; nothing was
+        # started if the dock was never opened
+        if self.dockwidget is not None:
+            from .cache import close_response_cache
+            from .http_client import close_http_client
+            from .metrics import close_metrics_log
+            from .scratch import close_scratch_store
+
+            self.dockwidget.cancel_background_tasks()
+            close_http_client()
+            close_response_cache()
+            close_metrics_log()
+            close_scratch_store()
+
+        if self.log_handler is not None:
+            logging.getLogger(__package__).removeHandler(self.log_handler)
+            self.log_handler = None
+
         for action in self.actions:
             self.iface.removePluginWebMenu(
                 self.tr(u'&QGIS Skjalftalisa'),
@@ -220,6 +245,10 @@ class QgisSkjalftalisa:
             #    first run of plugin
             #    removed on close (see self.onClosePlugin method)
             if self.dockwidget == None:
+                from .qgis_skjalftalisa_dockwidget import (
+                    QgisSkjalftalisaDockWidget,
+                )
+
                 # Create the dockwidget (after translation) and keep reference
                 self.dockwidget = QgisSkjalftalisaDockWidget(self.iface)
 
@@ -23,20 +23,19 @@
 """
 
 import os
-import json
-import logging
-import requests
-import geopandas as gpd
+import time
 
 from datetime import datetime
 
-from shapely.ops import orient
-from shapely.geometry import shape, mapping
+import numpy as np
 
 from qgis.PyQt import QtWidgets, uic
 from qgis.PyQt.QtGui import QColor
-from qgis.PyQt.QtCore import pyqtSignal, QDateTime, Qt, QVariant
+from qgis.PyQt.QtCore import pyqtSignal, QDateTime, Qt, QTimer
 from qgis.core import (
+    QgsApplication,
+    QgsDateTimeRange,
+    QgsSettings,
     QgsVectorLayer,
     QgsProject,
     QgsSymbol,
@@ -44,46 +43,68 @@ from qgis.core import (
     QgsGraduatedSymbolRenderer,
     QgsRendererRange,
     QgsProperty,
-    QgsField,
     QgsFeatureRequest,
+    QgsTemporalNavigationObject,
 )
 
-# Constants and configuratoins
-BASE_API_URL = "https://vi-api.vedur.is/skjalftalisa/v1"
-AREA_API_ENDPOINT = f"{BASE_API_URL}/areas"
-EARTHQUAKE_API_ENDPOINT = f"{BASE_API_URL}/quakefilter"
+from .api import (
+    advance_payload_end,
+    epoch_to_payload_time,
+    payload_key,
+    payload_time_to_epoch,
+    payload_within,
+)
+from .areas import (
+    AreaCatalogueRefreshTask,
+    AreaRegistry,
+    assign_areas,
+    load_cached_catalogue,
+    payload_polygon,
+)
+from .cache import get_response_cache
+from .catalogue import (
+    NUMERIC_TIME_FIELD,
+    SIZE_FIELD,
+    EarthquakeCatalogue,
+)
+from .event_store import SETTLE_SECONDS
+from .exceptions import (
+    InputValidationError,
+    ApiRequestError,
+    GeoJsonProcessingError,
+)
+from .layers import (
+    append_earthquake_features,
+    choose_detail_levels,
+    create_earthquake_layer,
+    earthquake_subset_string,
+    geopackage_uri,
+    layer_format,
+    level_of_detail_renderer,
+    map_feature_ids,
+    write_area_columns,
+    write_marker_sizes,
+)
+from .metrics import FetchMetrics, StageTimes, append_metrics_log
+from .scratch import get_scratch_store, release_scratch_files
+from .tasks import EarthquakeFetchTask, EarthquakeLayerWriteTask
+from .utils import log_error
 
 DEFAULT_MAGNITUDE = (0, 7)
 DEFAULT_DEPTH = (0, 25)
 
-# Get the root logger
-logger = logging.getLogger()
-
-# Clear any existing handlers to prevent duplication
-if logger.hasHandlers():
-    logger.handlers.clear()
-
-# Set up logging
-logging_format = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-logging.basicConfig(
-    level=logging.ERROR,
-    filename="qgis_skjalftalisa.log",
-    filemode="w",
-    format=logging_format,
-)
-
-# Create and add a console handler
-console_handler = logging.StreamHandler()
-console_handler.setLevel(logging.ERROR)
-formatter = logging.Formatter(logging_format)
-console_handler.setFormatter(formatter)
+# Live mode polls for events newer than the latest one in the layer, minus
+# an overlap for events that reach the catalogue late
+LIVE_SETTINGS_KEY = "qgis_skjalftalisa/live/interval"
+LIVE_INTERVAL_SECONDS = 60
+LIVE_OVERLAP_SECONDS = 10 * 60
 
-logger.addHandler(console_handler)
+# Batches streamed after the first are appended and repainted together,
+# at most once per interval
+STREAM_FLUSH_INTERVAL_MS = 250
 
-
-def log_error(message: str) -> None:
-    logger = logging.getLogger(__name__)
-    logger.error(message)
+# Whether an area is filtered locally instead of being sent to the API
+LOCAL_AREA_SETTINGS_KEY = "qgis_skjalftalisa/areas/local_filter"
 
 
 FORM_CLASS, _ = uic.loadUiType(
@@ -93,24 +114,6 @@ FORM_CLASS, _ = uic.loadUiType(
 )
 
 
-class InputValidationError(Exception):
-    """Raised when user input is invalid."""
-
-    pass
-
-
-class ApiRequestError(Exception):
-    """Riased when the API request fails."""
-
-    pass
-
-
-class GeoJsonProcessingError(Exception):
-    """Raised when processing GeoJSON data fails."""
-
-    pass
-
-
 class QgisSkjalftalisaDockWidget(QtWidgets.QDockWidget, FORM_CLASS):
     closingPlugin = pyqtSignal()
 
@@ -166,17 +169,57 @@ class QgisSkjalftalisaDockWidget(QtWidgets.QDockWidget, FORM_CLASS):
         # Initialize variables
         self.earthquake_layer = None  # earthquake points
         self.area_layer = None  # filter-by-area polygon
-
-        # Initialize areaComboBox
+        self.fetch_task = None  # running background fetch, if any
+        self.fetch_layer_loaded = False  # the running fetch has a layer
+        self.fetch_started = None  # perf_counter() when the fetch started
+        self.pending_batches = []  # streamed batches not yet in the layer
+        self.area_task = None  # running area catalogue refresh, if any
+        self.live_task = None  # running live poll, if any
+        self.save_task = None  # running write of the layer to disk, if any
+        self.catalogue = None  # the events in earthquake_layer
+        self.earthquake_payload = None  # the payload of earthquake_layer
+        self.requested_payload = None  # the payload of the last request
+        self.requested_areas = []  # the areas of requested_payload
+        self.event_ids = set()  # event ids in earthquake_layer
+        self.area_registry = AreaRegistry([])
+
+        # The progress row is only shown while a fetch is running
+        self.progressBar.setVisible(False)
+        self.cancelPushButton.setVisible(False)
+
+        # Initialize areaComboBox, several areas can be checked at once
         self.populate_area_combobox()
 
         # Connect buttons to methods
         self.filterPushButton.clicked.connect(self.fetch_and_load_earthquakes)
         self.resetPushButton.clicked.connect(self.reset_values)
+        self.cancelPushButton.clicked.connect(self.cancel_fetch)
 
         # Initialize areaCheckBox (optional logic)
         self.areaCheckBox.stateChanged.connect(self.handle_area_checkbox)
 
+        # Streamed batches are added to the layer in bulk on a timer
+        self.flush_timer = QTimer(self)
+        self.flush_timer.setSingleShot(True)
+        self.flush_timer.setInterval(STREAM_FLUSH_INTERVAL_MS)
+        self.flush_timer.timeout.connect(self._flush_fetch_batches)
+
+        # Live mode appends new events to the layer on a timer
+        self.live_timer = QTimer(self)
+        self.live_timer.timeout.connect(self.poll_live_earthquakes)
+        self.liveCheckBox.toggled.connect(self.set_live_mode)
+
+        # Local area filtering fetches without the area and selects it here
+        self.localAreaCheckBox.setChecked(
+            QgsSettings().value(LOCAL_AREA_SETTINGS_KEY, False, type=bool)
+        )
+        self.localAreaCheckBox.toggled.connect(self.set_local_area_filter)
+
+        # Scratch files are released with the layers that use them
+        QgsProject.instance().layersWillBeRemoved.connect(
+            self._on_layers_removed
+        )
+
     def show_error(self, message: str, title: str = "Error") -> None:
         """Display an error message in a QMessageBox.
 
@@ -187,33 +230,792 @@ class QgisSkjalftalisaDockWidget(QtWidgets.QDockWidget, FORM_CLASS):
         QtWidgets.QMessageBox.critical(self, "Error", message)
 
     def fetch_and_load_earthquakes(self) -> None:
-        """Fetch earthquake data and load it into QGIS."""
+        """Fetch earthquake data in the background and load it into QGIS.
+
+        Clicking again while the same payload is being fetched does nothing,
+        so only one response is downloaded and loaded. If the new limits
+        only narrow those of the loaded, settled events, the layer is
+        filtered in place instead, see _refilter_earthquake_layer. A payload that was
+        loaded recently is answered from the response cache. Otherwise
+        the request is handed to the QGIS task manager, which
+        streams the events back in batches. The layer is built from the
+        first batch in _on_fetch_batch, later batches are appended to it
+        a few times a second in _flush_fetch_batches and the symbology is
+        finished in _on_fetch_completed.
+
+        With local area filtering the area is left out of the request and
+        selected in QGIS, so that switching areas later needs no request.
+
+        The time spent in each stage is shown in the statusLabel once the
+        layer is complete, see _record_fetch_metrics.
+        """
+        started = time.perf_counter()
+        times = StageTimes()
         try:
-            self._validate_user_input()
-            payload = self._construct_earthquake_payload()
-            response = self._fetch_earthquake_data(payload)
-            geojson_data = self._process_earthquake_response(response)
+            with times.measure("payload"):
+                self._validate_user_input()
+                payload = self._construct_earthquake_payload()
+        except InputValidationError:
+            return  # Already displayed to the user
+        except GeoJsonProcessingError as e:
+            log_error(f"GeoJSON processing error: {str(e)}")
+            self.show_error(f"Error processing earthquake data: {str(e)}")
+            return
+        except Exception as e:
+            log_error(f"Unexpected error: {str(e)}")
+            self.show_error(f"An unexpected error occurred: {str(e)}")
+            return
+
+        self.requested_payload = payload
+        self.requested_areas = self._selected_areas()
+        fetch_payload = payload
+        if payload.get("area") and self.localAreaCheckBox.isChecked():
+            fetch_payload = dict(payload)
+            del fetch_payload["area"]
+
+        # A repeated click joins the identical fetch that is still running;
+        # the requested area is applied once it completes
+        running = self.fetch_task
+        if running is not None and (
+            payload_key(running.payload) == payload_key(fetch_payload)
+        ):
+            return
+
+        if self._refilter_earthquake_layer(payload):
+            self.statusLabel.setText(
+                f"{self.earthquake_layer.featureCount():,} events filtered"
+                f" locally in {time.perf_counter() - started:.2f} s"
+            )
+            return
 
-            if geojson_data is None:
-                return  # Exit early if there are no earthquakes
+        # Only one fetch at a time - the newest request wins
+        self.cancel_fetch()
 
-            self._save_and_load_geojson(geojson_data, "Earthquakes")
+        cached = get_response_cache().get(fetch_payload)
+        if cached is not None:
+            self._load_cached_earthquakes(
+                fetch_payload, cached, times, started
+            )
+            return
+
+        task = EarthquakeFetchTask(fetch_payload, stream=True, times=times)
+        task.transferProgress.connect(self._update_fetch_progress)
+        task.retrying.connect(self._show_retry)
+        task.batchDecoded.connect(
+            lambda batch: self._on_fetch_batch(task, batch)
+        )
+        task.taskCompleted.connect(lambda: self._on_fetch_completed(task))
+        task.taskTerminated.connect(lambda: self._on_fetch_terminated(task))
+        self.fetch_task = task
+        self.fetch_layer_loaded = False
+        self.fetch_started = started
+
+        self._set_fetch_in_progress(True)
+        QgsApplication.taskManager().addTask(task)
+
+    def _refilter_earthquake_layer(self, payload: dict) -> bool:
+        """Apply narrower limits to the loaded earthquakes without a request.
+
+        A window that reaches into the last SETTLE_SECONDS is fetched again,
+        as the catalogue still receives and revises those events, unless
+        live mode keeps the layer up to date.
+
+        Args:
+            payload (dict): The payload built from the dock's inputs.
+
+        Returns:
+            bool: True if the layer was filtered, False if the payload has
+            to be fetched.
+        """
+        layer = self.earthquake_layer
+        settling = (
+            payload_time_to_epoch(payload["end_time"])
+            > time.time() - SETTLE_SECONDS
+        )
+        if (
+            self.fetch_task is not None
+            or self.earthquake_payload is None
+            or not (layer and self._is_layer_valid(layer))
+            or not payload_within(payload, self.earthquake_payload)
+            or (settling and not self.live_timer.isActive())
+        ):
+            return False
+
+        self._filter_earthquake_layer(payload, self.earthquake_payload)
+        self._update_temporal_extent(payload)
+        try:
             self._display_area_if_checked()
+        except GeoJsonProcessingError as e:
+            self.show_error(f"Error processing area polygon: {str(e)}")
 
-        except InputValidationError:
-            pass  # Already displayed to the user
-        except ApiRequestError as e:
+        if not layer.featureCount():
+            QtWidgets.QMessageBox.information(
+                self,
+                "No Earthquakes Found",
+                "No earthquakes were found with the selected criteria.",
+            )
+        return True
+
+    def _filter_earthquake_layer(self, payload: dict, fetched: dict) -> None:
+        """Narrow the events in the earthquake layer to a payload.
+
+        The events are assigned to the requested areas all at once, and
+        only features that move between areas are written.
+
+        Args:
+            payload (dict): The requested payload.
+            fetched (dict): The payload the layer's events were fetched with.
+        """
+        layer = self.earthquake_layer
+        write_area_columns(
+            layer, self.catalogue, *self._area_columns(self.catalogue, fetched)
+        )
+        layer.setSubsetString(
+            earthquake_subset_string(
+                payload, fetched, self._filters_area_locally(fetched)
+            )
+        )
+        layer.triggerRepaint()
+
+    def _update_temporal_extent(self, payload: dict) -> None:
+        """Set the range of the temporal controller to a payload's window.
+
+        The earthquake layer is filtered by the controller's frames, see
+        set_temporal_properties, so a fetched period can be stepped
+        through without new requests. A running animation is left alone.
+
+        If temporal navigation is off, it is switched to a fixed range, so
+        the layer is filtered by the controller and still shows the whole
+        window until the user starts an animation.
+
+        Args:
+            payload (dict): The payload of the events in the layer.
+        """
+        controller = self.iface.mapCanvas().temporalController()
+        if not isinstance(controller, QgsTemporalNavigationObject):
+            return
+        if controller.animationState() != QgsTemporalNavigationObject.Idle:
+            return
+        if (
+            controller.navigationMode()
+            == QgsTemporalNavigationObject.NavigationOff
+        ):
+            controller.setNavigationMode(
+                QgsTemporalNavigationObject.FixedRange
+            )
+        start = payload_time_to_epoch(payload["start_time"])
+        end = payload_time_to_epoch(payload["end_time"])
+        controller.setTemporalExtents(
+            QgsDateTimeRange(
+                QDateTime.fromMSecsSinceEpoch(round(start * 1000), Qt.UTC),
+                QDateTime.fromMSecsSinceEpoch(round(end * 1000), Qt.UTC),
+            )
+        )
+
+    def _filters_area_locally(self, fetched: dict) -> bool:
+        """Return whether the requested areas are selected in QGIS.
+
+        That is the case unless the events were fetched with the area
+        requested now, e.g. without an area, by the hull of several areas
+        or by the hull of areas that have been narrowed to fewer since.
+
+        Args:
+            fetched (dict): The payload the events were fetched with.
+        """
+        requested = self.requested_payload or {}
+        return bool(requested.get("area")) and (
+            fetched.get("area") != requested["area"]
+            or len(self.requested_areas) > 1
+        )
+
+    def _area_columns(
+        self, catalogue: EarthquakeCatalogue, fetched: dict
+    ) -> tuple:
+        """Return which of the requested areas the events lie in.
+
+        Args:
+            catalogue (EarthquakeCatalogue): Events fetched with `fetched`.
+            fetched (dict): The payload the events were fetched with.
+
+        Returns:
+            tuple: The in_area and area columns for the catalogue. in_area
+            is all True if no area is filtered locally.
+        """
+        areas = self.requested_areas
+        in_area = np.ones(len(catalogue), dtype=bool)
+        if not areas:
+            return in_area, np.full(len(catalogue), None, dtype=object)
+        if not self._filters_area_locally(fetched):
+            # The API has selected the events of the single area
+            area = np.full(len(catalogue), areas[0].name, dtype=object)
+            return in_area, area
+
+        assigned = assign_areas(areas, catalogue.lon, catalogue.lat)
+        # Index -1, i.e. no area, picks the trailing None
+        names = np.array([area.name for area in areas] + [None], dtype=object)
+        return assigned >= 0, names[assigned]
+
+    def cancel_fetch(self) -> None:
+        """Cancel the running background fetch, if there is one."""
+        self.flush_timer.stop()
+        self.pending_batches = []
+        if self.fetch_task is not None:
+            try:
+                self.fetch_task.cancel()
+            except RuntimeError:
+                pass  # The task has already been deleted by the manager
+            self.fetch_task = None
+        self._set_fetch_in_progress(False)
+
+    def cancel_background_tasks(self) -> None:
+        """Cancel every task the dock has started, e.g. on plugin unload.
+
+        The dock also stops following layer removals from the project.
+        """
+        try:
+            QgsProject.instance().layersWillBeRemoved.disconnect(
+                self._on_layers_removed
+            )
+        except TypeError:
+            pass  # Already disconnected
+        self.cancel_fetch()
+        self.cancel_layer_save()
+        self.live_timer.stop()
+        if self.live_task is not None:
+            try:
+                self.live_task.cancel()
+            except RuntimeError:
+                pass  # The task has already been deleted by the manager
+            self.live_task = None
+        if self.area_task is not None:
+            try:
+                self.area_task.cancel()
+            except RuntimeError:
+                pass  # The task has already been deleted by the manager
+            self.area_task = None
+
+    def _set_fetch_in_progress(self, in_progress: bool) -> None:
+        """Show or hide the progress row of the dock."""
+        self.progressBar.setVisible(in_progress)
+        self.cancelPushButton.setVisible(in_progress)
+        if in_progress:
+            self.progressBar.setRange(0, 0)  # busy until bytes arrive
+            self.progressBar.setValue(0)
+
+    def _update_fetch_progress(
+        self, bytes_received: int, bytes_total: int, events_received: int
+    ) -> None:
+        """Show bytes and events received by the running fetch.
+
+        Args:
+            bytes_received (int): Bytes of response body received so far.
+            bytes_total (int): Expected body size, 0 if unknown.
+            events_received (int): Number of events decoded so far.
+        """
+        if bytes_total:
+            self.progressBar.setRange(0, 100)
+            self.progressBar.setValue(
+                min(100, int(100 * bytes_received / bytes_total))
+            )
+        self.progressBar.setFormat(
+            f"{bytes_received / 1024:,.0f} kB, {events_received:,} events"
+        )
+
+    def _show_retry(
+        self, attempt: int, max_retries: int, delay: float, reason: str
+    ) -> None:
+        """Tell the user that a failed request is about to be retried.
+
+        Args:
+            attempt (int): Number of the retry.
+            max_retries (int): Retries before the request fails.
+            delay (float): Seconds until the retry.
+            reason (str): What went wrong, e.g. "503 Service Unavailable".
+        """
+        message = (
+            f"Retrying ({attempt}/{max_retries}) in {delay:.0f} s: {reason}"
+        )
+        if self.fetch_task is not None:
+            self.progressBar.setFormat(message)
+        self.statusLabel.setText(message)
+
+    def _on_fetch_batch(
+        self, task: EarthquakeFetchTask, batch: EarthquakeCatalogue
+    ) -> None:
+        """Add a batch of a streamed fetch to the earthquake layer.
+
+        The first batch replaces the previous layer straight away, so that
+        events are shown as soon as possible. Later ones are collected
+        while the download continues and appended by _flush_fetch_batches.
+
+        Args:
+            task (EarthquakeFetchTask): The task the batch belongs to.
+            batch (EarthquakeCatalogue): The decoded batch.
+        """
+        if task is not self.fetch_task or not len(batch):
+            return  # Superseded by a newer request
+
+        if self.fetch_layer_loaded:
+            self.pending_batches.append(batch)
+            if not self.flush_timer.isActive():
+                self.flush_timer.start()
+            return
+
+        try:
+            batch.in_area, batch.area = self._area_columns(
+                batch, task.payload
+            )
+            self.load_earthquake_layer(
+                batch, self._earthquake_layer_name(task.payload), task.times
+            )
+            self.fetch_layer_loaded = self.earthquake_layer is not None
+            if self.fetch_layer_loaded:
+                self.earthquake_layer.setSubsetString(
+                    earthquake_subset_string(
+                        self.requested_payload,
+                        task.payload,
+                        self._filters_area_locally(task.payload),
+                    )
+                )
+
+        except Exception as e:
+            log_error(f"Failed to add earthquakes to the layer: {str(e)}")
+            self.cancel_fetch()
+            self.show_error(f"Error processing earthquake data: {str(e)}")
+
+    def _flush_fetch_batches(self) -> None:
+        """Append the batches collected since the last flush in one go.
+
+        One provider call and one repaint cover all of them, so a fast
+        stream does not repaint the canvas for every batch.
+        """
+        batches, self.pending_batches = self.pending_batches, []
+        task = self.fetch_task
+        if task is None or not batches:
+            return
+
+        layer = self.earthquake_layer
+        if not (layer and self._is_layer_valid(layer)):
+            self.cancel_fetch()  # The layer was removed meanwhile
+            return
+
+        try:
+            batch = batches[0]
+            for other in batches[1:]:
+                batch.extend(other)
+            batch.in_area, batch.area = self._area_columns(
+                batch, task.payload
+            )
+            # The sizes of earlier batches are rewritten once at the end
+            with task.times.measure("layer"):
+                append_earthquake_features(
+                    layer, self.catalogue, batch, rewrite_sizes=False
+                )
+                self.event_ids.update(batch.event_id)
+            # The features are in the layer now; a streamed catalogue
+            # holding every raw dictionary until the end would double
+            # the memory of a large fetch
+            self.catalogue.release_features()
+            layer.triggerRepaint()
+
+        except Exception as e:
+            log_error(f"Failed to add earthquakes to the layer: {str(e)}")
+            self.cancel_fetch()
+            self.show_error(f"Error processing earthquake data: {str(e)}")
+
+    def _on_fetch_completed(self, task: EarthquakeFetchTask) -> None:
+        """Finish the layer of a streamed fetch on the main thread.
+
+        Args:
+            task (EarthquakeFetchTask): The task that has finished.
+        """
+        if task is not self.fetch_task:
+            return  # Superseded by a newer request
+        self.flush_timer.stop()
+        self._flush_fetch_batches()
+        if task is not self.fetch_task:
+            return  # Failed to add the last batches
+        self.fetch_task = None
+        self._set_fetch_in_progress(False)
+
+        try:
+            if not self.fetch_layer_loaded:
+                self._record_fetch_metrics(
+                    task.payload, 0, task.times, task.feedback
+                )
+                QtWidgets.QMessageBox.information(
+                    self,
+                    "No Earthquakes Found",
+                    "No earthquakes were found with the selected criteria.",
+                )
+                return
+
+            layer = self.earthquake_layer
+            if not (layer and self._is_layer_valid(layer)):
+                return  # Removed by the user while streaming
+
+            # Size all events relative to the final magnitude range
+            with task.times.measure("layer"):
+                write_marker_sizes(layer, self.catalogue)
+            with task.times.measure("symbology"):
+                self.apply_graduated_earthquake_symbology(
+                    layer,
+                    self.catalogue.time_range(),
+                    choose_detail_levels(self.catalogue),
+                )
+            self.earthquake_payload = task.payload
+            # The requested area may have changed while streaming
+            self._filter_earthquake_layer(self.requested_payload, task.payload)
+            self._update_temporal_extent(self.requested_payload)
+            # Only fetches that arrived in a single batch still have their
+            # feature dictionaries and are cached
+            get_response_cache().put(task.payload, self.catalogue)
+            self._record_fetch_metrics(
+                task.payload, len(self.catalogue), task.times, task.feedback
+            )
+            if layer_format() == "gpkg":
+                self._save_earthquake_layer(layer)
+            # The layer and the cache hold their own copies
+            self.catalogue.release_features()
+            self._display_area_if_checked()
+
+        except GeoJsonProcessingError as e:
+            log_error(f"GeoJSON processing error: {str(e)}")
+            self.show_error(f"Error processing earthquake data: {str(e)}")
+        except Exception as e:
+            log_error(f"Unexpected error: {str(e)}")
+            self.show_error(f"An unexpected error occurred: {str(e)}")
+
+    def _save_earthquake_layer(self, layer: QgsVectorLayer) -> None:
+        """Write a completed layer to a GeoPackage in the background.
+
+        The layer is switched over to the file in _on_earthquake_layer_saved
+        and stays a memory layer until then.
+
+        Args:
+            layer (QgsVectorLayer): The earthquake layer.
+        """
+        self.cancel_layer_save()
+        path = get_scratch_store("catalogues").new_path(
+            "earthquakes-", ".gpkg"
+        )
+        subset_string = layer.subsetString()
+        # The file holds every event; the filter is set on it afterwards
+        layer.setSubsetString("")
+        source = layer.dataProvider().featureSource()
+        layer.setSubsetString(subset_string)
+        task = EarthquakeLayerWriteTask(
+            source, self.catalogue, layer.fields(), path
+        )
+        task.taskCompleted.connect(
+            lambda: self._on_earthquake_layer_saved(task, layer, subset_string)
+        )
+        task.taskTerminated.connect(
+            lambda: self._on_earthquake_layer_save_failed(task)
+        )
+        self.save_task = task
+        QgsApplication.taskManager().addTask(task)
+
+    def _on_earthquake_layer_saved(
+        self,
+        task: EarthquakeLayerWriteTask,
+        layer: QgsVectorLayer,
+        subset_string: str,
+    ) -> None:
+        """Switch the earthquake layer over to its GeoPackage.
+
+        The file is dropped if the layer has been replaced, filtered or
+        appended to while it was written.
+
+        Args:
+            task (EarthquakeLayerWriteTask): The completed task.
+            layer (QgsVectorLayer): The layer the file was written for.
+            subset_string (str): The layer's filter when the write started.
+        """
+        if self.save_task is task:
+            self.save_task = None
+        store = get_scratch_store("catalogues")
+        store.release([task.path])
+        # None if events were appended while the file was written
+        fids = map_feature_ids(self.catalogue.fid, *task.fids)
+        if not (
+            layer is self.earthquake_layer
+            and self._is_layer_valid(layer)
+            and layer.subsetString() == subset_string
+            and fids is not None
+            and np.array_equal(self.catalogue.in_area, task.catalogue.in_area)
+            and np.array_equal(self.catalogue.area, task.catalogue.area)
+        ):
+            store.discard(task.path)
+            return
+
+        # Keeps the id, symbology and position of the layer in the project
+        layer.setDataSource(geopackage_uri(task.path), layer.name(), "ogr")
+        layer.setSubsetString(subset_string)
+        self.catalogue.fid = fids
+        store.pin(layer.id(), task.path)
+
+    def _on_earthquake_layer_save_failed(
+        self, task: EarthquakeLayerWriteTask
+    ) -> None:
+        """Keep the memory layer if its GeoPackage could not be written.
+
+        Args:
+            task (EarthquakeLayerWriteTask): The terminated task.
+        """
+        if self.save_task is task:
+            self.save_task = None
+        store = get_scratch_store("catalogues")
+        store.release([task.path])
+        store.discard(task.path)
+        if task.exception is not None:
+            log_error(f"Failed to save earthquakes: {str(task.exception)}")
+
+    def cancel_layer_save(self) -> None:
+        """Cancel writing the earthquake layer to disk, if it is running."""
+        if self.save_task is not None:
+            try:
+                self.save_task.cancel()
+            except RuntimeError:
+                pass  # The task has already been deleted by the manager
+            self.save_task = None
+
+    def _load_cached_earthquakes(
+        self,
+        payload: dict,
+        catalogue: EarthquakeCatalogue,
+        times: StageTimes,
+        started: float,
+    ) -> None:
+        """Load the earthquakes of a payload from the response cache.
+
+        Args:
+            payload (dict): The requested payload.
+            catalogue (EarthquakeCatalogue): The cached events.
+            times (StageTimes): The stage times of this request.
+            started (float): perf_counter() when the request was made.
+        """
+        self.fetch_started = started
+        try:
+            catalogue.in_area, catalogue.area = self._area_columns(
+                catalogue, payload
+            )
+            self.load_earthquake_layer(
+                catalogue, self._earthquake_layer_name(payload), times
+            )
+            self.earthquake_payload = payload
+            self._filter_earthquake_layer(self.requested_payload, payload)
+            self._update_temporal_extent(self.requested_payload)
+            self._record_fetch_metrics(
+                payload, len(catalogue), times, cached=True
+            )
+            if layer_format() == "gpkg":
+                self._save_earthquake_layer(self.earthquake_layer)
+            # The layer and the cache hold their own copies
+            self.catalogue.release_features()
+            self._display_area_if_checked()
+        except GeoJsonProcessingError as e:
+            log_error(f"GeoJSON processing error: {str(e)}")
+            self.show_error(f"Error processing earthquake data: {str(e)}")
+
+    def _record_fetch_metrics(
+        self,
+        payload: dict,
+        events: int,
+        times: StageTimes,
+        feedback=None,
+        cached: bool = False,
+    ) -> None:
+        """Show the metrics of a completed fetch and add them to the log.
+
+        Args:
+            payload (dict): The fetched payload.
+            events (int): Number of events loaded.
+            times (StageTimes): The time spent in each stage.
+            feedback (FetchFeedback): The transfer statistics, if a request
+                was made.
+            cached (bool): Whether the events came from the response cache.
+        """
+        metrics = FetchMetrics(
+            payload,
+            events,
+            feedback.bytes_received if feedback else 0,
+            feedback.bytes_decoded if feedback else 0,
+            time.perf_counter() - self.fetch_started,
+            times,
+            cached=cached,
+        )
+        self.statusLabel.setText(
+            f"{metrics.summary()}\n{get_response_cache().summary()}"
+        )
+        append_metrics_log(metrics)
+
+    def _on_fetch_terminated(self, task: EarthquakeFetchTask) -> None:
+        """Report a failed fetch. Cancelled fetches are ignored silently.
+
+        Args:
+            task (EarthquakeFetchTask): The task that was terminated.
+        """
+        if task is self.fetch_task:
+            self.fetch_task = None
+            self._set_fetch_in_progress(False)
+
+        e = task.exception
+        if isinstance(e, ApiRequestError):
             log_error(f"API error: {str(e)}")
             self.show_error(
                 f"Could not retrieve data from the earthquake API:" f" {str(e)}"
             )
-        except GeoJsonProcessingError as e:
+        elif isinstance(e, GeoJsonProcessingError):
             log_error(f"GeoJSON processing error: {str(e)}")
             self.show_error(f"Error processing earthquake data: {str(e)}")
-        except Exception as e:
+        elif e is not None:
             log_error(f"Unexpected error: {str(e)}")
             self.show_error(f"An unexpected error occurred: {str(e)}")
 
+    def _earthquake_layer_name(self, payload: dict) -> str:
+        """Construct the earthquake layer name from the requested dates.
+
+        Args:
+            payload (dict): The payload the earthquakes were fetched with.
+
+        Returns:
+            str: e.g. "Earthquakes 2024-12-12 to 2024-12-19"
+        """
+        start_date = payload["start_time"][:10]
+        end_date = payload["end_time"][:10]
+        return f"Earthquakes {start_date} to {end_date}"
+
+    def set_live_mode(self, enabled: bool) -> None:
+        """Start or stop polling for new earthquakes.
+
+        Args:
+            enabled (bool): Set by Qt when the liveCheckBox is toggled.
+        """
+        if not enabled:
+            self.live_timer.stop()
+            return
+
+        interval = QgsSettings().value(
+            LIVE_SETTINGS_KEY, LIVE_INTERVAL_SECONDS, type=int
+        )
+        self.live_timer.start(max(1, interval) * 1000)
+
+        # Without a layer to append to, start with a regular fetch
+        if self.earthquake_layer is None and self.fetch_task is None:
+            self.fetch_and_load_earthquakes()
+
+    def set_local_area_filter(self, enabled: bool) -> None:
+        """Remember whether areas are filtered locally for the next fetch.
+
+        Args:
+            enabled (bool): Set by Qt when the localAreaCheckBox is toggled.
+        """
+        QgsSettings().setValue(LOCAL_AREA_SETTINGS_KEY, enabled)
+
+    def poll_live_earthquakes(self) -> None:
+        """Fetch the events since the latest one in the earthquake layer.
+
+        Only the last few minutes are requested, so a poll costs a few
+        kilobytes. New events are appended in _on_live_poll_completed.
+        """
+        if self.fetch_task is not None or self.live_task is not None:
+            return  # Wait for the running request
+        if self.catalogue is None or self.earthquake_payload is None:
+            return  # Nothing loaded yet
+        if not (
+            self.earthquake_layer
+            and self._is_layer_valid(self.earthquake_layer)
+        ):
+            # The layer was removed by the user, stop polling
+            self.liveCheckBox.setChecked(False)
+            return
+
+        time_range = self.catalogue.time_range()
+        if time_range is None:
+            latest = payload_time_to_epoch(self.earthquake_payload["end_time"])
+        else:
+            latest = time_range[1]
+
+        payload = dict(
+            self.earthquake_payload,
+            start_time=epoch_to_payload_time(latest - LIVE_OVERLAP_SECONDS),
+            end_time=epoch_to_payload_time(time.time()),
+        )
+        task = EarthquakeFetchTask(payload, use_store=False)
+        task.retrying.connect(self._show_retry)
+        task.taskCompleted.connect(lambda: self._on_live_poll_completed(task))
+        task.taskTerminated.connect(
+            lambda: self._on_live_poll_terminated(task)
+        )
+        self.live_task = task
+        QgsApplication.taskManager().addTask(task)
+
+    def _on_live_poll_completed(self, task: EarthquakeFetchTask) -> None:
+        """Append the events of a live poll that are not in the layer yet.
+
+        Args:
+            task (EarthquakeFetchTask): The finished poll.
+        """
+        if task is not self.live_task:
+            return  # Cancelled
+        self.live_task = None
+
+        layer = self.earthquake_layer
+        if self.catalogue is None or not (
+            layer and self._is_layer_valid(layer)
+        ):
+            return  # The layer was replaced or removed meanwhile
+
+        polled = task.catalogue
+        is_new = np.fromiter(
+            (event_id not in self.event_ids for event_id in polled.event_id),
+            dtype=bool,
+            count=len(polled),
+        )
+        end_time = task.payload["end_time"]
+        if self.requested_payload is not None:
+            requested = advance_payload_end(
+                self.requested_payload, self.earthquake_payload, end_time
+            )
+            if requested is not self.requested_payload:
+                # Keeps the polled events when the request is narrowed
+                self.requested_payload = requested
+                self._set_until_time(end_time)
+                self._update_temporal_extent(requested)
+        self.earthquake_payload = dict(
+            self.earthquake_payload, end_time=end_time
+        )
+        if not is_new.any():
+            return
+
+        try:
+            new_events = polled.subset(is_new)
+            new_events.in_area, new_events.area = self._area_columns(
+                new_events, self.earthquake_payload
+            )
+            append_earthquake_features(layer, self.catalogue, new_events)
+            self.catalogue.release_features()
+            self.event_ids.update(new_events.event_id)
+            self.apply_graduated_earthquake_symbology(
+                layer,
+                self.catalogue.time_range(),
+                choose_detail_levels(self.catalogue),
+            )
+        except Exception as e:
+            log_error(f"Failed to append live earthquakes: {str(e)}")
+
+    def _on_live_poll_terminated(self, task: EarthquakeFetchTask) -> None:
+        """Log a failed live poll; the next one is tried on schedule.
+
+        Args:
+            task (EarthquakeFetchTask): The terminated poll.
+        """
+        if task is self.live_task:
+            self.live_task = None
+        if task.exception is not None:
+            log_error(f"Live earthquake poll failed: {str(task.exception)}")
+
     def _validate_user_input(self) -> None:
         """Validate start and end times, magnitudes, and depths.
 
@@ -253,51 +1055,26 @@ class QgisSkjalftalisaDockWidget(QtWidgets.QDockWidget, FORM_CLASS):
             self.show_error(f"An unexpected error occurred: {str(e)}")
             raise
 
-    def _get_selected_area_polygon(self, selected_area: str) -> list:
-        """Retrieve the polygon geometry of the selected area.
-
-        Args:
-            selected_area (str): The name of the selected area.
+    def _selected_areas(self) -> list:
+        """Return the areas checked in the areaComboBox.
 
         Returns:
-            list: The coordinates of the polygon if found, otherwise None.
+            list: Area tuples from the area registry in the order they are
+            listed, empty if none is checked.
 
         Raises:
-            GeoJsonProcessingError: If the selected area's polygon cannot be
-            retrieved or processed.
+            GeoJsonProcessingError: If a checked area is not in the area
+            catalogue.
         """
-        try:
-            # Locate the geometry of the selected area in the GeoDataFrame
-            area_geometry = self.feature_collection_gdf.loc[
-                self.feature_collection_gdf["name"] == selected_area, "geometry"
-            ]
-
-            if area_geometry.empty:
+        areas = []
+        for selected_area in self.areaComboBox.checkedItems():
+            area = self.area_registry.get(selected_area)
+            if area is None:
                 raise GeoJsonProcessingError(
                     f"No geometry found for the selected area: {selected_area}"
                 )
-
-            # Extract the coordinates from the geometry
-            polygon_coordinates = area_geometry.iloc[0].exterior.coords[:]
-
-            # Return as a list of [latitude, longitude] pairs
-            return [[coord[1], coord[0]] for coord in polygon_coordinates]
-
-        except KeyError as e:
-            raise GeoJsonProcessingError(
-                f"Error retrieving polygon: Missing expected key in "
-                f"GeoDataFrame. Details: {str(e)}"
-            ) from e
-        except AttributeError as e:
-            raise GeoJsonProcessingError(
-                f"Error processing polygon geometry for area '{selected_area}'"
-                f": {str(e)}"
-            ) from e
-        except Exception as e:
-            raise GeoJsonProcessingError(
-                f"Unexpected error while retrieving polygon for area "
-                f"'{selected_area}': {str(e)}"
-            ) from e
+            areas.append(area)
+        return areas
 
     def _construct_earthquake_payload(self) -> dict:
         """Construct the payload for the earthquake API request.
@@ -339,20 +1116,17 @@ class QgisSkjalftalisaDockWidget(QtWidgets.QDockWidget, FORM_CLASS):
                 "start_time": start_time,
             }
 
-            # Include selected area if specified
-            selected_area = self.areaComboBox.currentText()
-            if selected_area != "Choose area":
-                try:
-                    area_polygon = self._get_selected_area_polygon(
-                        selected_area
-                    )
-                    if area_polygon:
-                        payload["area"] = area_polygon
-                except GeoJsonProcessingError as e:
-                    raise GeoJsonProcessingError(
-                        f"Failed to include selected area's polygon in the"
-                        f" payload: {str(e)}"
-                    ) from e
+            # Include the selected areas if specified; several areas are
+            # fetched by their hull and told apart locally
+            try:
+                areas = self._selected_areas()
+                if areas:
+                    payload["area"] = payload_polygon(areas)
+            except GeoJsonProcessingError as e:
+                raise GeoJsonProcessingError(
+                    f"Failed to include selected area's polygon in the"
+                    f" payload: {str(e)}"
+                ) from e
 
             return payload
 
@@ -368,242 +1142,88 @@ class QgisSkjalftalisaDockWidget(QtWidgets.QDockWidget, FORM_CLASS):
             self.show_error(f"An unexpected error occurred: {str(e)}")
             raise
 
-    def _fetch_earthquake_data(self, payload: dict) -> requests.Response:
-        """Send a POST request to fetch earthquake data
-
-        Args:
-            payload (dict): A dictionary of keys and values as specified on
-            Vedurstofan's API website.
-
-        Returns:
-            requests.Response: a POST response containing JSON earthquake data
+    def _display_area_if_checked(self) -> None:
+        """Display a polygon of the area of interest if the checkbox is ticked.
 
         Raises:
-            ApiRequestError: If the HTTP request fails or the server returns an
-            error status code.
+            GeoJsonProcessingError: If the geometry of a selected area cannot
+            be found.
         """
-        try:
-            # Send the POST request
-            response = requests.post(EARTHQUAKE_API_ENDPOINT, json=payload)
-            # Raises an HTTPError for bad responses (4xx, 5xx)
-            response.raise_for_status()
-
-            return response
-
-        except requests.HTTPError as e:
-            # Handle specific HTTP errors
-            error_message = (
-                f"HTTP error occurred: {response.status_code} - "
-                f"{response.reason}. Details: {response.text}"
-            )
-            log_error(error_message)
-            raise ApiRequestError(error_message) from e
-
-        except requests.RequestException as e:
-            # Handle general request issues
-            error_message = (
-                f"Failed to fetch earthquake data due to a network or"
-                f" connection error: {str(e)}"
-            )
-            log_error(error_message)
-            raise ApiRequestError(error_message) from e
-
-        except Exception as e:
-            # Handle unexpected exceptions
-            error_message = (
-                f"An unexpected error occurred while fetching earthquake data:"
-                f" {str(e)}"
-            )
-            log_error(error_message)
-            raise ApiRequestError(error_message) from e
-
-    def _process_earthquake_response(self, response: requests.Response) -> dict:
-        """Process the API response into a correctly formatted GeoJSON and
-        return it.
-
-        Args:
-            response (requests.Response): a POST response containing JSON
-            earthquake data
-
-        Returns:
-            dict: dictionary of GeoJSON-like keys and values
+        # Check if the "Show area" checkbox is checked
+        if not self.areaCheckBox.isChecked():
+            return
 
-        Raises:
-            GeoJsonProcessingError: If the response data cannot be parsed or
-            lacks required structure.
-            ApiRequestError: If the response indicates an API issue (e.g.,
-            missing expected keys).
-        """
         try:
-            quake_data = response.json()
-            # check if the response contains no features
-            if not quake_data:
-                QtWidgets.QMessageBox.information(
-                    self,
-                    "No Earthquakes Found",
-                    "No earthquakes were found with the selected criteria.",
-                )
-                return None
-
-            return {
-                "type": "FeatureCollection",
-                "features": quake_data,
-            }
+            areas = self._selected_areas()
+        except GeoJsonProcessingError as e:
+            log_error(str(e))
+            raise
 
-        except json.JSONDecodeError as e:
-            # Handle JSON parsing errors
-            error_message = f"Failed to parse API response as JSON: {str(e)}"
-            log_error(error_message)
-            raise GeoJsonProcessingError(error_message) from e
+        # Ensure an area is selected
+        if not areas:
+            return
 
-        except KeyError as e:
-            # Handle missing keys in the response
-            error_message = (
-                f"Unexpected API response format: Missing expected key"
-                f" {str(e)}."
-            )
-            log_error(error_message)
-            raise ApiRequestError(error_message) from e
+        # Display the polygons of the selected areas
+        self.display_area_polygon(areas)
 
-        except Exception as e:
-            # Handle any unexpected errors
-            error_message = (
-                f"An unexpected error occurred while processing the earthquake"
-                f" response: {str(e)}"
-            )
-            log_error(error_message)
-            raise GeoJsonProcessingError(error_message) from e
-
-    def _save_and_load_geojson(
-        self, geojson_data: dict, layer_name: str
+    def load_earthquake_layer(
+        self,
+        catalogue: EarthquakeCatalogue,
+        layer_name: str,
+        times: StageTimes = None,
     ) -> None:
-        """Save GeoJSON to a temporary file and load it into QGIS.
+        """Load earthquakes into QGIS as a memory layer.
 
         Args:
-            geojson_data (dict): dictionary of GeoJSON-like keys and values
-            layer_name (str): layer name
+            catalogue (EarthquakeCatalogue): The decoded earthquakes.
+            layer_name (str): The name of the layer to be displayed,
+            including the date range of the earthquakes.
+            times (StageTimes): Receives the time spent building the layer,
+            on its symbology and adding it to the project.
 
         Raises:
-            GeoJsonProcessingError: If saving the GeoJSON to a file fails or if
-            the data is invalid.
+            GeoJsonProcessingError: If the layer cannot be built from the
+            features.
         """
         try:
-            from tempfile import NamedTemporaryFile
-
-            with NamedTemporaryFile(
-                suffix=".geojson", delete=False
-            ) as temp_file:
-                geojson_path = temp_file.name
-                with open(geojson_path, "w") as file:
-                    json.dump(geojson_data, file, indent=2)
-
-            # Load the GeoJSON layer into QGIS
-            self.load_geojson_layer(geojson_path, layer_name)
-
-        except (OSError, IOError) as e:
-            # Handle file-related errors
-            error_message = f"Failed to save or load GeoJSON data: {str(e)}"
-            log_error(error_message)
-            raise GeoJsonProcessingError(error_message) from e
-
-        except Exception as e:
-            # Catch all other unexpected errors
-            error_message = (
-                f"An unexpected error occurred while saving or"
-                f" loading GeoJSON: {str(e)}"
-            )
-            log_error(error_message)
-            raise GeoJsonProcessingError(error_message) from e
+            if times is None:
+                times = StageTimes()
 
-    def _display_area_if_checked(self) -> None:
-        """Display a polygon of the area of interest if the checkbox is ticked.
-
-        Raises:
-            GeoJsonProcessingError: If the geometry of the selected area cannot
-            be found or processed.
-        """
-        try:
-            # Check if the "Show area" checkbox is checked
-            if self.areaCheckBox.isChecked():
-                selected_area = self.areaComboBox.currentText()
-
-                # Ensure a valid area is selected
-                if selected_area != "Choose area":
-                    # Locate the geometry of selected area in the GeoDataFrame
-                    geometry_str = self.feature_collection_gdf.loc[
-                        self.feature_collection_gdf["name"] == selected_area
-                    ]["geometry"].to_json()
-
-                    # Display the polygon for the selected area
-                    self.display_area_polygon(selected_area, geometry_str)
-
-        except KeyError as e:
-            # Handle missing geometry for the selected area
-            error_message = (
-                f"Failed to find geometry for area "
-                f"'{selected_area}': {str(e)}"
-            )
-            log_error(error_message)
-            raise GeoJsonProcessingError(error_message) from e
-
-        except Exception as e:
-            # Catch all other unexpected errors
-            error_message = (
-                f"An unexpected error occurred while displaying "
-                f"the area polygon: {str(e)}"
-            )
-            log_error(error_message)
-            raise GeoJsonProcessingError(error_message) from e
-
-    def load_geojson_layer(
-        self, geojson_path: str, layer_name: str = "Earthquakes"
-    ) -> None:
-        """Load a GeoJSON file as a temporary layer in QGIS, including the date
-        range in the name.
-
-        Args:
-            geojson_path (str): Path to the GeoJSON file.
-            layer_name (str): The name of the layer to be displayed.
-
-        Raises:
-            GeoJsonProcessingError: If the GeoJSON file is invalid or contains
-            no features.
-        """
-        try:
             self._remove_layers()
 
-            # Get the date range from the widgets
-            start_date = self.dateFromTimeEdit.date().toString("yyyy-MM-dd")
-            end_date = self.dateUntilTimeEdit.date().toString("yyyy-MM-dd")
-
-            # Construct the new layer name with the date range
-            layer_name = f"{layer_name} {start_date} to {end_date}"
-            layer = QgsVectorLayer(geojson_path, layer_name, "ogr")
+            with times.measure("layer"):
+                layer = create_earthquake_layer(catalogue, layer_name)
 
             if layer.isValid():
                 # Apply symbology and add the layer to QGIS
-                self.apply_graduated_earthquake_symbology(layer)
-                QgsProject.instance().addMapLayer(layer)
+                with times.measure("symbology"):
+                    self.apply_graduated_earthquake_symbology(
+                        layer,
+                        catalogue.time_range(),
+                        choose_detail_levels(catalogue),
+                    )
+                with times.measure("project"):
+                    QgsProject.instance().addMapLayer(layer)
                 self.earthquake_layer = layer  # Save the layer reference
+                self.catalogue = catalogue
+                self.event_ids = set(catalogue.event_id)
             else:
                 error_message = "Failed to load earthquakes layer."
                 self.show_error(error_message)
                 raise GeoJsonProcessingError(error_message)
 
-        except (OSError, IOError) as e:
-            error_message = f"Error reading GeoJSON file: {str(e)}"
-            log_error(error_message)
-            raise GeoJsonProcessingError(error_message) from e
+        except GeoJsonProcessingError:
+            raise
 
-        except json.JSONDecodeError as e:
-            error_message = f"Failed to parse GeoJSON file: {str(e)}"
+        except (KeyError, IndexError, TypeError, ValueError) as e:
+            error_message = f"Invalid earthquake feature: {str(e)}"
             log_error(error_message)
             raise GeoJsonProcessingError(error_message) from e
 
         except Exception as e:
             error_message = (
-                f"An unexpected error occurred while loading the GeoJSON layer:"
-                f" {str(e)}"
+                f"An unexpected error occurred while loading the earthquake"
+                f" layer: {str(e)}"
             )
             log_error(error_message)
             raise GeoJsonProcessingError(error_message) from e
@@ -619,11 +1239,12 @@ class QgisSkjalftalisaDockWidget(QtWidgets.QDockWidget, FORM_CLASS):
             # Reset the timeComboBox to the default placeholder
             self.timeComboBox.setCurrentIndex(0)
 
-            # Reset the areaComboBox to the default placeholder
-            self.areaComboBox.setCurrentIndex(0)
+            # Uncheck every area of the areaComboBox
+            self.areaComboBox.deselectAllOptions()
 
-            # Untick the checkbox
+            # Untick the checkboxes
             self.areaCheckBox.setCheckState(Qt.Unchecked)
+            self.liveCheckBox.setChecked(False)
 
             # Reset date/time edits
             self.update_time_range()  # Reset dateFromTimeEdit and dateUntilTimeEdit
@@ -665,6 +1286,9 @@ class QgisSkjalftalisaDockWidget(QtWidgets.QDockWidget, FORM_CLASS):
                         self.earthquake_layer.id()
                     )
                 self.earthquake_layer = None
+                self.catalogue = None
+                self.earthquake_payload = None
+                self.event_ids = set()
 
             if areas:
                 # Safely check and remove the area polygon layer
@@ -697,9 +1321,20 @@ class QgisSkjalftalisaDockWidget(QtWidgets.QDockWidget, FORM_CLASS):
             and QgsProject.instance().mapLayer(layer.id()) is not None
         )
 
-    def apply_graduated_earthquake_symbology(self, layer):
+    def apply_graduated_earthquake_symbology(
+        self, layer, time_range, detail_levels=None
+    ):
         """Apply graduated symbology to the earthquake layer based on
-        recency."""
+        recency.
+
+        Args:
+            layer (QgsVectorLayer): The earthquake layer.
+            time_range (tuple): (min, max) of the layer's __time_numeric
+            values as computed for the catalogue, None if no event has a
+            time. The layer itself is not iterated.
+            detail_levels (list): Scale ranges from choose_detail_levels();
+            zoomed out views then only draw the larger events.
+        """
         if not layer or not layer.isValid():
             return
 
@@ -722,48 +1357,22 @@ class QgisSkjalftalisaDockWidget(QtWidgets.QDockWidget, FORM_CLASS):
             <td>Stærðir</td>
             <td>[% "magnitude" %] [% "magnitude_type" %]</td>
         </tr>
+        <tr>
+            <td>Svæði</td>
+            <td>[% "area" %]</td>
+        </tr>
         </table>
         """
 
         # Set the map tip template for the layer
         layer.setMapTipTemplate(html_template)
 
-        # Fetch attribute table
-        layer_data = [feat for feat in layer.getFeatures()]
-
-        if not layer_data:
+        if time_range is None:
             self.show_error("No features in the layer to apply symbology.")
             return
 
-        # Determine the time range and convert to numeric values
-        time_field = "time"
-        numeric_time_field = "__time_numeric"
-
-        # Check if the field already exists, if not, add it
-        if numeric_time_field not in [field.name() for field in layer.fields()]:
-            layer.startEditing()
-            layer.dataProvider().addAttributes(
-                [QgsField(numeric_time_field, QVariant.Double)]
-            )
-            layer.updateFields()
-            layer.commitChanges()
-
-        # Populate the numeric time field
-        layer.startEditing()
-        for feat in layer.getFeatures():
-            feat_time = (
-                feat[time_field].toPyDateTime().timestamp()
-                if isinstance(feat[time_field], QDateTime)
-                else feat[time_field].timestamp()
-            )
-            feat[numeric_time_field] = feat_time
-            layer.updateFeature(feat)
-        layer.commitChanges()
-
-        # Fetch the range of numeric time values
-        time_values = [feat[numeric_time_field] for feat in layer.getFeatures()]
-        min_time = min(time_values)
-        max_time = max(time_values)
+        numeric_time_field = NUMERIC_TIME_FIELD
+        min_time, max_time = time_range
 
         # Create ranges based on recency
         total_seconds = max_time - min_time
@@ -782,19 +1391,16 @@ class QgisSkjalftalisaDockWidget(QtWidgets.QDockWidget, FORM_CLASS):
             if symbol:
                 symbol.setColor(QColor(single_category_color))
 
-                # Set size scaling using magnitude
-                size_expression = (
-                    'scale_linear( "magnitude",'
-                    'minimum("magnitude"),'
-                    'maximum("magnitude"), 1, 10)'
-                )
-                size_property = QgsProperty.fromExpression(size_expression)
+                # Set size scaling using the precomputed marker sizes
+                size_property = QgsProperty.fromField(SIZE_FIELD)
                 symbol.setDataDefinedSize(size_property)
 
                 range_ = QgsRendererRange(min_time, max_time, symbol, label)
 
             renderer = QgsGraduatedSymbolRenderer(numeric_time_field, [range_])
-            layer.setRenderer(renderer)
+            layer.setRenderer(
+                level_of_detail_renderer(renderer, detail_levels)
+            )
             layer.triggerRepaint()
             return
 
@@ -821,13 +1427,9 @@ class QgisSkjalftalisaDockWidget(QtWidgets.QDockWidget, FORM_CLASS):
             if symbol:
                 symbol.setColor(QColor(colors[i]))
 
-                # Set size scaling using QgsProperty and scale_linear expression
-                size_expression = (
-                    'scale_linear( "magnitude",'
-                    'minimum("magnitude"),'
-                    'maximum("magnitude"), 1, 10)'
-                )
-                size_property = QgsProperty.fromExpression(size_expression)
+                # Set size scaling using the marker sizes computed from the
+                # magnitudes at load time
+                size_property = QgsProperty.fromField(SIZE_FIELD)
                 symbol.setDataDefinedSize(size_property)
 
                 ranges.append(
@@ -839,11 +1441,11 @@ class QgisSkjalftalisaDockWidget(QtWidgets.QDockWidget, FORM_CLASS):
         renderer.setMode(QgsGraduatedSymbolRenderer.EqualInterval)
         renderer.setOrderBy(
             QgsFeatureRequest.OrderBy(
-                [QgsFeatureRequest.OrderByClause("__time_numeric", True)]
+                [QgsFeatureRequest.OrderByClause(numeric_time_field, True)]
             )
         )
         renderer.setOrderByEnabled(True)
-        layer.setRenderer(renderer)
+        layer.setRenderer(level_of_detail_renderer(renderer, detail_levels))
         layer.triggerRepaint()
 
     def update_time_range(self):
@@ -907,6 +1509,21 @@ class QgisSkjalftalisaDockWidget(QtWidgets.QDockWidget, FORM_CLASS):
 
         self.updating_time_range = False  # Unset the flag
 
+    def _set_until_time(self, end_time: str) -> None:
+        """Show a payload end_time in the dateUntilTimeEdit.
+
+        The timeComboBox keeps its selection, as the window only moves
+        along with live polls.
+
+        Args:
+            end_time (str): A payload end_time.
+        """
+        self.updating_time_range = True
+        self.dateUntilTimeEdit.setDateTime(
+            QDateTime.fromString(end_time, "yyyy-MM-dd HH:mm:ss")
+        )
+        self.updating_time_range = False
+
     def handle_custom_date_change(self):
         """Set the timeComboBox to 'Custom range' when date/time is manually
         changed."""
@@ -924,138 +1541,116 @@ class QgisSkjalftalisaDockWidget(QtWidgets.QDockWidget, FORM_CLASS):
             self.timeComboBox.setCurrentIndex(custom_range_index)
 
     def populate_area_combobox(self):
-        """Fetch area information from the API and populate the areaComboBox."""
-        url = "https://vi-api.vedur.is/skjalftalisa/v1/areas"
-        headers = {"Accept": "application/json"}
+        """Populate the areaComboBox from the cached area catalogue and
+        refresh the catalogue in the background."""
+        cached = load_cached_catalogue()
+        if cached is not None:
+            self._set_area_catalogue(cached["areas"])
+
+        # Revalidate the catalogue without blocking the dock
+        task = AreaCatalogueRefreshTask(cached)
+        task.taskCompleted.connect(
+            lambda: self._on_area_catalogue_refreshed(task)
+        )
+        task.taskTerminated.connect(
+            lambda: self._on_area_catalogue_refresh_failed(task)
+        )
+        self.area_task = task
+        QgsApplication.taskManager().addTask(task)
 
-        # Clear the combo box and prepare to store polygons
-        self.areaComboBox.clear()
-        self.areaComboBox.addItem("Choose area")  # Placeholder item
+    def _set_area_catalogue(self, areas: list) -> None:
+        """Build the area registry and fill the areaComboBox with it.
 
-        try:
-            # Fetch areas from the API
-            response = requests.get(url, headers=headers)
-            if response.status_code == 200:
-                response = response.json()
-
-                features = []
-
-                for i in response:
-                    id_area = i["id_area"]
-                    area_json = i["area_json"]
-                    area_name = area_json["name"]
-                    area_polygon = [
-                        list(coord_xy)
-                        for coord_xy in [
-                            (coord_yx[1], coord_yx[0])
-                            for coord_yx in area_json["polygon"]
-                        ]
-                    ]
-                    area_polygon.append(area_polygon[0])  # Ensure closure
-                    area_polygon.reverse()
-
-                    partial_geojson = {
-                        "type": "Feature",
-                        "properties": {"name": area_name, "id": id_area},
-                        "geometry": {
-                            "type": "Polygon",
-                            "coordinates": [area_polygon],
-                        },
-                    }
+        The checked areas that still exist stay checked.
 
-                    features.append(partial_geojson)
+        Args:
+            areas (list): The decoded /areas response.
+        """
+        try:
+            area_registry = AreaRegistry.from_catalogue(areas)
+        except Exception as e:
+            self.show_error(f"An error occurred while reading areas: {str(e)}")
+            return
 
-                feature_collection_str = json.dumps(
-                    {"type": "FeatureCollection", "features": features}
-                )
+        self.area_registry = area_registry
+        if not len(area_registry):
+            self.show_error("No areas available.")
+            return
 
-                feature_collection_geojson = json.loads(feature_collection_str)
-                self.feature_collection_gdf = gpd.GeoDataFrame.from_features(
-                    feature_collection_geojson["features"], crs="EPSG:4326"
-                )
+        selected_areas = self.areaComboBox.checkedItems()
 
-                self.feature_collection_gdf["ends_with_vi"] = (
-                    self.feature_collection_gdf["name"].str.endswith("- VÍ")
-                )
-                self.feature_collection_gdf.sort_values(
-                    by=["ends_with_vi", "name"],
-                    ascending=[False, True],
-                    inplace=True,
-                    ignore_index=True,
-                )
-                self.feature_collection_gdf.drop(
-                    columns=["ends_with_vi"], inplace=True
-                )
+        self.areaComboBox.blockSignals(True)
+        self.areaComboBox.clear()
+        self.areaComboBox.addItems(area_registry.names())
+        # Keep the user's choice
+        self.areaComboBox.setCheckedItems(
+            [name for name in selected_areas if name in area_registry]
+        )
+        self.areaComboBox.blockSignals(False)
 
-                if not self.feature_collection_gdf.empty:
-                    # Populate the combo box
-                    for name in self.feature_collection_gdf["name"]:
-                        self.areaComboBox.addItem(name)
-                    # set placeholder as default
-                    self.areaComboBox.setCurrentIndex(0)
-                else:
-                    self.show_error("No areas available.")
-            else:
-                self.show_error(
-                    f"Failed to fetch areas:"
-                    f" {response.status_code} - {response.text}"
-                )
-        except Exception as e:
-            self.show_error(f"An error occurred while fetching areas: {str(e)}")
+    def _on_area_catalogue_refreshed(self, task: AreaCatalogueRefreshTask):
+        """Update the areaComboBox if the refreshed catalogue has changed.
 
-    def display_area_polygon(self, selected_area, geometry_str):
-        """Display the selected area's polygon as a separate layer."""
-        try:
-            self._remove_layers(earthquakes=False)
-
-            # Parse the geometry string into a dictionary
-            geojson = json.loads(geometry_str)
+        Args:
+            task (AreaCatalogueRefreshTask): The finished refresh task.
+        """
+        self.area_task = None
+        if task.changed:
+            self._set_area_catalogue(task.areas)
 
-            # Extract the first feature's geometry from the FeatureCollection
-            if geojson["type"] == "FeatureCollection" and "features" in geojson:
-                feature_geometry = geojson["features"][0]["geometry"]
-            else:
-                raise ValueError(
-                    "Invalid GeoJSON: Expected a FeatureCollection with"
-                    " features."
-                )
+    def _on_area_catalogue_refresh_failed(
+        self, task: AreaCatalogueRefreshTask
+    ):
+        """Report a failed catalogue refresh if there is nothing cached.
 
-            # Convert the feature geometry to a shapely object
-            geometry = shape(feature_geometry)
+        Args:
+            task (AreaCatalogueRefreshTask): The terminated refresh task.
+        """
+        self.area_task = None
+        if task.exception is None:
+            return  # Cancelled
+        log_error(f"Failed to refresh areas: {str(task.exception)}")
+        if task.cached is None:
+            self.show_error(
+                f"An error occurred while fetching areas:"
+                f" {str(task.exception)}"
+            )
 
-            # Ensure the geometry follows the right-hand rule
-            oriented_geometry = orient(geometry, sign=1.0)
+    def display_area_polygon(self, areas: list):
+        """Display the polygons of areas as a separate layer.
 
-            # Convert the oriented geometry back to GeoJSON format
-            geojson_oriented = mapping(oriented_geometry)
+        Args:
+            areas (list): Area tuples from the area registry.
+        """
+        try:
+            self._remove_layers(earthquakes=False)
 
-            # Wrap in FeatureCollection format
+            # The registry keeps the geometry oriented by the right-hand rule
             geojson_data_corrected = {
                 "type": "FeatureCollection",
                 "features": [
                     {
                         "type": "Feature",
-                        "geometry": geojson_oriented,
-                        "properties": {"name": selected_area},
+                        "geometry": area.display_geometry,
+                        "properties": {"name": area.name},
                     }
+                    for area in areas
                 ],
             }
 
-            from tempfile import NamedTemporaryFile
-
-            # Write the corrected GeoJSON to a temporary file
-            with NamedTemporaryFile(
-                suffix=".geojson", delete=False
-            ) as temp_file:
-                geojson_path = temp_file.name
-                with open(geojson_path, "w") as file:
-                    json.dump(geojson_data_corrected, file, indent=2)
+            # The same area reuses the file written the last time
+            scratch_store = get_scratch_store()
+            geojson_path = scratch_store.write_json(
+                geojson_data_corrected, prefix="area-", suffix=".geojson"
+            )
 
             # Load the corrected GeoJSON as a layer
-            layer_name = f"Area: {selected_area}"
+            layer_name = f"Area: {', '.join(area.name for area in areas)}"
             layer = QgsVectorLayer(geojson_path, layer_name, "ogr")
             if layer.isValid():
                 self.apply_area_symbology(layer)
+                # Released again in _on_layers_removed
+                scratch_store.pin(layer.id(), geojson_path)
                 QgsProject.instance().addMapLayer(layer)
                 self.area_layer = layer  # Save the reference to the layer
             else:
@@ -1065,6 +1660,14 @@ class QgisSkjalftalisaDockWidget(QtWidgets.QDockWidget, FORM_CLASS):
                 f"An error occurred while displaying the polygon:" f" {str(e)}"
             )
 
+    def _on_layers_removed(self, layer_ids: list) -> None:
+        """Release the scratch files of layers removed from the project.
+
+        Args:
+            layer_ids (list): Ids of the layers about to be removed.
+        """
+        release_scratch_files(layer_ids)
+
     def apply_area_symbology(self, layer):
         """Applies a simple symbology to the area polygon
 
@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+"""A scratch store for the files behind file-backed layers.
+
+Files are named by a hash of their content, so writing the same polygon
+twice reuses the existing file. Files in use by a layer are pinned under
+the layer id until the layer is removed, and files behind the layers of
+the open project are kept as well, e.g. those of a project saved in an
+earlier session. The others are evicted, least recently used first,
+whenever the store grows past its budget.
+
+There is one store per kind of file: "scratch" for small files such as
+area polygons and "catalogues" for earthquake layers saved to disk. The
+catalogues are never evicted, as projects saved in other sessions may
+refer to them; only the files the dock itself abandons are discarded.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import uuid
+
+from qgis.core import QgsProject, QgsSettings
+
+from .utils import log_error, profile_dir
+
+# Default budget of each store, see ScratchStore.from_settings; None for
+# stores that are never evicted
+DEFAULT_BUDGETS_MB = {
+    "scratch": 50,
+    "catalogues": None,
+}
+
+# Files are written under this suffix and renamed once complete
+PARTIAL_SUFFIX = ".partial"
+
+
+class ScratchStore:
+    """A directory of scratch files with a size budget.
+
+    Args:
+        directory (str): Directory owned by the store.
+        budget_bytes (int): Size the unpinned files are evicted down to,
+            or None to never evict them.
+        in_use (callable): Returns the paths of files that are in use
+            without a pin and must not be evicted, see
+            project_layer_paths().
+    """
+
+    def __init__(self, directory: str, budget_bytes: int, in_use=None):
+        self.directory = directory
+        self.budget_bytes = budget_bytes
+        self.in_use = in_use
+        self._pins = {}  # owner (layer id) -> path
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls, name: str = "scratch") -> "ScratchStore":
+        """Create a store in the profile with its configured budget.
+
+        Args:
+            name (str): The kind of store, a key of DEFAULT_BUDGETS_MB. The
+                budget of an evicted store is read from
+                qgis_skjalftalisa/<name>/budget_mb.
+        """
+        if DEFAULT_BUDGETS_MB[name] is None:
+            return cls(profile_dir(name), None)
+        budget_mb = QgsSettings().value(
+            f"qgis_skjalftalisa/{name}/budget_mb",
+            DEFAULT_BUDGETS_MB[name],
+            type=int,
+        )
+        return cls(
+            profile_dir(name), budget_mb * 1024 * 1024, project_layer_paths
+        )
+
+    def __contains__(self, path: str) -> bool:
+        return os.path.dirname(os.path.abspath(path)) == self.directory
+
+    def new_path(self, prefix: str = "", suffix: str = "") -> str:
+        """Return an unused path for a file written by someone else.
+
+        The path is pinned under itself, so that the file is not evicted
+        while it is being written; release([path]) once it has an owner.
+        """
+        path = os.path.join(
+            self.directory, f"{prefix}{uuid.uuid4().hex}{suffix}"
+        )
+        self.pin(path, path)
+        return path
+
+    def write_json(self, data, prefix: str = "", suffix: str = ".json") -> str:
+        """Write data as JSON, or reuse the file already holding it.
+
+        Args:
+            data: JSON-serialisable data, e.g. a GeoJSON FeatureCollection.
+            prefix (str): Start of the file name, e.g. "area-".
+            suffix (str): File extension, e.g. ".geojson".
+
+        Returns:
+            str: Absolute path of the file.
+        """
+        content = json.dumps(data, indent=2, sort_keys=True).encode("utf-8")
+        return self.write_bytes(content, prefix, suffix)
+
+    def write_bytes(
+        self, content: bytes, prefix: str = "", suffix: str = ""
+    ) -> str:
+        """Write content to a file named by its hash, unless it exists.
+
+        Reusing a file marks it as recently used. The store is evicted down
+        to its budget afterwards.
+
+        Args:
+            content (bytes): The file content.
+            prefix (str): Start of the file name.
+            suffix (str): File extension.
+
+        Returns:
+            str: Absolute path of the file.
+        """
+        digest = hashlib.sha256(content).hexdigest()[:32]
+        path = os.path.join(self.directory, f"{prefix}{digest}{suffix}")
+        with self._lock:
+            if os.path.exists(path):
+                os.utime(path)
+            else:
+                partial = f"{path}{PARTIAL_SUFFIX}"
+                with open(partial, "wb") as file:
+                    file.write(content)
+                os.replace(partial, path)
+            self._evict(keep=path)
+        return path
+
+    def pin(self, owner: str, path: str) -> None:
+        """Keep a file while its owner, usually a layer id, exists."""
+        with self._lock:
+            self._pins[owner] = path
+
+    def release(self, owners) -> None:
+        """Unpin the files of owners and evict down to the budget.
+
+        Args:
+            owners (iterable): Owners passed to pin(); unknown ones are
+                ignored.
+        """
+        with self._lock:
+            released = [self._pins.pop(owner, None) for owner in owners]
+            if any(released):
+                self._evict()
+
+    def discard(self, path: str) -> None:
+        """Delete a file and its side files that are no longer needed."""
+        with self._lock:
+            for entry in self._entries():
+                if _belongs_to(entry.path, path):
+                    try:
+                        os.remove(entry.path)
+                    except OSError as e:
+                        log_error(f"Could not remove {entry.path}: {e}")
+
+    def release_all(self) -> None:
+        """Unpin every file and evict down to the budget.
+
+        Files still in use by the project are kept.
+        """
+        with self._lock:
+            self._pins.clear()
+            self._evict()
+
+    def size(self) -> int:
+        """Return the total size of the files in the store in bytes."""
+        with self._lock:
+            return sum(entry.stat().st_size for entry in self._entries())
+
+    def _entries(self) -> list:
+        try:
+            with os.scandir(self.directory) as entries:
+                return [entry for entry in entries if entry.is_file()]
+        except FileNotFoundError:
+            return []
+
+    def _evict(self, keep: str = None) -> None:
+        """Delete unpinned files, least recently used first, to the budget.
+
+        Must be called with the lock held.
+        """
+        if self.budget_bytes is None:
+            return
+        pinned = set(self._pins.values())
+        pinned.add(keep)
+        if self.in_use is not None:
+            pinned.update(self.in_use())
+        files = []
+        total = 0
+        for entry in self._entries():
+            stat = entry.stat()
+            total += stat.st_size
+            if not any(_belongs_to(entry.path, path) for path in pinned):
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+
+        for _, size, path in sorted(files):
+            if total <= self.budget_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError as e:
+                # e.g. still open by a layer on Windows; retried next time
+                log_error(f"Could not remove scratch file {path}: {e}")
+                continue
+            total -= size
+
+
+def project_layer_paths() -> set:
+    """Return the files behind the layers of the open project.
+
+    Returns:
+        set: Absolute paths, without the layer name and other options of
+        the data source.
+    """
+    return {
+        os.path.abspath(layer.source().split("|")[0])
+        for layer in QgsProject.instance().mapLayers().values()
+    }
+
+
+def _belongs_to(path: str, main: str) -> bool:
+    """Return whether path is main or one of its side files.
+
+    e.g. the -wal and -shm journals SQLite keeps next to a GeoPackage.
+    """
+    return main is not None and (path == main or path.startswith(f"{main}-"))
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_scratch_store(name: str = "scratch") -> ScratchStore:
+    """Return a plugin-wide scratch store, creating it on first use.
+
+    Args:
+        name (str): The kind of store, a key of DEFAULT_BUDGETS_MB.
+    """
+    with _stores_lock:
+        if name not in _stores:
+            _stores[name] = ScratchStore.from_settings(name)
+        return _stores[name]
+
+
+def release_scratch_files(owners) -> None:
+    """Unpin the files of owners, e.g. removed layers, in every store."""
+    with _stores_lock:
+        stores = list(_stores.values())
+    for store in stores:
+        store.release(owners)
+
+
+def close_scratch_store() -> None:
+    """Release every file of the scratch stores, e.g. on plugin unload."""
+    with _stores_lock:
+        for store in _stores.values():
+            store.release_all()
+        _stores.clear()
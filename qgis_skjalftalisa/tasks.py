@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+"""Background tasks run through the QGIS task manager."""
+
+import sqlite3
+
+from qgis.PyQt.QtCore import pyqtSignal
+from qgis.core import QgsAbstractFeatureSource, QgsTask
+
+from .api import FetchFeedback, fetch_earthquakes, stream_earthquakes
+from .catalogue import EarthquakeCatalogue
+from .event_store import (
+    EventStore,
+    fetch_earthquakes_stored,
+    store_enabled,
+    stream_earthquakes_stored,
+)
+from .exceptions import FetchCanceledError
+from .layers import write_earthquake_geopackage
+from .metrics import StageTimes
+from .utils import log_error
+
+
+class EarthquakeFetchTask(QgsTask):
+    """Fetch and decode earthquakes off the GUI thread.
+
+    Only the network transfer, the event store, JSON decoding and the
+    computation of the catalogue columns happen in run(). The dock listens
+    to taskCompleted/taskTerminated, which are emitted on the main thread,
+    and builds the layer from `catalogue` there.
+
+    When streaming, the response is decoded while it is downloaded and
+    every batch is emitted through batchDecoded as soon as it is complete;
+    `catalogue` then stays None and the listener assembles the events.
+
+    Args:
+        payload (dict): The quakefilter request payload.
+        use_store (bool): Answer from the event store where possible. Live
+            polls of the last few minutes bypass it.
+        stream (bool): Emit the events in batches instead of collecting
+            them in `catalogue`.
+        times (StageTimes): Receives the time spent in each stage of the
+            fetch; a new one if not given.
+    """
+
+    # bytes received, bytes expected (0 if unknown), events decoded
+    transferProgress = pyqtSignal(int, int, int)
+
+    # EarthquakeCatalogue of the next batch of a streamed fetch
+    batchDecoded = pyqtSignal(object)
+
+    # attempt, max retries, seconds until the retry, reason
+    retrying = pyqtSignal(int, int, float, str)
+
+    def __init__(
+        self,
+        payload: dict,
+        use_store: bool = True,
+        stream: bool = False,
+        times: StageTimes = None,
+    ):
+        super().__init__("Fetching earthquakes", QgsTask.CanCancel)
+        self.payload = payload
+        self.use_store = use_store
+        self.stream = stream
+        self.times = StageTimes() if times is None else times
+        self.feedback = None  # transfer statistics, once run() has started
+        self.catalogue = None
+        self.exception = None
+
+    def run(self) -> bool:
+        """Download and decode the quakefilter response.
+
+        Returns:
+            bool: True if the catalogue was fetched or streamed, False if
+            the task was cancelled or failed (in which case `exception` is
+            set).
+        """
+        try:
+            feedback = FetchFeedback(
+                self.isCanceled,
+                self._report_progress,
+                self.times,
+                on_retry=self.retrying.emit,
+            )
+            self.feedback = feedback
+            with self.times.measure("store"):
+                store = self._open_event_store()
+            if self.stream:
+                if store is None:
+                    batches = stream_earthquakes(self.payload, feedback)
+                else:
+                    batches = stream_earthquakes_stored(
+                        self.payload, feedback, store
+                    )
+                for features in batches:
+                    feedback.raise_if_canceled()
+                    with self.times.measure("catalogue"):
+                        batch = EarthquakeCatalogue.from_features(features)
+                    self.batchDecoded.emit(batch)
+                return True
+
+            if store is None:
+                features = fetch_earthquakes(self.payload, feedback)
+            else:
+                features = fetch_earthquakes_stored(
+                    self.payload, feedback, store
+                )
+
+            feedback.raise_if_canceled()
+            with self.times.measure("catalogue"):
+                self.catalogue = EarthquakeCatalogue.from_features(features)
+            return True
+
+        except FetchCanceledError:
+            return False
+        except Exception as e:
+            self.exception = e
+            return False
+
+    def _open_event_store(self) -> EventStore:
+        """Open the event store, or return None if it is disabled or
+        unusable, in which case the whole window is fetched."""
+        if not self.use_store or not store_enabled():
+            return None
+        try:
+            return EventStore.default()
+        except (sqlite3.Error, OSError) as e:
+            log_error(f"Event store unavailable: {str(e)}")
+            return None
+
+    def _report_progress(
+        self, bytes_received: int, bytes_total: int, events_received: int
+    ) -> None:
+        if bytes_total:
+            self.setProgress(min(100.0, 100.0 * bytes_received / bytes_total))
+        self.transferProgress.emit(
+            bytes_received, bytes_total, events_received
+        )
+
+
+class EarthquakeLayerWriteTask(QgsTask):
+    """Write a completed earthquake layer to a GeoPackage in the background.
+
+    The features are read from a feature source of the layer's provider,
+    which is a snapshot that can be iterated off the GUI thread, so the
+    catalogue does not need its feature dictionaries. Once the task has
+    completed, `fids` holds the feature ids in the layer and in the
+    GeoPackage, see write_earthquake_geopackage().
+
+    Args:
+        source (QgsAbstractFeatureSource): All features of the layer.
+        catalogue (EarthquakeCatalogue): The events in the layer.
+        fields (QgsFields): The schema of the layer.
+        path (str): The GeoPackage to create.
+    """
+
+    def __init__(
+        self,
+        source: QgsAbstractFeatureSource,
+        catalogue: EarthquakeCatalogue,
+        fields,
+        path: str,
+    ):
+        super().__init__("Saving earthquakes", QgsTask.CanCancel)
+        self.source = source
+        # A copy of the columns, the dock may append to the catalogue in
+        # the meantime
+        self.catalogue = catalogue.copy()
+        self.catalogue.release_features()
+        self.fields = fields
+        self.path = path
+        self.fids = None
+        self.exception = None
+
+    def run(self) -> bool:
+        try:
+            self.fids = write_earthquake_geopackage(
+                self.path, self.source, self.fields, self.isCanceled
+            )
+            return self.fids is not None
+        except Exception as e:
+            self.exception = e
+            return False
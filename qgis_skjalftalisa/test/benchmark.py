@@ -0,0 +1,330 @@
+# coding=utf-8
+"""Offline benchmark of the earthquake pipeline.
+
+Every catalogue size is run in a fresh Python process against a local
+MockApiServer, with a throw-away QGIS profile, and the results of all sizes
+are written to one JSON file::
+
+    python -m qgis_skjalftalisa.test.benchmark --output benchmark.json
+
+Each run times the stages of the pipeline on their own (payload, HTTP,
+decode, catalogue, layer build, symbology, add to project) and then drives
+the dock's fetch_and_load_earthquakes end to end, as a user would. The
+report also records what loading the plugin adds to the QGIS start up.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'william@moreland.is'
+__date__ = '2024-12-19'
+__copyright__ = 'Copyright 2024, William M. Moreland'
+
+import argparse
+import importlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+DEFAULT_SIZES = (1000, 10000, 100000, 1000000)
+
+# Seconds to wait for the dock to load a catalogue
+END_TO_END_TIMEOUT = 1800
+
+PLUGIN_PACKAGE = __package__.rpartition(".")[0]
+
+# Packages that must not be imported before the dock is opened
+STARTUP_HEAVY_PACKAGES = (
+    "geopandas",
+    "numpy",
+    "pandas",
+    "pyproj",
+    "requests",
+    "shapely",
+    f"{PLUGIN_PACKAGE}.qgis_skjalftalisa_dockwidget",
+)
+
+
+def peak_rss_kb() -> int:
+    """Return the peak resident set size of this process in kB, or None."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kB elsewhere
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+class StageTimer:
+    """Collects wall time and peak memory of named stages."""
+
+    def __init__(self):
+        self.stages = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        started = time.perf_counter()
+        yield
+        self.stages[name] = {
+            "seconds": round(time.perf_counter() - started, 6),
+            "peak_rss_kb": peak_rss_kb(),
+        }
+
+
+def _process_events() -> None:
+    """Let queued signals and finished tasks reach the dock."""
+    from qgis.PyQt.QtCore import QCoreApplication, QEventLoop
+
+    QCoreApplication.processEvents(QEventLoop.AllEvents, 50)
+
+
+def _wait_for(predicate, timeout: float) -> None:
+    """Process Qt events until predicate() is true."""
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"Gave up after {timeout} seconds.")
+        _process_events()
+
+
+def run_size(events: int) -> dict:
+    """Benchmark one catalogue size in this process.
+
+    Must run in a process of its own: the API url and the QGIS profile are
+    taken from the environment when the plugin and QGIS are first imported.
+    """
+    from .mock_api import MockApiServer
+
+    with MockApiServer(events) as server:
+        os.environ["SKJALFTALISA_API_URL"] = server.url
+        os.environ["QGIS_CUSTOM_CONFIG_PATH"] = tempfile.mkdtemp(
+            prefix="skjalftalisa-benchmark-"
+        )
+
+        from qgis.PyQt.QtCore import QDateTime
+        from qgis.core import Qgis, QgsProject
+
+        from .utilities import get_qgis_app
+
+        _, _, iface, _ = get_qgis_app()
+
+        from ..api import (
+            FetchFeedback,
+            fetch_earthquake_data,
+            format_payload_time,
+            process_earthquake_response,
+        )
+        from ..catalogue import EarthquakeCatalogue
+        from ..layers import choose_detail_levels, create_earthquake_layer
+        from ..qgis_skjalftalisa_dockwidget import QgisSkjalftalisaDockWidget
+
+        dock = QgisSkjalftalisaDockWidget(iface)
+        _wait_for(lambda: dock.area_task is None, 60)
+
+        # Select the whole synthetic catalogue. The dock sends the wall
+        # time of its date edits as payload times, so they are set from
+        # payload times rather than from UTC, whatever the local zone.
+        for edit, value in (
+            (dock.dateFromTimeEdit, server.catalogue.start),
+            (dock.dateUntilTimeEdit, server.catalogue.end),
+        ):
+            edit.setDateTime(
+                QDateTime.fromString(
+                    format_payload_time(value.astype("datetime64[s]").item()),
+                    "yyyy-MM-dd HH:mm:ss",
+                )
+            )
+        dock.magMaxSpinBox.setValue(10)
+        dock.depthMaxSpinBox.setValue(700)
+
+        timer = StageTimer()
+        with timer.stage("payload"):
+            payload = dock._construct_earthquake_payload()
+
+        # The stages on their own, with the whole window in one request
+        feedback = FetchFeedback()
+        with timer.stage("http"):
+            body = fetch_earthquake_data(payload, feedback)
+        with timer.stage("decode"):
+            features = process_earthquake_response(body)
+        body_bytes = len(body)
+        del body
+        with timer.stage("catalogue"):
+            catalogue = EarthquakeCatalogue.from_features(features)
+        del features
+        with timer.stage("layer_build"):
+            layer = create_earthquake_layer(catalogue, "benchmark")
+        with timer.stage("symbology"):
+            dock.apply_graduated_earthquake_symbology(
+                layer, catalogue.time_range(), choose_detail_levels(catalogue)
+            )
+        with timer.stage("add_to_project"):
+            QgsProject.instance().addMapLayer(layer)
+        QgsProject.instance().removeMapLayer(layer.id())
+        del layer, catalogue
+
+        # The whole pipeline as driven from the dock
+        started = time.perf_counter()
+        first_batch = None
+        dock.fetch_and_load_earthquakes()
+        while dock.fetch_task is not None:
+            if first_batch is None and dock.earthquake_layer is not None:
+                first_batch = time.perf_counter() - started
+            _process_events()
+            if time.perf_counter() - started > END_TO_END_TIMEOUT:
+                raise TimeoutError("The dock did not finish loading.")
+        total = time.perf_counter() - started
+
+        loaded = dock.earthquake_layer
+        result = {
+            "events": events,
+            "events_selected": int(len(server.catalogue.select(payload))),
+            "response_bytes": body_bytes,
+            "wire_bytes": feedback.bytes_received,
+            "stages": timer.stages,
+            "end_to_end": {
+                "first_batch_seconds": (
+                    None if first_batch is None else round(first_batch, 6)
+                ),
+                "total_seconds": round(total, 6),
+                "requests": len(server.requests) - 1,
+                "features_loaded": (
+                    None if loaded is None else loaded.featureCount()
+                ),
+                "peak_rss_kb": peak_rss_kb(),
+            },
+            "qgis": Qgis.version(),
+        }
+        dock.cancel_background_tasks()
+        return result
+
+
+def run_startup() -> dict:
+    """Measure loading the plugin as QGIS does at start up.
+
+    Must run in a process of its own, with a scratch working directory, so
+    that nothing of the plugin has been imported yet.
+    """
+    # QGIS has imported this before it loads any plugin
+    import qgis.core  # noqa: F401
+
+    modules = set(sys.modules)
+    files = set(os.listdir())
+    started = time.perf_counter()
+    importlib.import_module(PLUGIN_PACKAGE)
+    importlib.import_module(f"{PLUGIN_PACKAGE}.qgis_skjalftalisa")
+    seconds = time.perf_counter() - started
+
+    imported = set(sys.modules) - modules
+    return {
+        "import_seconds": round(seconds, 6),
+        "modules_imported": len(imported),
+        "heavy_modules": sorted(
+            name
+            for name in imported
+            if name.startswith(STARTUP_HEAVY_PACKAGES)
+        ),
+        "files_created": sorted(set(os.listdir()) - files),
+    }
+
+
+def measure_startup() -> dict:
+    """Run run_startup() in a fresh process and return its result."""
+    plugin_parent = os.path.dirname(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    )
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        [plugin_parent] + [path for path in sys.path if path]
+    )
+    with tempfile.TemporaryDirectory(prefix="skjalftalisa-startup-") as cwd:
+        completed = subprocess.run(
+            [sys.executable, "-m", __spec__.name, "--startup"],
+            stdout=subprocess.PIPE,
+            check=True,
+            text=True,
+            cwd=cwd,
+            env=env,
+        )
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def run(sizes, output: str) -> dict:
+    """Benchmark every size in a subprocess and write the results."""
+    print("Measuring the plugin start up...", file=sys.stderr)
+    startup = measure_startup()
+    results = []
+    for events in sizes:
+        print(f"Benchmarking {events} events...", file=sys.stderr)
+        completed = subprocess.run(
+            [sys.executable, "-m", __spec__.name, "--run-size", str(events)],
+            stdout=subprocess.PIPE,
+            check=True,
+            text=True,
+        )
+        # The result is the last line, QGIS may print before it
+        results.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+
+    report = {
+        "benchmark": "qgis_skjalftalisa",
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "startup": startup,
+        "results": results,
+    }
+    with open(output, "w", encoding="utf-8") as file:
+        json.dump(report, file, indent=2)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=DEFAULT_SIZES,
+        help="Catalogue sizes to benchmark.",
+    )
+    parser.add_argument(
+        "--output",
+        default="benchmark.json",
+        help="File the results are written to.",
+    )
+    parser.add_argument("--run-size", type=int, help=argparse.SUPPRESS)
+    parser.add_argument(
+        "--startup", action="store_true", help=argparse.SUPPRESS
+    )
+    args = parser.parse_args()
+
+    if args.startup:
+        print(json.dumps(run_startup()))
+        return
+
+    if args.run_size is not None:
+        print(json.dumps(run_size(args.run_size)))
+        # Leave without tearing QGIS down, which is slow and may crash
+        sys.stdout.flush()
+        os._exit(0)
+
+    run(args.sizes, args.output)
+    print(f"Results written to {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,347 @@
+# coding=utf-8
+"""A local stand-in for the Skjálftalísa API.
+
+The server answers /areas and /quakefilter from a synthetic catalogue of
+reproducible events, so that the fetch pipeline can be tested and
+benchmarked without the network. Point the plugin at it by setting the
+SKJALFTALISA_API_URL environment variable to its url before the plugin is
+imported, or run it on its own::
+
+    python -m qgis_skjalftalisa.test.mock_api --events 100000 --port 8000
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'william@moreland.is'
+__date__ = '2024-12-19'
+__copyright__ = 'Copyright 2024, William M. Moreland'
+
+import argparse
+import json
+import threading
+import time
+
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import shapely
+
+# Events are spread over this window, which ends at the `end` of the server
+CATALOGUE_SPAN = timedelta(days=365)
+
+# Events per chunk of a streamed /quakefilter response
+RESPONSE_CHUNK_EVENTS = 1000
+
+# Seconds a held response waits at most for its release
+HOLD_TIMEOUT = 30.0
+
+# [lat, lon] polygons in the format of the /areas endpoint
+MOCK_AREAS = [
+    {
+        "id_area": 1,
+        "area_json": {
+            "name": "Reykjanesskagi - VÍ",
+            "polygon": [
+                [63.75, -22.80],
+                [63.75, -21.60],
+                [64.10, -21.60],
+                [64.10, -22.80],
+            ],
+        },
+    },
+    {
+        "id_area": 2,
+        "area_json": {
+            "name": "Grindavík",
+            "polygon": [
+                [63.80, -22.55],
+                [63.80, -22.30],
+                [63.92, -22.30],
+                [63.92, -22.55],
+            ],
+        },
+    },
+    {
+        "id_area": 3,
+        "area_json": {
+            "name": "Krýsuvík",
+            "polygon": [
+                [63.85, -22.15],
+                [63.85, -21.95],
+                [63.97, -21.95],
+                [63.97, -22.15],
+            ],
+        },
+    },
+]
+
+
+class SyntheticCatalogue:
+    """Reproducible random earthquakes on the Reykjanes peninsula.
+
+    Args:
+        events (int): Number of events.
+        end (datetime): Time of the last possible event, naive UTC.
+        seed (int): Seed of the random generator.
+    """
+
+    def __init__(self, events: int, end: datetime, seed: int = 0):
+        rng = np.random.default_rng(seed)
+        end = np.datetime64(end.replace(microsecond=0), "ms")
+        span = int(CATALOGUE_SPAN.total_seconds() * 1000)
+
+        self.end = end
+        self.start = end - np.timedelta64(span, "ms")
+        self.time = np.sort(
+            self.start + rng.integers(0, span, events).astype("timedelta64[ms]")
+        )
+        self.lon = rng.uniform(-22.8, -21.6, events)
+        self.lat = rng.uniform(63.75, 64.1, events)
+        self.depth = np.round(rng.uniform(0.0, 25.0, events), 3)
+        # Gutenberg-Richter like, many small and few large events
+        self.magnitude = np.round(
+            np.minimum(rng.exponential(0.6, events), 6.5), 2
+        )
+
+    def __len__(self) -> int:
+        return len(self.time)
+
+    def select(self, payload: dict) -> np.ndarray:
+        """Return the rows matching a quakefilter payload."""
+        start = np.datetime64(
+            datetime.strptime(payload["start_time"], "%Y-%m-%d %H:%M:%S"),
+            "ms",
+        )
+        end = np.datetime64(
+            datetime.strptime(payload["end_time"], "%Y-%m-%d %H:%M:%S"),
+            "ms",
+        )
+        first = np.searchsorted(self.time, start, side="left")
+        last = np.searchsorted(self.time, end, side="right")
+        rows = np.arange(first, last)
+
+        mask = (
+            (self.magnitude[rows] >= payload.get("size_min", 0))
+            & (self.magnitude[rows] <= payload.get("size_max", 10))
+            & (self.depth[rows] >= payload.get("depth_min", 0))
+            & (self.depth[rows] <= payload.get("depth_max", 700))
+        )
+        if payload.get("area"):
+            polygon = shapely.Polygon(
+                [(lon, lat) for lat, lon in payload["area"]]
+            )
+            mask &= shapely.contains_xy(
+                polygon, self.lon[rows], self.lat[rows]
+            )
+        return rows[mask]
+
+    def iter_json(self, rows: np.ndarray):
+        """Yield the features of some rows as chunks of a JSON array."""
+        yield b"["
+        for first in range(0, len(rows), RESPONSE_CHUNK_EVENTS):
+            chunk = rows[first : first + RESPONSE_CHUNK_EVENTS]
+            times = np.datetime_as_string(self.time[chunk], unit="s")
+            features = [
+                json.dumps(
+                    {
+                        "type": "Feature",
+                        "geometry": {
+                            "type": "Point",
+                            "coordinates": [
+                                round(float(self.lon[row]), 5),
+                                round(float(self.lat[row]), 5),
+                            ],
+                        },
+                        "properties": {
+                            "event_id": int(row),
+                            "time": str(event_time),
+                            "magnitude": float(self.magnitude[row]),
+                            "magnitude_type": "Mlw",
+                            "depth": float(self.depth[row]),
+                            "event_type": "qu",
+                            "originating_system": "SIL picks",
+                        },
+                    },
+                    separators=(",", ":"),
+                )
+                for row, event_time in zip(chunk, times)
+            ]
+            prefix = b"," if first else b""
+            yield prefix + ",".join(features).encode("utf-8")
+        yield b"]"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/areas"):
+            self._send_json(json.dumps(MOCK_AREAS).encode("utf-8"))
+        else:
+            self.send_error(404)
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/quakefilter"):
+            self.send_error(404)
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        if self.server.failures:
+            status, retry_after, delay = self.server.failures.pop(0)
+            self.rfile.read(length)
+            time.sleep(delay)
+            try:
+                self.send_response(status)
+                if retry_after is not None:
+                    self.send_header("Retry-After", str(retry_after))
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+            except OSError:
+                pass  # The client gave up waiting
+            return
+        try:
+            payload = json.loads(self.rfile.read(length))
+            rows = self.server.catalogue.select(payload)
+        except (KeyError, TypeError, ValueError) as e:
+            self.send_error(400, str(e))
+            return
+
+        for predicate, release in list(self.server.holds):
+            if predicate(payload):
+                release.wait(HOLD_TIMEOUT)
+        self.server.requests.append(payload)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for chunk in self.server.catalogue.iter_json(rows):
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _send_json(self, body: bytes):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Keep test and benchmark output clean
+
+
+class MockApiServer:
+    """Serve a SyntheticCatalogue on a free local port in a thread.
+
+    Use it as a context manager; `url` is the base url to use in place of
+    the real API.
+
+    Args:
+        events (int): Number of events in the catalogue.
+        end (datetime): Time of the last possible event, naive UTC. The
+            current hour if None.
+        seed (int): Seed of the random generator.
+        port (int): Port to listen on, any free port if 0.
+    """
+
+    def __init__(
+        self,
+        events: int,
+        end: datetime = None,
+        seed: int = 0,
+        port: int = 0,
+    ):
+        if end is None:
+            end = datetime.now(timezone.utc).replace(
+                tzinfo=None, minute=0, second=0, microsecond=0
+            )
+        self.catalogue = SyntheticCatalogue(events, end, seed)
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), _Handler)
+        self.server.daemon_threads = True
+        self.server.catalogue = self.catalogue
+        self.server.requests = []  # payloads received, for assertions
+        # (status, Retry-After, delay) to answer next
+        self.server.failures = []
+        self.server.holds = []  # (predicate, release event)
+        self.thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/skjalftalisa/v1"
+
+    @property
+    def requests(self) -> list:
+        return self.server.requests
+
+    def fail_next(
+        self,
+        count: int,
+        status: int = 503,
+        retry_after: int = None,
+        delay: float = 0.0,
+    ) -> None:
+        """Answer the next quakefilter requests with an error status.
+
+        Args:
+            count (int): Number of requests to fail.
+            status (int): HTTP status of the answers.
+            retry_after (int): Retry-After header of the answers, if any.
+            delay (float): Seconds to wait before sending the headers.
+        """
+        self.server.failures.extend([(status, retry_after, delay)] * count)
+
+    def hold(self, predicate) -> threading.Event:
+        """Hold back the quakefilter responses to some payloads.
+
+        Args:
+            predicate (callable): Called with each payload; its response
+                is held while this returns True.
+
+        Returns:
+            threading.Event: Set it to release the held responses.
+        """
+        release = threading.Event()
+        self.server.holds.append((predicate, release))
+        return release
+
+    def start(self) -> "MockApiServer":
+        self.thread = threading.Thread(
+            target=self.server.serve_forever, daemon=True
+        )
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self) -> "MockApiServer":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--events", type=int, default=10000)
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    server = MockApiServer(args.events, seed=args.seed, port=args.port)
+    print(f"Serving {args.events} events at {server.url}")
+    try:
+        server.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server.server_close()
+
+
+if __name__ == "__main__":
+    main()
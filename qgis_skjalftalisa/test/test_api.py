@@ -0,0 +1,209 @@
+# coding=utf-8
+"""API helper tests.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'william@moreland.is'
+__date__ = '2024-12-19'
+__copyright__ = 'Copyright 2024, William M. Moreland'
+
+import json
+import unittest
+
+from datetime import datetime, timedelta
+
+from ..api import (
+    advance_payload_end,
+    iter_json_array,
+    merge_features,
+    payload_key,
+    payload_within,
+    process_earthquake_response,
+    split_time_window,
+)
+from ..exceptions import GeoJsonProcessingError
+
+
+def make_feature(event_id, time):
+    return {
+        "type": "Feature",
+        "properties": {"event_id": event_id, "time": time},
+        "geometry": {"type": "Point", "coordinates": [-22.4, 63.9]},
+    }
+
+
+class ApiTest(unittest.TestCase):
+    """Test the helpers used for sliced fetching."""
+
+    def test_split_time_window_covers_window(self):
+        """Slices are contiguous and cover the whole window."""
+        start = datetime(2024, 1, 1)
+        end = datetime(2025, 1, 1)
+        slices = split_time_window(start, end, timedelta(days=7), 4)
+        self.assertEqual(slices[0][0], start)
+        self.assertEqual(slices[-1][1], end)
+        for (_, previous_end), (next_start, _) in zip(slices, slices[1:]):
+            self.assertEqual(previous_end, next_start)
+        for slice_start, slice_end in slices:
+            self.assertLessEqual(slice_end - slice_start, timedelta(days=7))
+
+    def test_split_time_window_min_slices(self):
+        """Short windows are still cut into one slice per worker."""
+        slices = split_time_window(
+            datetime(2024, 1, 1), datetime(2024, 1, 20), timedelta(days=7), 4
+        )
+        self.assertEqual(len(slices), 4)
+
+    def test_merge_features_drops_duplicates(self):
+        """Events on a slice boundary are kept once."""
+        merged = merge_features(
+            [
+                [make_feature(1, "a"), make_feature(2, "b")],
+                [make_feature(2, "b"), make_feature(3, "c")],
+            ]
+        )
+        self.assertEqual(
+            [f["properties"]["event_id"] for f in merged], [1, 2, 3]
+        )
+
+    def test_iter_json_array_across_chunks(self):
+        """Elements split over chunk boundaries are decoded once."""
+        features = [
+            make_feature(i, f"2024-12-19T00:00:{i:02d}") for i in range(20)
+        ]
+        features[3]["properties"]["name"] = "Mýrdalsjökull"
+        body = json.dumps(features, ensure_ascii=False).encode("utf-8")
+        for size in (1, 7, 64, len(body)):
+            chunks = [body[i : i + size] for i in range(0, len(body), size)]
+            self.assertEqual(list(iter_json_array(chunks)), features)
+
+    def test_iter_json_array_empty_and_null(self):
+        """Empty bodies and null decode to no elements."""
+        self.assertEqual(list(iter_json_array([])), [])
+        self.assertEqual(list(iter_json_array([b" [ ] "])), [])
+        self.assertEqual(list(iter_json_array([b"nu", b"ll"])), [])
+
+    def test_non_list_body_is_an_error(self):
+        """An error object instead of the array of features is rejected."""
+        body = b'{"detail": "Internal Server Error"}'
+        with self.assertRaises(GeoJsonProcessingError):
+            process_earthquake_response(body)
+        with self.assertRaises(GeoJsonProcessingError):
+            list(iter_json_array([body]))
+
+    def test_iter_json_array_truncated(self):
+        """A body that ends inside the array is an error."""
+        with self.assertRaises(GeoJsonProcessingError):
+            list(iter_json_array([b'[{"a": 1}, {"b"']))
+
+    def test_payload_within(self):
+        """Narrower limits select a subset, wider or other ones do not."""
+        fetched = {
+            "depth_max": 25,
+            "depth_min": 0,
+            "end_time": "2024-12-19 12:00:00",
+            "event_type": ["qu"],
+            "size_max": 7,
+            "size_min": 0,
+            "start_time": "2024-12-12 12:00:00",
+        }
+        self.assertTrue(payload_within(fetched, fetched))
+        self.assertTrue(
+            payload_within(
+                dict(fetched, size_min=2, depth_max=10, area=[[64, -22]]),
+                fetched,
+            )
+        )
+        self.assertTrue(
+            payload_within(
+                dict(fetched, start_time="2024-12-18 00:00:00"), fetched
+            )
+        )
+        self.assertFalse(payload_within(dict(fetched, size_max=8), fetched))
+        self.assertFalse(
+            payload_within(
+                dict(fetched, end_time="2024-12-20 00:00:00"), fetched
+            )
+        )
+        self.assertFalse(
+            payload_within(dict(fetched, event_type=["ex"]), fetched)
+        )
+        with_area = dict(fetched, area=[[64, -22]])
+        self.assertFalse(payload_within(fetched, with_area))
+
+    def test_payload_within_hull(self):
+        """One of several areas fetched by their hull is a subset."""
+        west = [[63.8, -22.8], [63.8, -22.0], [64.0, -22.0], [63.8, -22.8]]
+        east = [[63.8, -21.0], [63.8, -20.0], [64.2, -20.0], [63.8, -21.0]]
+        hull = [
+            [63.8, -22.8],
+            [63.8, -20.0],
+            [64.2, -20.0],
+            [64.0, -22.0],
+            [63.8, -22.8],
+        ]
+        fetched = {
+            "depth_max": 25,
+            "depth_min": 0,
+            "end_time": "2024-12-19 12:00:00",
+            "size_max": 7,
+            "size_min": 0,
+            "start_time": "2024-12-12 12:00:00",
+            "area": hull,
+        }
+        self.assertTrue(payload_within(dict(fetched, area=west), fetched))
+        self.assertTrue(payload_within(dict(fetched, area=east), fetched))
+        outside = [[65.0, -18.0], [65.0, -17.0], [65.5, -17.0], [65.0, -18.0]]
+        self.assertFalse(payload_within(dict(fetched, area=outside), fetched))
+        narrowed = dict(fetched, area=west)
+        self.assertFalse(payload_within(dict(fetched), narrowed))
+
+    def test_refilter_after_live_poll(self):
+        """A payload that followed a poll still selects the polled events."""
+        fetched = {
+            "depth_max": 25,
+            "depth_min": 0,
+            "end_time": "2024-12-19 12:00:00",
+            "size_max": 7,
+            "size_min": 0,
+            "start_time": "2024-12-12 12:00:00",
+        }
+        polled = dict(fetched, end_time="2024-12-19 12:05:00")
+        requested = advance_payload_end(fetched, fetched, polled["end_time"])
+        # Narrowing the magnitude adds no condition on the end time
+        refiltered = dict(requested, size_min=2)
+        self.assertTrue(payload_within(refiltered, polled))
+        self.assertEqual(refiltered["end_time"], polled["end_time"])
+
+        narrowed = dict(fetched, end_time="2024-12-18 00:00:00")
+        self.assertIs(
+            advance_payload_end(narrowed, fetched, polled["end_time"]),
+            narrowed,
+        )
+
+    def test_payload_key_is_canonical(self):
+        """Key order and the order of event types do not matter."""
+        payload = {
+            "event_type": ["qu", "ex"],
+            "magnitude_preference": ["Mlw", "Autmag"],
+            "size_min": 0,
+        }
+        reordered = {
+            "size_min": 0,
+            "magnitude_preference": ["Mlw", "Autmag"],
+            "event_type": ["ex", "qu"],
+        }
+        self.assertEqual(payload_key(payload), payload_key(reordered))
+        self.assertNotEqual(
+            payload_key(payload),
+            payload_key(dict(payload, magnitude_preference=["Autmag", "Mlw"])),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
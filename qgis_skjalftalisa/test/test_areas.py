@@ -0,0 +1,104 @@
+# coding=utf-8
+"""Area catalogue tests.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'william@moreland.is'
+__date__ = '2024-12-19'
+__copyright__ = 'Copyright 2024, William M. Moreland'
+
+import unittest
+
+import numpy as np
+
+from shapely.geometry import Polygon
+
+from ..areas import AreaRegistry, assign_areas, payload_polygon
+
+# Raw /areas entries, with [lat, lon] polygons as served by the API
+AREAS = [
+    {
+        "id_area": 1,
+        "area_json": {
+            "name": "Reykjanes",
+            "polygon": [[63.8, -22.8], [63.8, -22.0], [64.0, -22.0]],
+        },
+    },
+    {
+        "id_area": 2,
+        "area_json": {
+            "name": "Suðurland - VÍ",
+            "polygon": [[63.8, -21.0], [63.8, -20.0], [64.2, -20.0]],
+        },
+    },
+]
+
+
+class AreaRegistryTest(unittest.TestCase):
+    """Test the lookups of the area registry."""
+
+    def setUp(self):
+        """Runs before each test."""
+        self.registry = AreaRegistry.from_catalogue(AREAS)
+
+    def test_names_and_lookups(self):
+        """Areas are listed in dock order and found by name and id."""
+        self.assertEqual(self.registry.names(), ["Suðurland - VÍ", "Reykjanes"])
+        self.assertIn("Reykjanes", self.registry)
+        self.assertIs(self.registry.by_id(1), self.registry.get("Reykjanes"))
+        self.assertIsNone(self.registry.get("Askja"))
+
+    def test_payload_polygon(self):
+        """The payload polygon is a closed ring of [lat, lon] pairs."""
+        polygon = self.registry.get("Reykjanes").payload_polygon
+        self.assertEqual(polygon[0], polygon[-1])
+        self.assertEqual(len(polygon), 4)
+        for lat, lon in polygon:
+            self.assertGreater(lat, 60)
+            self.assertLess(lon, 0)
+
+    def test_display_geometry_is_counterclockwise(self):
+        """The display geometry follows the right-hand rule."""
+        area = self.registry.get("Reykjanes")
+        self.assertTrue(area.geometry.exterior.is_ccw)
+
+    def test_spatial_queries(self):
+        """Areas are found by point and by extent."""
+        self.assertEqual(
+            [area.name for area in self.registry.containing(-22.1, 63.85)],
+            ["Reykjanes"],
+        )
+        self.assertEqual(self.registry.containing(-18.0, 65.0), [])
+        self.assertEqual(
+            len(self.registry.intersecting((-23.0, 63.0, -19.0, 65.0))), 2
+        )
+
+    def test_assign_areas(self):
+        """Points are assigned to the first area containing them."""
+        lon = np.array([-22.1, -20.1, -18.0, np.nan])
+        lat = np.array([63.85, 63.9, 65.0, 63.85])
+        reykjanes = self.registry.get("Reykjanes")
+        both = [self.registry.get("Suðurland - VÍ"), reykjanes]
+        self.assertEqual(
+            list(assign_areas([reykjanes], lon, lat)), [0, -1, -1, -1]
+        )
+        self.assertEqual(list(assign_areas(both, lon, lat)), [1, 0, -1, -1])
+        self.assertEqual(list(assign_areas([], lon, lat)), [-1] * 4)
+
+    def test_payload_polygon_of_several_areas(self):
+        """Several areas are requested by a hull that covers them all."""
+        areas = [self.registry.get(name) for name in self.registry.names()]
+        self.assertIs(payload_polygon(areas[:1]), areas[0].payload_polygon)
+        ring = payload_polygon(areas)
+        self.assertEqual(ring[0], ring[-1])
+        hull = Polygon([(lon, lat) for lat, lon in ring])
+        for area in areas:
+            self.assertTrue(hull.covers(area.geometry))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+# coding=utf-8
+"""Response cache tests.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'william@moreland.is'
+__date__ = '2024-12-19'
+__copyright__ = 'Copyright 2024, William M. Moreland'
+
+import unittest
+
+from datetime import datetime, timedelta, timezone
+
+from ..api import format_payload_time
+from ..cache import ResponseCache
+from ..catalogue import EarthquakeCatalogue
+from .test_catalogue import make_feature
+
+
+def make_payload(end, size_min=0):
+    return {
+        "end_time": format_payload_time(end),
+        "event_type": ["qu"],
+        "size_min": size_min,
+        "start_time": format_payload_time(end - timedelta(days=1)),
+    }
+
+
+def make_catalogue(events):
+    return EarthquakeCatalogue.from_features(
+        [
+            make_feature(event_id, "2024-12-19T00:00:00", 1.0 + event_id)
+            for event_id in range(events)
+        ]
+    )
+
+
+class ResponseCacheTest(unittest.TestCase):
+    """Test hits, expiry and eviction of the response cache."""
+
+    def setUp(self):
+        """Runs before each test."""
+        self.historical = make_payload(datetime(2024, 12, 19))
+        self.cache = ResponseCache(max_bytes=10 * 1024 * 1024)
+
+    def test_hit_returns_a_copy(self):
+        """A cached catalogue is returned as a copy without layer ids."""
+        catalogue = make_catalogue(3)
+        catalogue.fid[:] = [1, 2, 3]
+        self.assertIsNone(self.cache.get(self.historical))
+        self.cache.put(self.historical, catalogue)
+
+        cached = self.cache.get(self.historical)
+        self.assertEqual(cached.event_id, catalogue.event_id)
+        self.assertEqual(list(cached.fid), [-1, -1, -1])
+        self.assertIsNot(cached, self.cache.get(self.historical))
+        self.assertEqual((self.cache.hits, self.cache.misses), (2, 1))
+
+    def test_recent_windows_expire_sooner(self):
+        """Windows ending now use the short expiry."""
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        cache = ResponseCache(1024 * 1024, recent_ttl=0, historical_ttl=60)
+        cache.put(make_payload(now), make_catalogue(1))
+        cache.put(self.historical, make_catalogue(1))
+        self.assertIsNone(cache.get(make_payload(now)))
+        self.assertIsNotNone(cache.get(self.historical))
+
+    def test_least_recently_used_is_evicted(self):
+        """The cache stays within its estimated byte budget."""
+        size = make_catalogue(100).estimated_bytes()
+        cache = ResponseCache(max_bytes=2 * size)
+        first, second, third = (
+            make_payload(datetime(2024, 12, 19), size_min)
+            for size_min in (1, 2, 3)
+        )
+        cache.put(first, make_catalogue(100))
+        cache.put(second, make_catalogue(100))
+        cache.get(first)  # Now the most recently used
+        cache.put(third, make_catalogue(100))
+        self.assertIsNotNone(cache.get(first))
+        self.assertIsNone(cache.get(second))
+        self.assertLessEqual(cache.bytes, 2 * size)
+
+    def test_released_catalogues_are_not_cached(self):
+        """A catalogue without its feature dictionaries is not kept."""
+        catalogue = make_catalogue(2)
+        catalogue.release_features()
+        self.cache.put(self.historical, catalogue)
+        self.assertIsNone(self.cache.get(self.historical))
+        self.assertEqual(self.cache.bytes, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+# coding=utf-8
+"""Earthquake catalogue tests.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'william@moreland.is'
+__date__ = '2024-12-19'
+__copyright__ = 'Copyright 2024, William M. Moreland'
+
+import unittest
+
+import numpy as np
+
+from ..catalogue import (
+    MARKER_SIZE_MAX,
+    MARKER_SIZE_MIN,
+    EarthquakeCatalogue,
+)
+
+
+def make_feature(event_id, time, magnitude):
+    return {
+        "type": "Feature",
+        "properties": {
+            "event_id": event_id,
+            "time": time,
+            "magnitude": magnitude,
+            "depth": 5.0,
+        },
+        "geometry": {"type": "Point", "coordinates": [-22.4, 63.9]},
+    }
+
+
+class CatalogueTest(unittest.TestCase):
+    """Test the column arrays of decoded earthquakes."""
+
+    def test_from_features(self):
+        """Times are parsed and sizes scaled to the magnitude range."""
+        catalogue = EarthquakeCatalogue.from_features(
+            [
+                make_feature(1, "2024-12-19T00:00:00", 1.0),
+                make_feature(2, "2024-12-19T01:00:00", 3.0),
+            ]
+        )
+        self.assertEqual(catalogue.event_id, [1, 2])
+        self.assertEqual(catalogue.time[1] - catalogue.time[0], 3600)
+        self.assertEqual(
+            list(catalogue.marker_size), [MARKER_SIZE_MIN, MARKER_SIZE_MAX]
+        )
+        self.assertEqual(list(catalogue.fid), [-1, -1])
+
+    def test_subset_and_extend(self):
+        """Appending a subset keeps the columns aligned."""
+        catalogue = EarthquakeCatalogue.from_features(
+            [make_feature(1, "2024-12-19T00:00:00", 1.0)]
+        )
+        polled = EarthquakeCatalogue.from_features(
+            [
+                make_feature(1, "2024-12-19T00:00:00", 1.0),
+                make_feature(2, "2024-12-19T02:00:00", 2.0),
+            ]
+        )
+        polled.in_area[:] = [True, False]
+        catalogue.extend(polled.subset(np.array([False, True])))
+        catalogue.rescale_marker_sizes()
+        self.assertEqual(len(catalogue), 2)
+        self.assertEqual(catalogue.event_id, [1, 2])
+        self.assertEqual(list(catalogue.in_area), [True, False])
+        self.assertEqual(catalogue.magnitude_range(), (1.0, 2.0))
+        self.assertEqual(catalogue.marker_size[1], MARKER_SIZE_MAX)
+
+    def test_release_features(self):
+        """Released rows keep their columns and appended rows their dicts."""
+        feature = make_feature(2, "2024-12-19T02:00:00", 2.0)
+        catalogue = EarthquakeCatalogue.from_features(
+            [make_feature(1, "2024-12-19T00:00:00", 1.0)]
+        )
+        catalogue.release_features()
+        catalogue.extend(EarthquakeCatalogue.from_features([feature]))
+        self.assertEqual(catalogue.features, [None, feature])
+        self.assertFalse(catalogue.has_features())
+        self.assertEqual(len(catalogue), 2)
+        self.assertEqual(catalogue.magnitude_range(), (1.0, 2.0))
+
+    def test_magnitude_threshold(self):
+        """At most the budget of events exceed the threshold."""
+        magnitudes = [0.5, 1.0, 1.0, 2.0, 3.5, None]
+        catalogue = EarthquakeCatalogue.from_features(
+            [
+                make_feature(i, "2024-12-19T00:00:00", magnitude)
+                for i, magnitude in enumerate(magnitudes)
+            ]
+        )
+        self.assertEqual(catalogue.magnitude_threshold(2), 1.0)
+        self.assertEqual(catalogue.magnitude_threshold(1), 2.0)
+        # Ties with the threshold are left out rather than over budget
+        self.assertEqual(catalogue.magnitude_threshold(3), 1.0)
+        self.assertIsNone(catalogue.magnitude_threshold(5))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,222 @@
+# coding=utf-8
+"""Dock fetch tests, run inside QGIS.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'william@moreland.is'
+__date__ = '2024-12-19'
+__copyright__ = 'Copyright 2024, William M. Moreland'
+
+import time
+import unittest
+
+from datetime import datetime, timedelta
+from unittest import mock
+
+from qgis.PyQt.QtCore import QDateTime
+from qgis.PyQt.QtTest import QTest
+from qgis.core import QgsApplication, QgsProject
+
+from .. import api, areas, tasks
+from ..api import format_payload_time
+from ..cache import get_response_cache
+from ..catalogue import SIZE_FIELD, EarthquakeCatalogue
+from ..qgis_skjalftalisa_dockwidget import (
+    STREAM_FLUSH_INTERVAL_MS,
+    QgisSkjalftalisaDockWidget,
+)
+from ..tasks import EarthquakeFetchTask
+from .mock_api import MockApiServer
+from .test_catalogue import make_feature
+from .utilities import get_qgis_app
+
+QGIS_APP, CANVAS, IFACE, PARENT = get_qgis_app()
+
+END = datetime(2024, 12, 19, 12)
+
+# Seconds a test waits for a fetch to finish
+FETCH_TIMEOUT = 30
+
+PAYLOAD = {
+    "depth_max": 25,
+    "depth_min": 0,
+    "end_time": "2024-12-19 12:00:00",
+    "event_type": ["qu"],
+    "magnitude_preference": ["Mlw"],
+    "originating_system": ["SIL picks"],
+    "size_max": 7,
+    "size_min": 0,
+    "start_time": "2024-12-12 12:00:00",
+}
+
+
+def make_batch(first, magnitudes):
+    return EarthquakeCatalogue.from_features(
+        [
+            make_feature(first + i, "2024-12-19T00:00:00", magnitude)
+            for i, magnitude in enumerate(magnitudes)
+        ]
+    )
+
+
+class DockTestCase(unittest.TestCase):
+    """Runs the dock against the mock API."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = MockApiServer(2000, end=END).start()
+        cls.endpoints = [
+            mock.patch.object(
+                api, "EARTHQUAKE_API_ENDPOINT", f"{cls.server.url}/quakefilter"
+            ),
+            mock.patch.object(
+                areas, "AREA_API_ENDPOINT", f"{cls.server.url}/areas"
+            ),
+        ]
+        for endpoint in cls.endpoints:
+            endpoint.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        for endpoint in cls.endpoints:
+            endpoint.stop()
+        cls.server.stop()
+
+    def setUp(self):
+        """Runs before each test."""
+        self.dock = QgisSkjalftalisaDockWidget(IFACE)
+
+    def tearDown(self):
+        """Runs after each test."""
+        self.dock.cancel_background_tasks()
+        QgsProject.instance().removeAllMapLayers()
+        self.dock = None
+
+
+class StreamedBatchTest(DockTestCase):
+    """Test how streamed batches are added to the earthquake layer."""
+
+    def start_fetch(self) -> EarthquakeFetchTask:
+        """Make the dock wait for the batches of a task that is not run."""
+        task = EarthquakeFetchTask(PAYLOAD, stream=True)
+        self.dock.requested_payload = PAYLOAD
+        self.dock.requested_areas = []
+        self.dock.fetch_task = task
+        self.dock.fetch_layer_loaded = False
+        return task
+
+    def size_of(self, event_id):
+        layer = self.dock.earthquake_layer
+        for feature in layer.getFeatures():
+            if feature["event_id"] == event_id:
+                return feature[SIZE_FIELD]
+        self.fail(f"Event {event_id} is not in the layer")
+
+    def test_batches_are_coalesced(self):
+        """Later batches are appended together once the timer fires."""
+        task = self.start_fetch()
+        self.dock._on_fetch_batch(task, make_batch(0, [1.0, 2.0]))
+        layer = self.dock.earthquake_layer
+        self.assertEqual(layer.featureCount(), 2)
+
+        self.dock._on_fetch_batch(task, make_batch(2, [1.5]))
+        self.dock._on_fetch_batch(task, make_batch(3, [1.5, 1.5]))
+        self.assertTrue(self.dock.flush_timer.isActive())
+        self.assertEqual(layer.featureCount(), 2)
+
+        QTest.qWait(STREAM_FLUSH_INTERVAL_MS * 4)
+        self.assertEqual(layer.featureCount(), 5)
+        self.assertEqual(len(self.dock.catalogue), 5)
+        self.assertFalse(self.dock.pending_batches)
+        # The appended rows no longer hold their raw features
+        self.assertEqual(self.dock.catalogue.features, [None] * 5)
+
+    def test_last_flush_on_completion(self):
+        """Completion appends what is pending and rewrites the sizes."""
+        task = self.start_fetch()
+        self.dock._on_fetch_batch(task, make_batch(0, [1.0, 2.0]))
+        self.assertEqual(self.size_of(1), 10.0)
+
+        # Widens the magnitude range, but arrives just before completion
+        self.dock._on_fetch_batch(task, make_batch(2, [4.0]))
+        self.dock._on_fetch_completed(task)
+        self.assertFalse(self.dock.flush_timer.isActive())
+        self.assertIsNone(self.dock.fetch_task)
+        self.assertEqual(self.dock.earthquake_layer.featureCount(), 3)
+        self.assertEqual(self.dock.earthquake_payload, PAYLOAD)
+        # Sized relative to the final range of 1.0 to 4.0
+        self.assertAlmostEqual(self.size_of(1), 4.0)
+        self.assertAlmostEqual(self.size_of(2), 10.0)
+
+    def test_superseded_batches_are_ignored(self):
+        """Batches of a task that is no longer running are dropped."""
+        task = self.start_fetch()
+        self.start_fetch()
+        self.dock._on_fetch_batch(task, make_batch(0, [1.0]))
+        self.assertIsNone(self.dock.earthquake_layer)
+
+
+class RepeatedRequestTest(DockTestCase):
+    """Test that a repeated click joins the fetch that is running."""
+
+    def setUp(self):
+        """Runs before each test."""
+        super().setUp()
+        get_response_cache().clear()
+        # A week, fetched in one request; the dock sends the wall time of
+        # its date edits as payload times
+        for edit, value in (
+            (self.dock.dateFromTimeEdit, END - timedelta(days=7)),
+            (self.dock.dateUntilTimeEdit, END),
+        ):
+            edit.setDateTime(
+                QDateTime.fromString(
+                    format_payload_time(value), "yyyy-MM-dd HH:mm:ss"
+                )
+            )
+        self.dock.magMaxSpinBox.setValue(10)
+        self.dock.depthMaxSpinBox.setValue(700)
+        # Every fetch goes to the mock API instead of the event store
+        self.store = mock.patch.object(
+            tasks, "store_enabled", return_value=False
+        )
+        self.store.start()
+
+    def tearDown(self):
+        """Runs after each test."""
+        self.store.stop()
+        super().tearDown()
+
+    def test_repeated_click_starts_one_task(self):
+        """Clicking Filter twice downloads the payload once."""
+        release = self.server.hold(lambda payload: True)
+        served = len(self.server.requests)
+        added = []
+        on_added = added.append
+        QgsApplication.taskManager().taskAdded.connect(on_added)
+        try:
+            self.dock.fetch_and_load_earthquakes()
+            running = self.dock.fetch_task
+            self.assertIsNotNone(running)
+            self.dock.fetch_and_load_earthquakes()
+            self.assertIs(self.dock.fetch_task, running)
+            self.assertEqual(len(added), 1)
+        finally:
+            QgsApplication.taskManager().taskAdded.disconnect(on_added)
+            release.set()
+
+        deadline = time.monotonic() + FETCH_TIMEOUT
+        while self.dock.fetch_task is not None:
+            self.assertLess(time.monotonic(), deadline, "Fetch timed out")
+            QTest.qWait(50)
+        self.assertEqual(len(self.server.requests) - served, 1)
+        self.assertIsNotNone(self.dock.earthquake_layer)
+
+
+if __name__ == "__main__":
+    unittest.main()
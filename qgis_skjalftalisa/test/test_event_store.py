@@ -0,0 +1,86 @@
+# coding=utf-8
+"""Event store tests.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'william@moreland.is'
+__date__ = '2024-12-19'
+__copyright__ = 'Copyright 2024, William M. Moreland'
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from ..event_store import EventStore, merge_intervals, missing_intervals
+
+
+class EventStoreTest(unittest.TestCase):
+    """Test the interval bookkeeping of the event store."""
+
+    def setUp(self):
+        """Runs before each test."""
+        self.directory = tempfile.mkdtemp()
+        self.store = EventStore(os.path.join(self.directory, "events.sqlite"))
+
+    def tearDown(self):
+        """Runs after each test."""
+        shutil.rmtree(self.directory)
+
+    def test_merge_intervals(self):
+        """Overlapping and touching intervals are merged."""
+        self.assertEqual(
+            merge_intervals([(5, 8), (0, 2), (2, 4), (7, 10)]),
+            [(0, 4), (5, 10)],
+        )
+
+    def test_missing_intervals(self):
+        """Only the gaps of a window are returned."""
+        self.assertEqual(
+            missing_intervals(0, 100, [(10, 20), (15, 30), (90, 200)]),
+            [(0, 10), (30, 90)],
+        )
+        self.assertEqual(missing_intervals(0, 100, []), [(0, 100)])
+
+    def test_widened_window_fetches_only_the_difference(self):
+        """Events stored for one window answer part of a wider one."""
+        feature = {
+            "type": "Feature",
+            "properties": {"event_id": 1, "time": "1970-01-01T00:00:50"},
+            "geometry": {"type": "Point", "coordinates": [-22.4, 63.9]},
+        }
+        self.store.add("key", 0, 100, [feature])
+        self.assertEqual(
+            self.store.missing_intervals("key", -100, 100), [(-100, 0)]
+        )
+        self.assertEqual(self.store.features("key", -100, 100), [feature])
+        self.assertEqual(self.store.features("other", -100, 100), [])
+
+    def test_discard_drops_the_events_of_a_window(self):
+        """Events of a refetched window do not outlive their revision."""
+        features = [
+            {
+                "type": "Feature",
+                "properties": {"event_id": event_id, "time": event_time},
+                "geometry": {"type": "Point", "coordinates": [-22.4, 63.9]},
+            }
+            for event_id, event_time in (
+                (1, "1970-01-01T00:00:10"),
+                (2, "1970-01-01T00:01:10"),
+            )
+        ]
+        self.store.add("key", 0, 100, features, covered_until=50)
+        self.assertEqual(
+            self.store.missing_intervals("key", 0, 100), [(50, 100)]
+        )
+        self.store.discard("key", 50, 100)
+        self.assertEqual(self.store.features("key", 0, 100), features[:1])
+
+
+if __name__ == "__main__":
+    unittest.main()
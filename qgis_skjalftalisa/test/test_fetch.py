@@ -0,0 +1,251 @@
+# coding=utf-8
+"""Fetch pipeline tests against the mock API.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'william@moreland.is'
+__date__ = '2024-12-19'
+__copyright__ = 'Copyright 2024, William M. Moreland'
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from datetime import datetime, timedelta
+from unittest import mock
+
+from .. import api
+from ..api import FetchFeedback, format_payload_time, stream_earthquakes
+from ..event_store import EventStore, stream_earthquakes_stored
+from ..exceptions import ApiServerError
+from ..http_client import HttpClient, retry_after_seconds
+from .mock_api import MockApiServer
+
+END = datetime(2024, 12, 19, 12)
+
+
+def make_payload(days):
+    return {
+        "depth_max": 25,
+        "depth_min": 0,
+        "end_time": format_payload_time(END),
+        "event_type": ["qu"],
+        "magnitude_preference": ["Mlw"],
+        "originating_system": ["SIL picks"],
+        "size_max": 7,
+        "size_min": 0,
+        "start_time": format_payload_time(END - timedelta(days=days)),
+    }
+
+
+class FetchTest(unittest.TestCase):
+    """Test fetching and decoding quakefilter responses."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = MockApiServer(20000, end=END).start()
+        cls.endpoint = mock.patch.object(
+            api, "EARTHQUAKE_API_ENDPOINT", f"{cls.server.url}/quakefilter"
+        )
+        cls.endpoint.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.endpoint.stop()
+        cls.server.stop()
+
+    def test_fetch_matches_catalogue(self):
+        """A short window is fetched in one request."""
+        payload = make_payload(7)
+        features = api.fetch_earthquakes(payload, FetchFeedback())
+        expected = self.server.catalogue.select(payload)
+        self.assertEqual(
+            [feature["properties"]["event_id"] for feature in features],
+            list(expected),
+        )
+
+    def test_stream_in_batches(self):
+        """Streamed batches add up to the whole response."""
+        payload = make_payload(7)
+        feedback = FetchFeedback()
+        batches = list(stream_earthquakes(payload, feedback, batch_size=100))
+        expected = len(self.server.catalogue.select(payload))
+        self.assertTrue(all(len(batch) <= 100 for batch in batches))
+        self.assertEqual(sum(len(batch) for batch in batches), expected)
+        self.assertEqual(feedback.events_received, expected)
+        self.assertGreater(feedback.bytes_received, 0)
+
+    def test_stream_through_the_store(self):
+        """Stored events and streamed gaps make up the window once."""
+        directory = tempfile.mkdtemp()
+        try:
+            store = EventStore(os.path.join(directory, "events.sqlite"))
+            middle = dict(
+                make_payload(5),
+                end_time=format_payload_time(END - timedelta(days=3)),
+            )
+            list(stream_earthquakes_stored(middle, FetchFeedback(), store))
+
+            payload = make_payload(7)
+            served = len(self.server.requests)
+            feedback = FetchFeedback()
+            batches = list(
+                stream_earthquakes_stored(payload, feedback, store, 100)
+            )
+        finally:
+            shutil.rmtree(directory)
+
+        event_ids = [
+            feature["properties"]["event_id"]
+            for batch in batches
+            for feature in batch
+        ]
+        expected = list(self.server.catalogue.select(payload))
+        self.assertTrue(all(len(batch) <= 100 for batch in batches))
+        self.assertEqual(sorted(event_ids), expected)
+        self.assertEqual(feedback.events_received, len(expected))
+        self.assertEqual(
+            [
+                (request["start_time"], request["end_time"])
+                for request in self.server.requests[served:]
+            ],
+            [
+                (payload["start_time"], middle["start_time"]),
+                (middle["end_time"], payload["end_time"]),
+            ],
+        )
+
+    def test_sliced_fetch_has_no_duplicates(self):
+        """A long window is fetched in slices and merged."""
+        payload = make_payload(60)
+        event_ids = [
+            feature["properties"]["event_id"]
+            for features in api.fetch_earthquakes_sliced(
+                payload, FetchFeedback()
+            )
+            for feature in features
+        ]
+        self.assertEqual(len(event_ids), len(set(event_ids)))
+        self.assertEqual(
+            sorted(event_ids), list(self.server.catalogue.select(payload))
+        )
+
+    def test_sliced_stream_yields_before_the_last_slice(self):
+        """Slices are streamed as they complete, not once all have."""
+        payload = make_payload(60)
+
+        def last_slice(request):
+            return request["end_time"] == payload["end_time"]
+
+        served = len(self.server.requests)
+        release = self.server.hold(last_slice)
+        try:
+            batches = stream_earthquakes(payload, FetchFeedback(), 100)
+            first = next(batches)
+            self.assertTrue(first)
+            self.assertFalse(
+                any(map(last_slice, self.server.requests[served:]))
+            )
+        finally:
+            release.set()
+            self.server.server.holds.clear()
+        batches = [first, *batches]
+        self.assertTrue(all(len(batch) <= 100 for batch in batches))
+        event_ids = [
+            feature["properties"]["event_id"]
+            for batch in batches
+            for feature in batch
+        ]
+        self.assertEqual(
+            sorted(event_ids), list(self.server.catalogue.select(payload))
+        )
+
+    def test_oversized_slices_are_fetched_uncapped(self):
+        """A slice too large to bisect further is fetched without the cap."""
+        payload = make_payload(60)
+        with mock.patch.object(
+            api, "SLICE_MAX_BYTES", 1000
+        ), mock.patch.object(api, "SLICE_MAX_BISECTIONS", 1):
+            features = api.fetch_earthquakes(payload, FetchFeedback())
+        self.assertEqual(
+            sorted(feature["properties"]["event_id"] for feature in features),
+            list(self.server.catalogue.select(payload)),
+        )
+
+    def test_transient_errors_are_retried(self):
+        """A 503 with Retry-After is retried and reported."""
+        retries = []
+        feedback = FetchFeedback(
+            on_retry=lambda *retry: retries.append(retry)
+        )
+        self.server.fail_next(2, status=503, retry_after=0)
+        features = api.fetch_earthquakes(make_payload(1), feedback)
+        self.assertEqual(
+            len(features), len(self.server.catalogue.select(make_payload(1)))
+        )
+        self.assertEqual([retry[0] for retry in retries], [1, 2])
+        self.assertTrue(retries[0][3].startswith("503"))
+
+    def test_gateway_timeouts_are_retried(self):
+        """A 504 is retried like any other transient status."""
+        retries = []
+        feedback = FetchFeedback(
+            on_retry=lambda *retry: retries.append(retry)
+        )
+        self.server.fail_next(1, status=504, retry_after=0)
+        features = api.fetch_earthquakes(make_payload(1), feedback)
+        self.assertEqual(
+            len(features), len(self.server.catalogue.select(make_payload(1)))
+        )
+        self.assertEqual(len(retries), 1)
+        self.assertTrue(retries[0][3].startswith("504"))
+
+    def test_delayed_headers_are_retried(self):
+        """A read timeout while waiting for the headers is retried."""
+        retries = []
+        feedback = FetchFeedback(
+            on_retry=lambda *retry: retries.append(retry)
+        )
+        client = HttpClient(read_timeout=0.2, backoff=0.01)
+        self.server.fail_next(1, status=503, delay=1.0)
+        try:
+            response = client.request(
+                "POST",
+                f"{self.server.url}/quakefilter",
+                feedback=feedback,
+                json=make_payload(1),
+                stream=True,
+            )
+            self.assertEqual(response.status_code, 200)
+            response.close()
+        finally:
+            client.close()
+        self.assertEqual(len(retries), 1)
+
+    def test_retries_are_limited(self):
+        """The error is raised once the retries are used up."""
+        self.server.fail_next(10, status=502, retry_after=0)
+        try:
+            with self.assertRaises(ApiServerError):
+                api.fetch_earthquakes(make_payload(1), FetchFeedback())
+        finally:
+            self.server.server.failures.clear()
+
+    def test_retry_after_seconds(self):
+        """Retry-After is read as seconds or as an HTTP date."""
+        self.assertEqual(retry_after_seconds("7"), 7.0)
+        self.assertEqual(
+            retry_after_seconds("Wed, 21 Oct 2015 07:28:00 GMT"), 0.0
+        )
+        self.assertIsNone(retry_after_seconds("soon"))
+        self.assertIsNone(retry_after_seconds(None))
+
+
+if __name__ == "__main__":
+    unittest.main()
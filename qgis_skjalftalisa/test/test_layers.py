@@ -0,0 +1,176 @@
+# coding=utf-8
+"""Earthquake layer helper tests.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'william@moreland.is'
+__date__ = '2024-12-19'
+__copyright__ = 'Copyright 2024, William M. Moreland'
+
+import unittest
+
+import numpy as np
+
+from qgis.core import (
+    QgsGraduatedSymbolRenderer,
+    QgsMarkerSymbol,
+    QgsRendererRange,
+)
+
+from ..catalogue import SIZE_FIELD, EarthquakeCatalogue
+from ..layers import (
+    DETAIL_LEVELS,
+    choose_detail_levels,
+    create_earthquake_layer,
+    earthquake_subset_string,
+    level_of_detail_renderer,
+    map_feature_ids,
+    write_marker_sizes,
+)
+from .test_catalogue import make_feature
+
+FETCHED = {
+    "depth_max": 25,
+    "depth_min": 0,
+    "end_time": "2024-12-19 12:00:00",
+    "size_max": 7,
+    "size_min": 0,
+    "start_time": "2024-12-12 12:00:00",
+}
+
+
+def make_catalogue(magnitudes):
+    magnitudes = np.asarray(magnitudes, dtype=np.float64)
+    count = len(magnitudes)
+    return EarthquakeCatalogue(
+        [{}] * count,
+        list(range(count)),
+        time=np.zeros(count),
+        magnitude=magnitudes,
+        depth=np.full(count, 5.0),
+        lon=np.full(count, -22.4),
+        lat=np.full(count, 63.9),
+    )
+
+
+def make_renderer():
+    ranges = [
+        QgsRendererRange(
+            low, high, QgsMarkerSymbol.createSimple({}), f"{low}-{high}"
+        )
+        for low, high in ((0.0, 2.0), (2.0, 7.0))
+    ]
+    return QgsGraduatedSymbolRenderer("magnitude", ranges)
+
+
+class DetailLevelTest(unittest.TestCase):
+    """Test the scale-dependent rules of large catalogues."""
+
+    def setUp(self):
+        """Runs before each test."""
+        magnitudes = np.random.default_rng(0).exponential(0.5, 100_000)
+        self.levels = choose_detail_levels(make_catalogue(magnitudes))
+
+    def test_thresholds_are_monotonic(self):
+        """Wider scales never draw more events than finer ones."""
+        thresholds = [threshold for _, _, threshold in self.levels]
+        self.assertEqual(len(thresholds), len(DETAIL_LEVELS) + 1)
+        self.assertIsNone(thresholds[-1])
+        self.assertEqual(
+            thresholds[:-1], sorted(thresholds[:-1], reverse=True)
+        )
+
+    def test_scale_ranges_are_contiguous(self):
+        """Each range starts one short of where the wider one ends."""
+        self.assertEqual(self.levels[0][0], 0)
+        self.assertEqual(self.levels[-1][1], 0)
+        for wider, finer in zip(self.levels, self.levels[1:]):
+            self.assertEqual(finer[0], wider[1] - 1)
+
+    def test_one_rule_per_scale(self):
+        """Exactly one rule is drawn at any scale, including the limits."""
+        renderer = level_of_detail_renderer(make_renderer(), self.levels)
+        rules = renderer.rootRule().children()
+        scales = [1, 10_000_000]
+        for scale, _ in DETAIL_LEVELS:
+            scales.extend((scale - 1, scale, scale + 1))
+        for scale in scales:
+            drawn = [rule for rule in rules if rule.isScaleOK(scale)]
+            self.assertEqual(len(drawn), 1, f"at 1:{scale}")
+
+    def test_small_catalogues_keep_their_renderer(self):
+        """A catalogue within every budget draws all events everywhere."""
+        self.assertEqual(choose_detail_levels(make_catalogue([1.0, 2.0])), [])
+        renderer = make_renderer()
+        self.assertIs(level_of_detail_renderer(renderer, []), renderer)
+
+
+class SubsetStringTest(unittest.TestCase):
+    """Test narrowing the loaded events with a subset string."""
+
+    def test_same_payload_selects_all(self):
+        """No condition is needed for the payload that was fetched."""
+        self.assertEqual(earthquake_subset_string(FETCHED, FETCHED), "")
+
+    def test_narrower_limits(self):
+        """Only the limits that differ become conditions."""
+        payload = dict(FETCHED, size_min=2, depth_max=10.5)
+        self.assertEqual(
+            earthquake_subset_string(payload, FETCHED),
+            '"magnitude" >= 2 AND "depth" <= 10.5',
+        )
+
+    def test_time_and_area(self):
+        """Times compare as epoch seconds, areas by the in-area column."""
+        payload = dict(FETCHED, start_time="2024-12-19 00:00:00")
+        subset = earthquake_subset_string(payload, FETCHED, local_area=True)
+        self.assertIn(">= 1734566400.0", subset)
+        self.assertTrue(subset.endswith('"__in_area" = 1'))
+
+
+class MarkerSizeTest(unittest.TestCase):
+    """Test writing marker sizes to the earthquake layer."""
+
+    def test_write_marker_sizes(self):
+        """Sizes are written by feature id, up to the given row."""
+        catalogue = EarthquakeCatalogue.from_features(
+            [
+                make_feature(i, "2024-12-19T00:00:00", magnitude)
+                for i, magnitude in enumerate((1.0, 2.0, 3.0))
+            ]
+        )
+        layer = create_earthquake_layer(catalogue, "earthquakes")
+        catalogue.marker_size = np.array([4.0, 5.0, 6.0])
+        write_marker_sizes(layer, catalogue, stop=2)
+        sizes = {
+            feature["event_id"]: feature[SIZE_FIELD]
+            for feature in layer.getFeatures()
+        }
+        self.assertEqual(sizes, {0: 4.0, 1: 5.0, 2: 10.0})
+
+
+class MapFeatureIdsTest(unittest.TestCase):
+    """Test translating feature ids to those of a written GeoPackage."""
+
+    def test_ids_are_mapped_by_value(self):
+        """Each id is looked up, whatever the order the layer was read in."""
+        old = np.array([7, 1, 3])
+        new = np.array([10, 11, 12])
+        mapped = map_feature_ids(np.array([3, -1, 1, 7]), old, new)
+        self.assertEqual(list(mapped), [12, -1, 11, 10])
+
+    def test_unwritten_ids_fail(self):
+        """Rows added to the layer after it was read cannot be mapped."""
+        old = np.array([1, 3])
+        new = np.array([5, 6])
+        self.assertIsNone(map_feature_ids(np.array([2]), old, new))
+        self.assertIsNone(map_feature_ids(np.array([4]), old, new))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+# coding=utf-8
+"""Fetch metrics tests.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'william@moreland.is'
+__date__ = '2024-12-19'
+__copyright__ = 'Copyright 2024, William M. Moreland'
+
+import json
+import unittest
+
+from ..metrics import FetchMetrics, StageTimes
+
+PAYLOAD = {
+    "start_time": "2024-12-12 12:00:00",
+    "end_time": "2024-12-19 12:00:00",
+}
+
+
+class MetricsTest(unittest.TestCase):
+    """Test the stage timers and the fetch summary."""
+
+    def test_stage_times_add_up(self):
+        """Repeated stages accumulate their time."""
+        times = StageTimes()
+        times.add("decode", 0.25)
+        times.add("decode", 0.5)
+        with times.measure("layer"):
+            pass
+        self.assertEqual(times.get("decode"), 0.75)
+        self.assertGreaterEqual(times.get("layer"), 0.0)
+        self.assertEqual(times.get("http"), 0.0)
+
+    def test_summary(self):
+        """The summary lists the stages in pipeline order."""
+        times = StageTimes()
+        times.add("layer", 0.5)
+        times.add("http", 1.2)
+        times.add("store", 0.001)  # Too short to be listed
+        metrics = FetchMetrics(PAYLOAD, 12345, 2048 * 1024, 0, 2.31, times)
+        self.assertEqual(
+            metrics.summary(),
+            "12,345 events, 2,048 kB in 2.31 s (HTTP 1.20, layer 0.50)",
+        )
+
+    def test_as_dict_is_json(self):
+        """The log record is serialisable."""
+        metrics = FetchMetrics(PAYLOAD, 1, 10, 20, 0.1, StageTimes())
+        record = json.loads(json.dumps(metrics.as_dict()))
+        self.assertEqual(record["events"], 1)
+        self.assertFalse(record["area"])
+
+
+if __name__ == "__main__":
+    unittest.main()
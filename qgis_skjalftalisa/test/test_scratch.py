@@ -0,0 +1,106 @@
+# coding=utf-8
+"""Scratch store tests.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'william@moreland.is'
+__date__ = '2024-12-19'
+__copyright__ = 'Copyright 2024, William M. Moreland'
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from ..scratch import ScratchStore
+
+
+class ScratchStoreTest(unittest.TestCase):
+    """Test reuse and eviction of scratch files."""
+
+    def setUp(self):
+        """Runs before each test."""
+        self.directory = tempfile.mkdtemp()
+        self.store = ScratchStore(self.directory, budget_bytes=250)
+
+    def tearDown(self):
+        """Runs after each test."""
+        shutil.rmtree(self.directory)
+
+    def write(self, index: int, mtime: int) -> str:
+        path = self.store.write_bytes(bytes([index]) * 100, suffix=".bin")
+        os.utime(path, (mtime, mtime))
+        return path
+
+    def test_identical_content_reuses_file(self):
+        """Writing the same data twice gives the same file."""
+        polygon = {"type": "Polygon", "coordinates": [[[0, 0], [1, 0]]]}
+        first = self.store.write_json(polygon, prefix="area-")
+        second = self.store.write_json(dict(polygon), prefix="area-")
+        self.assertEqual(first, second)
+        self.assertEqual(os.listdir(self.directory), [os.path.basename(first)])
+
+    def test_least_recently_used_is_evicted(self):
+        """The oldest unpinned file goes when the budget is exceeded."""
+        oldest = self.write(1, 1000)
+        middle = self.write(2, 2000)
+        newest = self.write(3, 3000)
+        self.assertFalse(os.path.exists(oldest))
+        self.assertTrue(os.path.exists(middle))
+        self.assertTrue(os.path.exists(newest))
+        self.assertLessEqual(self.store.size(), 250)
+
+    def test_pinned_files_are_kept_until_released(self):
+        """A file in use by a layer survives eviction."""
+        pinned = self.write(1, 1000)
+        self.store.pin("layer", pinned)
+        other = self.write(2, 2000)
+        self.write(3, 3000)
+        self.assertTrue(os.path.exists(pinned))
+        self.assertFalse(os.path.exists(other))
+
+        # Once released it is the least recently used file again
+        self.store.release(["layer"])
+        self.write(4, 4000)
+        self.assertFalse(os.path.exists(pinned))
+
+    def test_files_in_use_are_never_evicted(self):
+        """Files behind project layers survive eviction and release_all."""
+        in_use = set()
+        self.store.in_use = lambda: in_use
+        path = self.write(1, 1000)
+        in_use.add(path)
+        self.write(2, 2000)
+        self.write(3, 3000)
+        self.store.release_all()
+        self.assertTrue(os.path.exists(path))
+
+    def test_store_without_budget_is_never_evicted(self):
+        """Files of a store without a budget are only discarded."""
+        self.store.budget_bytes = None
+        paths = [self.write(index, 1000 * index) for index in (1, 2, 3)]
+        self.store.release_all()
+        self.assertTrue(all(os.path.exists(path) for path in paths))
+
+    def test_new_path_is_pinned_with_side_files(self):
+        """A file written by someone else is kept with its journals."""
+        path = self.store.new_path("earthquakes-", ".gpkg")
+        for name in (path, f"{path}-wal"):
+            with open(name, "wb") as file:
+                file.write(b"x" * 200)
+        self.write(1, 1000)
+        self.assertTrue(os.path.exists(f"{path}-wal"))
+
+        self.store.release([path])
+        self.store.discard(path)
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(os.path.exists(f"{path}-wal"))
+
+
+if __name__ == "__main__":
+    unittest.main()
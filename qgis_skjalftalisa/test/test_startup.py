@@ -0,0 +1,37 @@
+# coding=utf-8
+"""Plugin start up tests.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'william@moreland.is'
+__date__ = '2024-12-19'
+__copyright__ = 'Copyright 2024, William M. Moreland'
+
+import unittest
+
+from .benchmark import measure_startup
+
+
+class StartupTest(unittest.TestCase):
+    """Test that loading the plugin stays cheap."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.startup = measure_startup()
+
+    def test_no_heavy_imports(self):
+        """The dock and its dependencies wait until the dock is opened."""
+        self.assertEqual(self.startup["heavy_modules"], [])
+
+    def test_no_files_written(self):
+        """Importing the plugin writes nothing to the working directory."""
+        self.assertEqual(self.startup["files_created"], [])
+
+
+if __name__ == "__main__":
+    unittest.main()
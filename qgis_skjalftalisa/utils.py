@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""Small helpers shared by the Skjálftalísa plugin modules."""
+
+import logging
+import os
+
+from qgis.core import Qgis, QgsApplication, QgsMessageLog
+
+MESSAGE_LOG_TAG = "Skjálftalísa"
+
+
+class MessageLogHandler(logging.Handler):
+    """Forward the plugin's log records to the QGIS message log.
+
+    Installed on the plugin's package logger while the plugin is loaded,
+    instead of configuring the root logger or writing a log file.
+    """
+
+    LEVELS = (
+        (logging.ERROR, Qgis.Critical),
+        (logging.WARNING, Qgis.Warning),
+        (logging.NOTSET, Qgis.Info),
+    )
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            level = next(
+                qgis_level
+                for threshold, qgis_level in self.LEVELS
+                if record.levelno >= threshold
+            )
+            QgsMessageLog.logMessage(
+                self.format(record), MESSAGE_LOG_TAG, level
+            )
+        except Exception:
+            self.handleError(record)
+
+
+def log_error(message: str) -> None:
+    logger = logging.getLogger(__name__)
+    logger.error(message)
+
+
+def profile_dir(*parts: str) -> str:
+    """Return a directory owned by the plugin inside the QGIS profile.
+
+    The directory is created if it does not exist yet.
+
+    Args:
+        *parts (str): Optional sub-directories below the plugin directory.
+
+    Returns:
+        str: Absolute path of the directory.
+    """
+    path = os.path.join(
+        QgsApplication.qgisSettingsDirPath(), "skjalftalisa", *parts
+    )
+    os.makedirs(path, exist_ok=True)
+    return path